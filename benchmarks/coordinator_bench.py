@@ -0,0 +1,143 @@
+"""
+Бенчмарк и проверка распределенного режима (--mode coordinator / worker)
+
+На одной машине: координатор на временной БД из --accounts pending
+аккаунтов и --processes локальных процессов-воркеров. Воркеры идут через
+настоящий протокол (CoordinatorClient, RemoteDatabase, RemoteRateLimiter)
+и общий цикл process_accounts, браузер заменен симуляцией: --pages страниц
+по --page-size номеров на аккаунт, навигация --latency сек.
+
+Проверяется, что каждый аккаунт обработан ровно один раз, все номера
+сохранены и пульс каждого воркера дошел до worker_heartbeats; печатаются
+страницы/сек и задержка запросов к координатору.
+
+Запуск:
+    python -m benchmarks.coordinator_bench
+    python -m benchmarks.coordinator_bench --processes 8 --accounts 200 --latency 0.05
+"""
+import sys
+import time
+import sqlite3
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+from argparse import ArgumentParser
+import config
+from database.db import Database
+from scraper.coordinator import Coordinator, CoordinatorClient, RemoteDatabase, RemoteRateLimiter
+from scraper.parallel_scraper import process_accounts
+from utils.heartbeat import WorkerHeartbeat
+from utils.logger import logger
+from benchmarks.db_bench import percentile
+
+
+class SimulatedScraper:
+    """PhoneScraper без браузера: токен лимитера, навигация, сохранение страницы"""
+
+    def __init__(self, db, rate_limiter, pages: int, page_size: int, latency: float, on_page=None):
+        self.db = db
+        self.on_page = on_page
+        self.rate_limiter = rate_limiter
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+
+    def scrape_account(self, account_id: str, token_url: str, start_page: int = 1) -> int:
+        self.db.update_account_status(account_id, 'in_progress')
+        total = 0
+        for page in range(start_page, self.pages + 1):
+            self.rate_limiter.acquire()
+            time.sleep(self.latency)
+            first = 79000000000 + (int(account_id) * self.pages + page) * self.page_size
+            phones = [str(first + i) for i in range(self.page_size)]
+            added = self.db.save_page(account_id, page, phones, page)
+            total += added
+            if self.on_page:
+                self.on_page(account_id, page, added)
+        self.db.update_account_status(account_id, 'completed')
+        return total
+
+
+def worker(address: str, worker_id: int, args, results):
+    client = CoordinatorClient(address)
+    db = RemoteDatabase(client)
+    heartbeat = WorkerHeartbeat(db, f'bench-{worker_id}')
+    scraper = SimulatedScraper(db, RemoteRateLimiter(client), args.pages, args.page_size, args.latency,
+                               on_page=heartbeat.page)
+    latencies = []
+    call = client.call
+
+    def timed_call(method, *call_args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(method, *call_args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    client.call = timed_call
+    processed = []
+    process_accounts(db, scraper, f'bench-{worker_id}', logger, lambda: False,
+                     lambda failed: processed.append(failed))
+    heartbeat.finish()
+    results.put((len(processed), latencies))
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк координатора')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--accounts', type=int, default=40)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.01, help='Сек на навигацию')
+    args = parser.parse_args()
+
+    # Лимит CRM не должен ограничивать замер протокола
+    config.RATE_LIMIT_INITIAL = config.RATE_LIMIT_MAX = config.RATE_LIMIT_BURST = 10000
+    logger.setLevel('WARNING')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.PHONE_INDEX_DIR = str(Path(tmp) / 'index')
+        db = Database(str(Path(tmp) / 'coordinator.db'))
+        for i in range(1, args.accounts + 1):
+            db.add_account(str(i), f'user{i}', f'https://crm.local/signin?token={i}')
+
+        coordinator = Coordinator('127.0.0.1', 0, db).start()
+        results = mp.Queue()
+        started = time.perf_counter()
+        processes = [mp.Process(target=worker, args=(coordinator.address, i, args, results))
+                     for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+        coordinator.stop()
+
+        with sqlite3.connect(db.db_path) as conn:
+            completed = conn.execute("SELECT COUNT(*) FROM accounts WHERE status = 'completed'").fetchone()[0]
+            leased = conn.execute('SELECT COUNT(*) FROM accounts WHERE lease_owner IS NOT NULL').fetchone()[0]
+        phones = db.get_total_phones()
+        beats = db.get_heartbeats()
+
+    processed = sum(count for count, _ in outcomes)
+    latencies = [latency for _, calls in outcomes for latency in calls]
+    pages = args.accounts * args.pages
+    print(f"{args.processes} воркеров, {args.accounts} аккаунтов по {args.pages} страниц: "
+          f"{elapsed:.2f} сек ({pages / elapsed:.0f} страниц/сек)")
+    print(f"Запросов к координатору: {len(latencies)}, p50 {percentile(latencies, 50) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} мс")
+
+    expected = args.accounts * args.pages * args.page_size
+    finished = sum(1 for beat in beats if beat['finished_at'])
+    pulsed = sum(beat['pages_done'] for beat in beats)
+    ok = (processed == completed == args.accounts and phones == expected and leased == 0
+          and finished == args.processes and pulsed == pages)
+    print(f"{'✅' if ok else '❌'} Обработано {processed}, completed {completed}, "
+          f"номеров {phones} из {expected}, аренд осталось {leased}, "
+          f"пульс: {finished} воркеров, {pulsed} страниц")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Микробенчмарк и проверка конкуренции для слоя Database
+
+Для каждого размера генерируется синтетическая БД (телефоны и аккаунты,
+половина аккаунтов уже completed), затем для каждого варианта PRAGMA/схемы
+на ее копии замеряются:
+    - задержка одиночных операций (p50/p99): add_phones, update_account_status,
+      acquire_account_for_processing, get_account, get_total_phones
+    - пропускная способность пакетной вставки (страница номеров)
+    - N процессов одновременно выполняют acquire -> add_phones -> completed:
+      операций в секунду, p99 под нагрузкой и ошибки "database is locked"
+
+Запуск:
+    python -m benchmarks.db_bench --phones 1000,100000,1000000 --processes 4
+    python -m benchmarks.db_bench --phones 100000000 --accounts 1000000 --variants default,wal_normal
+"""
+import json
+import time
+import shutil
+import sqlite3
+import tempfile
+import multiprocessing as mp
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Dict, List
+from database.db import Database
+
+FIRST_ACCOUNT_ID = 100000
+WAL_NORMAL = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+
+# Вариант -> (PRAGMA соединений, SQL изменения схемы после создания)
+VARIANTS = {
+    'default': ({}, None),
+    'wal': ({'journal_mode': 'WAL'}, None),
+    'wal_normal': (WAL_NORMAL, None),
+    'wal_normal_mmap': ({**WAL_NORMAL, 'cache_size': -65536, 'mmap_size': 268435456,
+                         'temp_store': 'MEMORY'}, None),
+    'no_phone_account_index': ({}, 'DROP INDEX IF EXISTS idx_phones_account'),
+    'no_queue_indexes': ({}, 'DROP INDEX IF EXISTS idx_accounts_queue_longest; '
+                             'DROP INDEX IF EXISTS idx_accounts_queue_shortest'),
+}
+
+BATCH_SIZE = 500  # Номеров на странице при пакетной вставке
+CONTENTION_BATCH = 50
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def build_database(path: Path, phones: int, accounts: int):
+    """Сгенерировать БД: номера поровну по аккаунтам, первая половина аккаунтов completed"""
+    db = Database(str(path), pragmas={})
+    per_account = max(1, phones // accounts)
+
+    with sqlite3.connect(path) as conn:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        # Загрузка без триггеров stats: агрегаты пересчитываются один раз в конце
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            conn.execute(f'DROP TRIGGER {name}')
+        conn.executemany('''
+            INSERT INTO accounts (account_id, username, token_url, status, size_estimate)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ((str(FIRST_ACCOUNT_ID + i), f'user{i}', f'https://crm.local/signin?token={i}',
+               'completed' if i < accounts // 2 else 'pending',
+               per_account + (i * 7919) % per_account)
+              for i in range(accounts)))
+        conn.executemany('''
+            INSERT INTO phones (account_id, phone_number) VALUES (?, ?)
+        ''', ((str(FIRST_ACCOUNT_ID + i // per_account % accounts), str(79000000000 + i))
+              for i in range(phones)))
+        conn.execute('PRAGMA journal_mode = DELETE')
+
+    # Схема заново создает триггеры
+    db._init_db()
+    db.rebuild_stats()
+
+
+def timed(func, reps: int, budget: float = 10.0) -> List[float]:
+    """Задержки вызовов, сек (не больше reps и примерно budget секунд)"""
+    latencies = []
+    deadline = time.perf_counter() + budget
+    for i in range(reps):
+        started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            break
+    return latencies
+
+
+def single_ops(db: Database, reps: int) -> Dict:
+    pending = [a['account_id'] for a in db.get_accounts_by_status('pending')[:reps]]
+    account_id = pending[0]
+    ops = {
+        'add_phones': lambda i: db.add_phones(account_id, [str(77000000000 + i)]),
+        'update_status': lambda i: db.update_account_status(account_id, 'in_progress', i),
+        'acquire': lambda i: db.acquire_account_for_processing('bench'),
+        'get_account': lambda i: db.get_account(pending[i % len(pending)]),
+        'total_phones': lambda i: db.get_total_phones(),
+    }
+    result = {}
+    for name, func in ops.items():
+        latencies = timed(func, reps)
+        result[f'{name}_p50_ms'] = round(percentile(latencies, 50) * 1000, 3)
+        result[f'{name}_p99_ms'] = round(percentile(latencies, 99) * 1000, 3)
+    # Взятые аккаунты нужны тесту конкуренции
+    db.release_leases('bench')
+
+    batches = timed(lambda i: db.add_phones(
+        account_id, [str(76000000000 + i * BATCH_SIZE + j) for j in range(BATCH_SIZE)]), reps)
+    result['batch_phones_per_sec'] = round(len(batches) * BATCH_SIZE / sum(batches))
+    return result
+
+
+def contention_worker(db: Database, worker_id: int, duration: float, results):
+    """Цикл воркера: взять аккаунт, сохранить страницу, завершить"""
+    latencies = {'acquire': [], 'add_phones': [], 'update_status': []}
+    locked = 0
+    cycles = 0
+    deadline = time.time() + duration
+
+    def call(name, func, *args):
+        started = time.perf_counter()
+        value = func(*args)
+        latencies[name].append(time.perf_counter() - started)
+        return value
+
+    while time.time() < deadline:
+        try:
+            account = call('acquire', db.acquire_account_for_processing, f'bench-{worker_id}')
+            if not account:
+                break
+            phones = [str(70000000000 + worker_id * 10 ** 9 + cycles * CONTENTION_BATCH + j)
+                      for j in range(CONTENTION_BATCH)]
+            call('add_phones', db.add_phones, account['account_id'], phones)
+            call('update_status', db.update_account_status, account['account_id'], 'completed')
+            cycles += 1
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+
+    results.put({'cycles': cycles, 'locked': locked, 'latencies': latencies})
+
+
+def contention(db: Database, processes: int, duration: float) -> Dict:
+    # Database передается готовым объектом: повторная инициализация
+    # схемы в воркерах вернула бы индексы, снятые вариантом
+    results = mp.Queue()
+    workers = [mp.Process(target=contention_worker, args=(db, i, duration, results))
+               for i in range(processes)]
+    started = time.time()
+    for w in workers:
+        w.start()
+    reports = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    elapsed = time.time() - started
+
+    merged = {name: [x for r in reports for x in r['latencies'][name]]
+              for name in reports[0]['latencies']}
+    cycles = sum(r['cycles'] for r in reports)
+    return {
+        'contention_cycles_per_sec': round(cycles / elapsed, 1),
+        'contention_acquire_p99_ms': round(percentile(merged['acquire'], 99) * 1000, 2),
+        'contention_add_phones_p99_ms': round(percentile(merged['add_phones'], 99) * 1000, 2),
+        'contention_update_p99_ms': round(percentile(merged['update_status'], 99) * 1000, 2),
+        'contention_locked_errors': sum(r['locked'] for r in reports),
+    }
+
+
+COLUMNS = [
+    ('add_phones_p50_ms', 'add 1, мс'),
+    ('update_status_p50_ms', 'status, мс'),
+    ('acquire_p50_ms', 'acquire, мс'),
+    ('total_phones_p50_ms', 'COUNT, мс'),
+    ('batch_phones_per_sec', 'пакет, ном/с'),
+    ('contention_cycles_per_sec', 'N проц, цикл/с'),
+    ('contention_acquire_p99_ms', 'acquire p99'),
+    ('contention_locked_errors', 'locked'),
+]
+
+
+def print_table(size: str, rows: Dict[str, Dict]):
+    print(f"\n{size}")
+    print(f"{'Вариант':<24}" + ''.join(f'{title:>16}' for _, title in COLUMNS))
+    for variant, metrics in rows.items():
+        print(f'{variant:<24}' + ''.join(f'{metrics[key]:>16}' for key, _ in COLUMNS))
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк слоя Database')
+    parser.add_argument('--phones', default='1000,100000,1000000',
+                        help='Размеры БД (номеров) через запятую, до 100000000')
+    parser.add_argument('--accounts', type=int,
+                        help='Аккаунтов (по умолчанию номера/100, от 100 до 1000000)')
+    parser.add_argument('--variants', default=','.join(VARIANTS))
+    parser.add_argument('--reps', type=int, default=200, help='Повторов одиночной операции')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Длительность теста конкуренции, сек')
+    parser.add_argument('--workdir', help='Каталог для БД (по умолчанию временный)')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    variants = args.variants.split(',')
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"Неизвестные варианты: {', '.join(sorted(unknown))}")
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='db_bench_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = {}
+
+    try:
+        for phones in map(int, args.phones.split(',')):
+            accounts = args.accounts or min(1000000, max(100, phones // 100))
+            size = f'{phones} номеров, {accounts} аккаунтов'
+            base = workdir / f'base_{phones}_{accounts}.db'
+
+            print(f"⏳ Генерация: {size}...")
+            started = time.time()
+            build_database(base, phones, accounts)
+            print(f"   готово за {time.time() - started:.1f} сек")
+
+            rows = {}
+            for name in variants:
+                pragmas, schema_sql = VARIANTS[name]
+                path = workdir / f'{name}.db'
+                shutil.copy(base, path)
+                db = Database(str(path), pragmas=pragmas)
+                if schema_sql:
+                    with db._connect() as conn:
+                        conn.executescript(schema_sql)
+
+                print(f"▶ {name}...")
+                rows[name] = {**single_ops(db, args.reps),
+                              **contention(db, args.processes, args.duration)}
+                for suffix in ('', '-wal', '-shm'):
+                    Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+            base.unlink()
+            report[size] = rows
+            print_table(size, rows)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Сквозной бенчмарк пропускной способности на локальной имитации CRM
+
+Поднимает FixtureCRM и во временном каталоге по очереди запускает
+main.py в режимах harvest, scrape и parallel. Для каждого режима
+считает accounts/sec, pages/sec, p50/p99 задержки страниц и пиковый
+RSS всего дерева процессов (Python + драйвер + Chromium).
+
+Сценарий refresh (после scrape или parallel, без сброса БД) добавляет в
+каждый аккаунт --growth новых номеров и запускает --mode refresh:
+число загруженных страниц сравнивается с полным обходом.
+
+Запуск:
+    python -m benchmarks.e2e --accounts 5 --phones 100-400 --output bench.json
+    python -m benchmarks.e2e --accounts 5 --phones 100-400 --compare bench.json
+    python -m benchmarks.e2e --scenarios harvest,scrape,refresh --list-order newest_first
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import tempfile
+import subprocess
+from pathlib import Path
+from argparse import ArgumentParser
+from collections import defaultdict
+from typing import Dict, List
+import psutil
+from benchmarks.fixture_crm import (FixtureCRM, start_server, parse_range, parse_faults,
+                                    LOGIN, PASSWORD)
+
+MAIN_PATH = Path(__file__).resolve().parent.parent / 'main.py'
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def tree_rss_mb(process: psutil.Process) -> float:
+    """RSS процесса и всех его потомков, МБ"""
+    try:
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for p in processes:
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024 / 1024
+
+
+def run_main(args: List[str], workdir: str, env: Dict, log_name: str):
+    """Запустить main.py и замерить время и пиковую память"""
+    started = time.time()
+    peak_rss = 0.0
+    with open(Path(workdir) / log_name, 'w', encoding='utf-8') as log:
+        process = subprocess.Popen([sys.executable, str(MAIN_PATH), *args],
+                                   cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        watched = psutil.Process(process.pid)
+        while process.poll() is None:
+            peak_rss = max(peak_rss, tree_rss_mb(watched))
+            time.sleep(0.2)
+    return started, time.time() - started, peak_rss, process.returncode
+
+
+def db_counts(db_path: Path) -> Dict:
+    with sqlite3.connect(db_path) as conn:
+        statuses = dict(conn.execute('SELECT status, COUNT(*) FROM accounts GROUP BY status'))
+        phones = conn.execute('SELECT COUNT(*) FROM phones').fetchone()[0]
+    return {'accounts': sum(statuses.values()), 'statuses': statuses, 'phones': phones}
+
+
+def reset_for_scrape(db_path: Path):
+    """Вернуть БД к состоянию сразу после harvest"""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('DELETE FROM phones')
+        conn.execute('DELETE FROM phone_accounts')
+        conn.execute('DELETE FROM page_hashes')
+        conn.execute('''
+            UPDATE accounts SET status = 'pending', phones_count = 0, last_page = 0,
+                lease_owner = NULL, lease_expires_at = NULL
+        ''')
+
+
+def summarize(crm: FixtureCRM, started: float, elapsed: float, peak_rss: float,
+              returncode: int, counts: Dict, accounts_done: int) -> Dict:
+    requests = crm.stats(since=started)
+    pages = [r for r in requests if r['path'] == '/phones']
+
+    # Цикл страницы глазами парсера: интервал между запросами страниц в сессии
+    by_session = defaultdict(list)
+    for r in pages:
+        by_session[r['session']].append(r['start'])
+    cycles = [b - a for starts in by_session.values()
+              for a, b in zip(sorted(starts), sorted(starts)[1:])]
+
+    return {
+        'returncode': returncode,
+        'elapsed_sec': round(elapsed, 2),
+        'accounts': accounts_done,
+        'pages': len(pages),
+        'requests': len(requests),
+        'faults': sum(1 for r in requests if r['fault']),
+        'phones': counts['phones'],
+        'accounts_per_sec': round(accounts_done / elapsed, 4) if elapsed else 0,
+        'pages_per_sec': round(len(pages) / elapsed, 4) if elapsed else 0,
+        'page_latency_p50_sec': round(percentile([r['duration'] for r in pages], 50), 4),
+        'page_latency_p99_sec': round(percentile([r['duration'] for r in pages], 99), 4),
+        'page_cycle_p50_sec': round(percentile(cycles, 50), 3),
+        'page_cycle_p99_sec': round(percentile(cycles, 99), 3),
+        'peak_rss_mb': round(peak_rss, 1),
+    }
+
+
+def compare(current: Dict, baseline: Dict):
+    """Вывести изменения метрик относительно прошлого прогона"""
+    print(f"\n{'Сценарий':<10}{'Метрика':<24}{'Было':>12}{'Стало':>12}{'Δ':>9}")
+    for name, metrics in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        for key, value in metrics.items():
+            old = base.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            delta = f"{(value - old) / old:+.1%}" if old else '—'
+            print(f"{name:<10}{key:<24}{old:>12}{value:>12}{delta:>9}")
+
+
+def main():
+    parser = ArgumentParser(description='Сквозной бенчмарк на имитации CRM')
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--phones', default='100-400', help='Телефонов в аккаунте: MIN-MAX')
+    parser.add_argument('--max-page-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--faults', default='clean',
+                        help='Профиль сбоев CRM или ВИД=ВЕРОЯТНОСТЬ,... (см. fixture_crm)')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--list-order', choices=['newest_first', 'oldest_first'], default='oldest_first',
+                        help='Куда CRM добавляет новые номера (сценарий refresh)')
+    parser.add_argument('--growth', type=float, default=0.05,
+                        help='Доля новых номеров в аккаунте перед сценарием refresh')
+    parser.add_argument('--scenarios', default='harvest,scrape,parallel')
+    parser.add_argument('--workdir', help='Каталог прогона (по умолчанию временный)')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    crm = FixtureCRM(accounts=args.accounts, phones=parse_range(args.phones),
+                     max_page_size=args.max_page_size,
+                     latency=args.latency, jitter=args.jitter,
+                     faults=parse_faults(args.faults), list_order=args.list_order)
+    server = start_server(crm)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='crm_bench_')
+    db_path = Path(workdir) / 'data' / 'phones.db'
+
+    env = dict(os.environ,
+               CRM_BASE_URL=f'http://127.0.0.1:{server.server_port}',
+               ADMIN_LOGIN=LOGIN, ADMIN_PASSWORD=PASSWORD,
+               PYTHONUNBUFFERED='1', CRM_REFRESH_MIN_AGE='0')
+
+    scenarios = {
+        'harvest': ['--mode', 'harvest'],
+        'scrape': ['--mode', 'scrape'],
+        'parallel': ['--mode', 'parallel', '--workers', str(args.workers),
+                     '--min-workers', str(args.workers)],
+        'refresh': ['--mode', 'refresh', '--list-order', args.list_order],
+    }
+
+    results = {}
+    for name in args.scenarios.split(','):
+        if name != 'harvest':
+            if not db_path.exists():
+                print(f"Пропуск {name}: сначала нужен harvest")
+                continue
+            if name == 'refresh':
+                print(f"  + {crm.grow(args.growth)} новых номеров в CRM")
+            else:
+                reset_for_scrape(db_path)
+
+        print(f"▶ {name}...")
+        started, elapsed, peak_rss, returncode = run_main(
+            scenarios[name], workdir, env, f'{name}.log')
+        counts = db_counts(db_path) if db_path.exists() else {'accounts': 0, 'statuses': {}, 'phones': 0}
+        done = counts['accounts'] if name == 'harvest' else counts['statuses'].get('completed', 0)
+        results[name] = summarize(crm, started, elapsed, peak_rss, returncode, counts, done)
+        if name != 'harvest':
+            results[name]['phones_expected'] = crm.expected_phones()
+
+    report = {
+        'config': {
+            'accounts': args.accounts, 'phones': args.phones, 'workers': args.workers,
+            'latency': args.latency, 'jitter': args.jitter,
+            'max_page_size': args.max_page_size, 'faults': args.faults,
+        },
+        'scenarios': results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Логи прогона: {workdir}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+    server.shutdown()
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
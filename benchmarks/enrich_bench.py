@@ -0,0 +1,82 @@
+"""
+Бенчмарк нормализации и обогащения номеров (utils.numbering)
+
+1. Нормализация: normalize_phone построчно против normalize_phones
+   пачкой на --normalize номерах в разной записи (результаты сверяются).
+2. Обогащение: синтетический план нумерации (коды 900-999, диапазоны по
+   --range-size номеров) и БД из --phones номеров (генератор db_bench);
+   --mode enrich проходит всю таблицу, замеряется скорость в номерах/сек.
+
+Запуск:
+    python -m benchmarks.enrich_bench
+    python -m benchmarks.enrich_bench --phones 5000000 --range-size 10000
+"""
+import time
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+import numpy as np
+import config
+from database.db import Database
+from utils.phones import normalize_phone
+from utils.numbering import normalize_phones, run_enrich
+from benchmarks.db_bench import build_database
+
+OPERATORS = ('ПАО "МТС"', 'ПАО "МегаФон"', 'ПАО "ВымпелКом"', 'ООО "Т2 Мобайл"')
+
+
+def write_plan(path: Path, range_size: int):
+    """План нумерации в формате выгрузки реестра: коды 900-999 целиком"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('АВС/ DEF;От;До;Емкость;Оператор;Регион\n')
+        for i, code in enumerate(range(900, 1000)):
+            for first in range(0, 10 ** 7, range_size):
+                carrier = (i + first // range_size) % (len(OPERATORS) * 85)
+                f.write(f'{code};{first:07d};{first + range_size - 1:07d};{range_size};'
+                        f'{OPERATORS[carrier % len(OPERATORS)]};Регион {carrier // len(OPERATORS)}\n')
+
+
+def sample_texts(count: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    texts = []
+    for i, number in enumerate((79000000000 + rng.integers(0, 10 ** 9, count)).tolist()):
+        digits = str(number)[1:]
+        texts.append((str(number), f'+7 ({digits[:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}',
+                      f'8 {digits[:3]} {digits[3:]}', digits)[i % 4])
+    return texts
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк нормализации и обогащения номеров')
+    parser.add_argument('--normalize', type=int, default=1000000)
+    parser.add_argument('--phones', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--range-size', type=int, default=100000)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.normalize)
+    started = time.perf_counter()
+    scalar = np.fromiter((normalize_phone(t) or -1 for t in texts), dtype=np.int64, count=len(texts))
+    scalar_time = time.perf_counter() - started
+    started = time.perf_counter()
+    vector = normalize_phones(texts)
+    vector_time = time.perf_counter() - started
+    assert (scalar == vector).all(), 'normalize_phones расходится с normalize_phone'
+    print(f"Нормализация {len(texts)}: построчно {scalar_time:.2f} сек, "
+          f"пачкой {vector_time:.2f} сек (x{scalar_time / vector_time:.1f})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config.NUMBERING_PLAN_PATH = str(tmp / 'plan.csv')
+        write_plan(tmp / 'plan.csv', args.range_size)
+        build_database(tmp / 'enrich.db', args.phones, args.accounts)
+        db = Database(str(tmp / 'enrich.db'))
+
+        started = time.perf_counter()
+        done = run_enrich(db)
+        elapsed = time.perf_counter() - started
+    print(f"Обогащение: {done} номеров за {elapsed:.2f} сек ({done / elapsed / 1e3:.0f} тыс. номеров/сек)")
+
+
+if __name__ == '__main__':
+    main()
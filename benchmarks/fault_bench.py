@@ -0,0 +1,194 @@
+"""
+Бенчмарк восстановления после сбоев CRM
+
+Для каждого профиля сбоев (FAULT_PROFILES из fixture_crm) на имитации CRM
+прогоняются login_to_admin, AccountHarvester и PhoneScraper. По каждому
+этапу считается:
+    useful      - полезный результат (входы, токены, номера)
+    useful/sec  - полезная пропускная способность
+    wasted_sec  - время сверх того, что чистому прогону нужно на тот же результат
+    lost        - доля несобранного результата
+
+Чистый профиль прогоняется всегда: он - точка отсчета для wasted_sec.
+
+Запуск:
+    python -m benchmarks.fault_bench --profiles drop,5xx,login_redirect --accounts 5
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Dict
+from benchmarks.fixture_crm import (FixtureCRM, FAULT_PROFILES, start_server, parse_range,
+                                    LOGIN, PASSWORD)
+
+STAGES = ('login', 'harvest', 'scrape')
+
+
+def run_login(page, attempts: int) -> Dict:
+    from scraper.auth import login_to_admin
+
+    useful = 0
+    started = time.time()
+    for _ in range(attempts):
+        page.context.clear_cookies()
+        if login_to_admin(page):
+            useful += 1
+    return {'useful': useful, 'expected': attempts, 'elapsed': time.time() - started}
+
+
+def run_harvest(page, db, crm: FixtureCRM) -> Dict:
+    from scraper.auth import login_to_admin
+    from scraper.harvester import AccountHarvester
+
+    # Вход - отдельный этап, здесь он только подготовка
+    crm.faults, faults = {}, crm.faults
+    page.context.clear_cookies()
+    login_to_admin(page)
+    crm.faults = faults
+
+    error = None
+    started = time.time()
+    try:
+        AccountHarvester(page, db).harvest_all_accounts()
+    except Exception as e:
+        error = str(e)
+    elapsed = time.time() - started
+
+    # Аккаунт сохраняется только вместе с полученным токеном
+    harvested = sum(db.get_status_counts().values())
+    return {'useful': harvested, 'expected': len(crm.accounts),
+            'elapsed': elapsed, 'error': error}
+
+
+def run_scrape(page, browser, db, crm: FixtureCRM, base_url: str) -> Dict:
+    from scraper.phone_scraper import PhoneScraper
+
+    # Токены берутся из имитации напрямую: сбои сбора токенов здесь не при чем
+    for a in crm.accounts:
+        db.add_account(a['account_id'], a['username'], f"{base_url}/signin?token={a['token']}")
+
+    scraper = PhoneScraper(page, db, browser=browser)
+    started = time.time()
+    for a in crm.accounts:
+        scraper.scrape_account(a['account_id'], f"{base_url}/signin?token={a['token']}")
+    elapsed = time.time() - started
+
+    return {'useful': db.get_total_phones(), 'expected': crm.expected_phones(),
+            'elapsed': elapsed, 'failed_accounts': len(db.get_accounts_by_status('failed'))}
+
+
+def run_profile(name: str, crm: FixtureCRM, base_url: str, workdir: Path,
+                stages, logins: int) -> Dict:
+    from database.db import Database
+    from scraper.browser import BrowserManager
+
+    crm.faults = dict(FAULT_PROFILES[name])
+    crm.sessions.clear()
+    results = {}
+
+    with BrowserManager(headless=True) as browser:
+        page = browser.new_page()
+        for stage in stages:
+            # Свежая БД на этап: лимитер стартует с одного темпа для всех профилей
+            db = Database(str(workdir / f'{name}_{stage}.db'))
+            since = time.time()
+            if stage == 'login':
+                result = run_login(page, logins)
+            elif stage == 'harvest':
+                result = run_harvest(page, db, crm)
+            else:
+                # Последний этап: PhoneScraper может пересоздать страницу
+                result = run_scrape(page, browser, db, crm, base_url)
+
+            requests = crm.stats(since)
+            result['requests'] = len(requests)
+            result['faults'] = sum(1 for r in requests if r['fault'])
+            result['browser_restarts'] = browser.restarts
+            results[stage] = result
+
+    return results
+
+
+def add_derived(report: Dict):
+    """Полезная скорость, потерянное время и доля потерь относительно clean"""
+    clean = report['clean']
+    for profile in report.values():
+        for stage, result in profile.items():
+            elapsed, useful = result['elapsed'], result['useful']
+            result['useful_per_sec'] = round(useful / elapsed, 4) if elapsed else 0.0
+            result['lost'] = round(1 - useful / result['expected'], 4) if result['expected'] else 0.0
+
+            base = clean.get(stage)
+            sec_per_unit = base['elapsed'] / base['useful'] if base and base['useful'] else None
+            result['wasted_sec'] = (round(max(0.0, elapsed - useful * sec_per_unit), 2)
+                                    if sec_per_unit is not None else None)
+            result['elapsed'] = round(elapsed, 2)
+
+
+def print_table(report: Dict):
+    print(f"\n{'Профиль':<16}{'Этап':<9}{'Полезно':>12}{'Сбоев':>7}"
+          f"{'Время,с':>9}{'Полезно/с':>11}{'Потеряно,с':>12}{'Потери':>8}")
+    for name, profile in report.items():
+        for stage, r in profile.items():
+            wasted = '—' if r['wasted_sec'] is None else f"{r['wasted_sec']:.1f}"
+            print(f"{name:<16}{stage:<9}{r['useful']:>6}/{r['expected']:<5}{r['faults']:>7}"
+                  f"{r['elapsed']:>9.1f}{r['useful_per_sec']:>11.2f}{wasted:>12}{r['lost']:>8.1%}")
+
+
+def main():
+    parser = ArgumentParser(description='Пропускная способность при сбоях CRM')
+    parser.add_argument('--profiles', default=','.join(FAULT_PROFILES),
+                        help=f"Через запятую: {', '.join(FAULT_PROFILES)}")
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--phones', default='100-300', help='Телефонов в аккаунте: MIN-MAX')
+    parser.add_argument('--logins', type=int, default=5, help='Попыток входа на профиль')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--slow-delay', type=float, default=5.0)
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    profiles = [p for p in args.profiles.split(',') if p != 'clean']
+    unknown = set(profiles) - set(FAULT_PROFILES)
+    if unknown:
+        parser.error(f"Неизвестные профили: {', '.join(sorted(unknown))}")
+    stages = [s for s in STAGES if s in args.stages.split(',')]
+
+    crm = FixtureCRM(accounts=args.accounts, phones=parse_range(args.phones),
+                     latency=args.latency, slow_delay=args.slow_delay)
+    server = start_server(crm)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    # config читает адрес CRM и учетные данные при импорте,
+    # поэтому модули проекта импортируются только после этого
+    os.environ.update(CRM_BASE_URL=base_url, ADMIN_LOGIN=LOGIN, ADMIN_PASSWORD=PASSWORD)
+
+    # Скриншоты и логи отладки пишутся в текущий каталог
+    workdir = Path(tempfile.mkdtemp(prefix='crm_faults_'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    report = {}
+    try:
+        for name in ['clean'] + profiles:
+            print(f"▶ Профиль {name}...")
+            report[name] = run_profile(name, crm, base_url, workdir, stages, args.logins)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    add_derived(report)
+    print_table(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'profiles': report}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+"""
+Локальная имитация CRM для бенчмарков и проверок без продакшена
+
+Повторяет то, на что опирается парсер: вход в админку, Vue-таблицу
+аккаунтов с кнопкой create-token, вход по токен-ссылке и таблицу
+телефонов с пагинацией и выбором размера страницы (updatepagesize).
+
+Умеет внедрять сбои (FAULT_KINDS) с заданной вероятностью на запрос,
+чтобы мерить, сколько времени съедают повторы и восстановление.
+
+Запуск отдельно (по умолчанию - свободный порт, адрес печатается при
+старте; фиксированный --port не должен совпадать с COORDINATOR_PORT):
+    python -m benchmarks.fixture_crm --accounts 20 --phones 100-2000
+    python -m benchmarks.fixture_crm --port 8780 --faults slow=0.2,drop=0.05
+"""
+import json
+import time
+import random
+import secrets
+import threading
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List, Optional, Tuple
+
+LOGIN = 'bench'
+PASSWORD = 'bench'
+FIRST_ACCOUNT_ID = 100000
+
+# Вид сбоя -> пути, на которых он возможен (None - любой путь)
+FAULT_KINDS = {
+    'drop': None,  # Соединение закрывается без ответа
+    '5xx': None,  # 503 Service Unavailable
+    'slow': None,  # Ответ задерживается на slow_delay
+    'login_redirect': ('/admin/dashboard', '/admin/visit/rt-admin', '/phones'),  # Сессия истекла
+    'empty_table': ('/admin/visit/rt-admin', '/phones'),  # Таблица без строк
+    'no_dialog': ('/admin/user/create-token',),  # Ссылка не приходит, alert не появляется
+}
+
+# Готовые профили для бенчмарков: вид сбоя -> вероятность на запрос
+FAULT_PROFILES = {
+    'clean': {},
+    'slow': {'slow': 0.2},
+    'drop': {'drop': 0.05},
+    '5xx': {'5xx': 0.1},
+    'empty_table': {'empty_table': 0.1},
+    'login_redirect': {'login_redirect': 0.05},
+    'no_dialog': {'no_dialog': 0.2},
+    'mixed': {'drop': 0.02, '5xx': 0.03, 'slow': 0.05, 'login_redirect': 0.02,
+              'empty_table': 0.03, 'no_dialog': 0.05},
+}
+
+
+class FixtureCRM:
+    """Данные и состояние имитации CRM"""
+
+    def __init__(self, accounts: int = 10, phones: Tuple[int, int] = (100, 500),
+                 accounts_per_page: int = 200, page_size_options=(10, 20, 50),
+                 max_page_size: int = 500, latency: float = 0.05, jitter: float = 0.05,
+                 overlap: float = 0.0, seed: int = 42,
+                 faults: Dict[str, float] = None, slow_delay: float = 5.0,
+                 list_order: str = 'oldest_first'):
+        """
+        Args:
+            phones: Диапазон числа телефонов в аккаунте (min, max)
+            page_size_options: Размеры в dropdown "Длина страницы"
+            max_page_size: Максимум, который CRM принимает через updatepagesize
+            latency, jitter: Задержка ответа (сек) и случайная добавка к ней
+            overlap: Доля номеров из общего пула (встречаются в разных аккаунтах)
+            faults: Вероятность сбоя на запрос по видам (см. FAULT_KINDS)
+            slow_delay: Дополнительная задержка сбоя slow, сек
+            list_order: Куда grow() добавляет новые номера: в начало списка
+                (newest_first) или в конец (oldest_first)
+        """
+        unknown = set(faults or {}) - set(FAULT_KINDS)
+        if unknown:
+            raise ValueError(f"Неизвестные виды сбоев: {', '.join(sorted(unknown))}")
+        self.accounts_per_page = accounts_per_page
+        self.page_size_options = page_size_options
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = dict(faults or {})
+        self.slow_delay = slow_delay
+        self.list_order = list_order
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, Dict] = {}
+        self.requests: List[Dict] = []
+
+        shared_pool = [79000000000 + i for i in range(1000)]
+        self.accounts = []
+        for i in range(accounts):
+            account_rng = random.Random(seed * 1000003 + i)
+            count = account_rng.randint(*phones)
+            numbers = []
+            for j in range(count):
+                if overlap and account_rng.random() < overlap:
+                    numbers.append(str(account_rng.choice(shared_pool)))
+                else:
+                    numbers.append(str(79100000000 + i * 1000000 + j))
+            self.accounts.append({
+                'account_id': str(FIRST_ACCOUNT_ID + i),
+                'username': f'bench-user-{i}',
+                'token': f'tok{FIRST_ACCOUNT_ID + i}',
+                'phones': numbers,
+                'next_phone': count,
+            })
+        self.by_token = {a['token']: a for a in self.accounts}
+
+    def grow(self, fraction: float) -> int:
+        """Добавить в каждый аккаунт долю новых номеров (суточный прирост), вернуть их число"""
+        added = 0
+        with self.lock:
+            for i, account in enumerate(self.accounts):
+                count = max(1, int(len(account['phones']) * fraction))
+                first = account['next_phone']
+                numbers = [str(79100000000 + i * 1000000 + j) for j in range(first, first + count)]
+                account['next_phone'] += count
+                if self.list_order == 'newest_first':
+                    account['phones'][:0] = numbers[::-1]
+                else:
+                    account['phones'].extend(numbers)
+                added += count
+        return added
+
+    def expected_phones(self) -> int:
+        """Число уникальных номеров во всех аккаунтах"""
+        return len({p for a in self.accounts for p in a['phones']})
+
+    def pick_fault(self, path: str) -> Optional[str]:
+        """Разыграть сбой для запроса (не больше одного на запрос)"""
+        with self.lock:
+            for kind, rate in self.faults.items():
+                paths = FAULT_KINDS[kind]
+                if (paths is None or path in paths) and self.rng.random() < rate:
+                    return kind
+        return None
+
+    def record(self, path: str, session: str, started: float, status: int,
+               fault: str = None):
+        with self.lock:
+            self.requests.append({
+                'path': path, 'session': session, 'start': started,
+                'duration': time.time() - started, 'status': status, 'fault': fault,
+            })
+
+    def stats(self, since: float = 0.0) -> List[Dict]:
+        with self.lock:
+            return [r for r in self.requests if r['start'] >= since]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'FixtureCRM/1.0'
+
+    @property
+    def crm(self) -> FixtureCRM:
+        return self.server.crm
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- Сессии и ответы ---
+
+    def _session(self) -> Tuple[str, Dict]:
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        sid = cookie['sid'].value if 'sid' in cookie else None
+        with self.crm.lock:
+            if sid not in self.crm.sessions:
+                sid = secrets.token_hex(8)
+                self.crm.sessions[sid] = {'admin': False, 'account': None, 'page_size': 10}
+            return sid, self.crm.sessions[sid]
+
+    def _send(self, status: int, body: str = '', content_type: str = 'text/html; charset=utf-8',
+              headers: Dict = None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Set-Cookie', f'sid={self.sid}; Path=/')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.status = status
+
+    def _redirect(self, location: str):
+        self._send(302, headers={'Location': location})
+
+    def _page(self, title: str, content: str) -> str:
+        return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+                f'</head><body><div class="main-header">CRM</div>{content}</body></html>')
+
+    # --- Маршрутизация ---
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method: str):
+        started = time.time()
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        self.sid, self.session = self._session()
+        self.status = 0
+        self.fault = None
+
+        if url.path != '/__stats':
+            delay = self.crm.latency + self.crm.rng.random() * self.crm.jitter
+            if delay > 0:
+                time.sleep(delay)
+            self.fault = self.crm.pick_fault(url.path)
+
+        routes = {
+            ('GET', '/admin'): self.admin_home,
+            ('GET', '/admin/login'): self.login_form,
+            ('POST', '/admin/login'): self.login_submit,
+            ('GET', '/admin/dashboard'): self.admin_home,
+            ('GET', '/admin/visit/rt-admin'): self.accounts_page,
+            ('GET', '/admin/user/create-token'): self.create_token,
+            ('GET', '/signin'): self.signin,
+            ('GET', '/phones'): self.phones_page,
+            ('GET', '/site/updatepagesize'): self.update_page_size,
+            ('GET', '/__stats'): self.stats,
+        }
+        handler = routes.get((method, url.path))
+        try:
+            if self.fault == 'drop':
+                self.close_connection = True
+            elif self.fault == '5xx':
+                self._send(503, self._page('503', 'Service Unavailable'))
+            elif self.fault == 'login_redirect':
+                self.session['admin'] = False
+                self.session['account'] = None
+                self._redirect('/admin/login')
+            else:
+                if self.fault == 'slow':
+                    time.sleep(self.crm.slow_delay)
+                if handler:
+                    handler()
+                else:
+                    self._send(404, self._page('404', 'Not found'))
+        finally:
+            self.crm.record(url.path, self.sid, started, self.status, self.fault)
+
+    # --- Админка ---
+
+    def admin_home(self):
+        if not self.session['admin']:
+            return self._redirect('/admin/login')
+        self._send(200, self._page('Админка', '<nav class="navbar">Панель администратора</nav>'))
+
+    def login_form(self):
+        self._send(200, self._page('Вход', '''
+            <form method="post" action="/admin/login">
+                <input type="text" name="LoginForm[username]" id="loginform-username">
+                <input type="password" name="LoginForm[password]" id="loginform-password">
+                <button type="submit" class="btn-primary">Вход</button>
+            </form>'''))
+
+    def login_submit(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if (form.get('LoginForm[username]', [''])[0] == LOGIN
+                and form.get('LoginForm[password]', [''])[0] == PASSWORD):
+            self.session['admin'] = True
+            return self._redirect('/admin/dashboard')
+        self._send(200, self._page('Вход', '<div class="alert-danger">Неверный логин или пароль</div>'))
+
+    def accounts_page(self):
+        if not self.session['admin']:
+            return self._redirect('/admin/login')
+
+        page = int(self.query.get('page', ['1'])[0])
+        per_page = self.crm.accounts_per_page
+        total = len(self.crm.accounts)
+        chunk = self.crm.accounts[(page - 1) * per_page:page * per_page]
+        shown = [] if self.fault == 'empty_table' else chunk
+
+        rows = ''.join(f'''
+            <tr><td>#{a['account_id']}</td><td>@{a['username']}</td><td>клиент</td>
+            <td><a href="#" title="Создать ссылку" onclick="fetch('/admin/user/create-token?id={a['account_id']}')
+                .then(r => r.text()).then(t => t && alert(t)); return false;">🔗</a></td></tr>'''
+            for a in shown)
+
+        last = (page - 1) * per_page + len(chunk)
+        has_next = page * per_page < total
+        next_button = (
+            f'<button class="v-btn" aria-label="next" onclick="location.href=\'?page={page + 1}\'">'
+            f'<i class="icon-chevron_right"></i></button>' if has_next else
+            '<button class="v-btn" aria-label="next" disabled><i class="icon-chevron_right"></i></button>')
+
+        self._send(200, self._page('Аккаунты', f'''
+            <table class="v-datatable"><thead><tr><th>ID</th><th>Пользователь</th><th>Тип</th><th></th></tr></thead>
+            <tbody>{rows}</tbody></table>
+            <div class="v-datatable__actions">
+                <div class="v-datatable_actions_pagination">{(page - 1) * per_page + 1}-{last} of {total}</div>
+                {next_button}
+            </div>'''))
+
+    def create_token(self):
+        if not self.session['admin']:
+            return self._send(403, 'Forbidden', 'text/plain')
+        if self.fault == 'no_dialog':
+            return self._send(200, '', 'text/plain')
+        account_id = self.query.get('id', [''])[0]
+        for a in self.crm.accounts:
+            if a['account_id'] == account_id:
+                host = self.headers.get('Host')
+                return self._send(200, f"http://{host}/signin?token={a['token']}", 'text/plain')
+        self._send(404, 'Unknown account', 'text/plain')
+
+    # --- Кабинет аккаунта ---
+
+    def signin(self):
+        account = self.crm.by_token.get(self.query.get('token', [''])[0])
+        if not account:
+            return self._redirect('/admin/login')
+        self.session['account'] = account['token']
+        self._redirect('/phones')
+
+    def update_page_size(self):
+        if not self.session['account']:
+            return self._redirect('/admin/login')
+        size = self.query.get('pageSize', ['10'])[0]
+        if size.isdigit() and int(size) > 0:
+            self.session['page_size'] = min(int(size), self.crm.max_page_size)
+        self._redirect('/phones')
+
+    def phones_page(self):
+        account = self.crm.by_token.get(self.session['account'])
+        if not account:
+            return self._redirect('/admin/login')
+
+        size = self.session['page_size']
+        phones = account['phones']
+        total = len(phones)
+        pages = max(1, -(-total // size))
+        page = min(max(1, int(self.query.get('page', ['1'])[0])), pages)
+        chunk = phones[(page - 1) * size:page * size]
+
+        rows = ''.join(
+            f'<tr data-key="{(page - 1) * size + i}"><td>{phone}</td><td>Проект {i % 7}</td></tr>'
+            for i, phone in enumerate(chunk if self.fault != 'empty_table' else []))
+        options = ''.join(
+            f'<li class="{"active" if option == size else ""}">'
+            f'<a href="/site/updatepagesize?pageSize={option}">{option}</a></li>'
+            for option in self.crm.page_size_options)
+        next_item = (f'<li class="next"><a href="/phones?page={page + 1}">»</a></li>'
+                     if page < pages else '<li class="next disabled"><span>»</span></li>')
+        first = (page - 1) * size + 1 if chunk else 0
+
+        self._send(200, self._page('Телефоны', f'''
+            <div class="btn-group">
+                <button class="btn dropdown-toggle" data-toggle="dropdown">Длина страницы</button>
+                <ul class="dropdown-menu">{options}</ul>
+            </div>
+            <div class="grid-view">
+                <div class="summary">Показаны записи {first}-{first + len(chunk) - 1 if chunk else 0} из {total}.</div>
+                <table class="table"><thead><tr><th>ТЕЛЕФОН</th><th>ПРОЕКТ</th></tr></thead>
+                <tbody>{rows}</tbody></table>
+                <ul class="pagination">{next_item}</ul>
+            </div>'''))
+
+    def stats(self):
+        since = float(self.query.get('since', ['0'])[0])
+        self._send(200, json.dumps(self.crm.stats(since)), 'application/json')
+
+
+def start_server(crm: FixtureCRM, port: int = 0) -> ThreadingHTTPServer:
+    """Запустить сервер в фоновом потоке. Порт 0 - любой свободный"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.crm = crm
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_range(value: str) -> Tuple[int, int]:
+    """'100-500' -> (100, 500); '300' -> (300, 300)"""
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def parse_faults(value: str) -> Dict[str, float]:
+    """'slow=0.2,drop=0.05' -> {'slow': 0.2, 'drop': 0.05}; имя профиля -> его сбои"""
+    if value in FAULT_PROFILES:
+        return dict(FAULT_PROFILES[value])
+    faults = {}
+    for item in filter(None, value.split(',')):
+        kind, _, rate = item.partition('=')
+        faults[kind.strip()] = float(rate)
+    return faults
+
+
+def main():
+    parser = ArgumentParser(description='Локальная имитация CRM')
+    parser.add_argument('--port', type=int, default=0, help='0 - любой свободный порт')
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--phones', default='100-500', help='Телефонов в аккаунте: MIN-MAX')
+    parser.add_argument('--max-page-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--overlap', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--faults', default='clean',
+                        help=f"Профиль ({', '.join(FAULT_PROFILES)}) или ВИД=ВЕРОЯТНОСТЬ,...")
+    parser.add_argument('--slow-delay', type=float, default=5.0)
+    parser.add_argument('--list-order', choices=['newest_first', 'oldest_first'], default='oldest_first')
+    args = parser.parse_args()
+
+    crm = FixtureCRM(accounts=args.accounts, phones=parse_range(args.phones),
+                     max_page_size=args.max_page_size, latency=args.latency,
+                     jitter=args.jitter, overlap=args.overlap, seed=args.seed,
+                     faults=parse_faults(args.faults), slow_delay=args.slow_delay,
+                     list_order=args.list_order)
+    server = start_server(crm, args.port)
+    print(f"Fixture CRM: http://127.0.0.1:{server.server_port} "
+          f"(логин {LOGIN}/{PASSWORD}, аккаунтов {args.accounts})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
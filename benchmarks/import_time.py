@@ -0,0 +1,126 @@
+"""
+Бюджет времени импорта для CLI и запуска воркеров
+
+Каждый сценарий выполняется в свежем интерпретаторе с -X importtime
+(несколько раз, берется медиана). Считается время импорта модулей
+сценария сверх голого интерпретатора и полное время процесса. Сценарий
+не проходит, если время импорта больше бюджета или загружен
+запрещенный модуль (например, pandas в воркере). Код возврата 1 при
+любом нарушении.
+
+Сценарии:
+    cli    - import main: общая цена любого режима (report, clear, stats, --help)
+    report - main + utils.report (pandas, openpyxl), без Playwright
+    worker - main + scraper.parallel_scraper: что импортирует воркер при spawn
+
+Запуск:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 9 --budget-scale 2 --output imports.json
+"""
+import sys
+import json
+import time
+import statistics
+import subprocess
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Сценарий -> (код, бюджет импорта в мс, запрещенные модули)
+SCENARIOS = {
+    'cli': ('import main', 250, ('playwright', 'pandas', 'numpy', 'openpyxl', 'http.server')),
+    'report': ('import main, utils.report', 1200, ('playwright',)),
+    'worker': ('import main, scraper.parallel_scraper', 800, ('pandas', 'openpyxl')),
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Строки -X importtime -> [(модуль, вложенность, cumulative мкс)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(cumulative)))
+    return rows
+
+
+def run_once(code: str) -> Tuple[List[Tuple[str, int, int]], float]:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{code}: {result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr), wall
+
+
+def measure(code: str, repeat: int, baseline: set) -> Dict:
+    """Медиана времени импорта сверх интерпретатора, тяжелые и все загруженные модули"""
+    totals, walls = [], []
+    rows = []
+    for _ in range(repeat):
+        rows, wall = run_once(code)
+        totals.append(sum(us for name, depth, us in rows
+                          if depth == 0 and name not in baseline) / 1000)
+        walls.append(wall * 1000)
+    heaviest = sorted(((us / 1000, name) for name, depth, us in rows
+                       if depth <= 1 and name not in baseline), reverse=True)
+    return {
+        'import_ms': round(statistics.median(totals), 1),
+        'wall_ms': round(statistics.median(walls), 1),
+        'heaviest': [(name, round(ms, 1)) for ms, name in heaviest],
+        'modules': {name for name, _, _ in rows},
+    }
+
+
+def forbidden_loaded(modules: set, forbidden: Tuple[str, ...]) -> List[str]:
+    return sorted(f for f in forbidden
+                  if any(m == f or m.startswith(f + '.') for m in modules))
+
+
+def main():
+    parser = ArgumentParser(description='Время импорта CLI и воркеров')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=5, help='Запусков на сценарий')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Множитель бюджетов (медленная машина, CI)')
+    parser.add_argument('--top', type=int, default=5, help='Самых тяжелых модулей в отчете')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    baseline = {name for name, _, _ in run_once('pass')[0]}
+    report = {}
+    failed = False
+
+    print(f"{'Сценарий':<10}{'Импорт, мс':>12}{'Процесс, мс':>13}{'Бюджет, мс':>12}")
+    for name in args.scenarios.split(','):
+        code, budget, forbidden = SCENARIOS[name]
+        budget *= args.budget_scale
+        result = measure(code, args.repeat, baseline)
+        loaded = forbidden_loaded(result.pop('modules'), forbidden)
+
+        over = result['import_ms'] > budget
+        status = '❌' if over or loaded else '✅'
+        failed |= status == '❌'
+        print(f"{name:<10}{result['import_ms']:>12.1f}{result['wall_ms']:>13.1f}{budget:>12.0f}  {status}")
+        for module, ms in result['heaviest'][:args.top]:
+            print(f"{'':<12}{ms:>8.1f}  {module}")
+        if loaded:
+            print(f"{'':<12}запрещенные модули: {', '.join(loaded)}")
+
+        report[name] = {**result, 'budget_ms': budget, 'forbidden_loaded': loaded}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Бенчмарк фильтра известных номеров (utils.known_phones)
+
+Во временной БД из --phones номеров (генератор db_bench) аккаунт
+получает --pages страниц по --page-size номеров, доля --known из них уже
+привязана к нему (перекрывающиеся тенанты, повторный обход). Одни и те
+же страницы пишутся через add_phones без фильтра и с фильтром, каждый
+раз на свежей копии БД. Печатаются страницы/сек, доля попаданий фильтра
+и число страниц, не дошедших до SQLite.
+
+Запуск:
+    python -m benchmarks.known_filter_bench
+    python -m benchmarks.known_filter_bench --phones 2000000 --known 0.9 --max-mb 8
+"""
+import time
+import shutil
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import List
+import numpy as np
+import config
+from database.db import Database
+from utils.known_phones import prepare
+from utils.metrics import metrics
+from benchmarks.db_bench import build_database, FIRST_ACCOUNT_ID
+
+
+def make_pages(phones: int, accounts: int, pages: int, page_size: int, known: float) -> List[List[str]]:
+    """Страницы первого аккаунта: доля known - его номера из БД, остальные новые"""
+    rng = np.random.default_rng(5)
+    per_account = max(1, phones // accounts)
+    result = []
+    next_new = 78000000000
+    for _ in range(pages):
+        page = []
+        for is_known in (rng.random(page_size) < known).tolist():
+            if is_known:
+                page.append(str(79000000000 + int(rng.integers(0, per_account))))
+            else:
+                page.append(str(next_new))
+                next_new += 1
+        result.append(page)
+    return result
+
+
+def run(db_path: Path, pages: List[List[str]], use_filter: bool) -> float:
+    db = Database(str(db_path))
+    if use_filter:
+        prepare(db)
+        db.enable_known_filter()
+    started = time.perf_counter()
+    for page in pages:
+        db.add_phones(str(FIRST_ACCOUNT_ID), page)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк фильтра известных номеров')
+    parser.add_argument('--phones', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--known', type=float, default=0.95, help='Доля уже известных номеров на странице')
+    parser.add_argument('--max-mb', type=int, default=config.KNOWN_PHONES_MAX_MB)
+    args = parser.parse_args()
+
+    config.KNOWN_PHONES_MAX_MB = args.max_mb
+    pages = make_pages(args.phones, args.accounts, args.pages, args.page_size, args.known)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        config.PHONE_INDEX_DIR = str(tmp / 'index')
+        source = tmp / 'source.db'
+        print(f"⏳ БД: {args.phones} номеров, {args.accounts} аккаунтов...")
+        build_database(source, args.phones, args.accounts)
+
+        results = {}
+        for name, use_filter in (('без фильтра', False), ('с фильтром', True)):
+            path = tmp / f'{use_filter}.db'
+            shutil.copy(source, path)
+            results[name] = run(path, pages, use_filter)
+
+    counters = {dict(labels).get('result', name): value for (name, labels), value in metrics.counters.items()
+                if name.startswith('crm_known_filter')}
+    for name, elapsed in results.items():
+        print(f"{name:<12} {elapsed:6.2f} сек ({len(pages) / elapsed:7.1f} страниц/сек)")
+    print(f"Ускорение: x{results['без фильтра'] / results['с фильтром']:.1f}")
+    hits, misses = counters.get('hit', 0), counters.get('miss', 0)
+    print(f"Попаданий фильтра: {hits / max(hits + misses, 1):.1%}, страниц без SQLite: "
+          f"{counters.get('crm_known_filter_pages_skipped_total', 0):.0f} из {len(pages)}")
+
+
+if __name__ == '__main__':
+    main()
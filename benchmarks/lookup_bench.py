@@ -0,0 +1,88 @@
+"""
+Бенчмарк пакетного поиска номеров (--mode lookup)
+
+Во временной БД создаются --attributions привязок (генератор из
+overlap_bench), входной файл из --inputs номеров в разной записи
+('+7 (9xx) ...', '8 9xx ...', без кода страны), примерно половина из
+них есть в базе. Замеряются сборка индекса, скорость поиска с записью
+CSV и прирост RSS процесса: память не должна расти с размером входа.
+
+Запуск:
+    python -m benchmarks.lookup_bench
+    python -m benchmarks.lookup_bench --attributions 5000000 --inputs 20000000
+"""
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+import numpy as np
+import psutil
+import config
+from database.db import Database
+from utils.phone_index import PhoneIndex, run_lookup
+from benchmarks.overlap_bench import synthetic
+
+FORMATS = ('{}', '+7 ({}) {}-{}-{}', '8 {} {} {} {}', '{}')
+
+
+def write_inputs(path: Path, phones: np.ndarray, count: int, seed: int = 2):
+    """Входной файл: половина номеров из базы, половина случайных, в разной записи"""
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, count, config.LOOKUP_CHUNK):
+            size = min(config.LOOKUP_CHUNK, count - start)
+            known = phones[rng.integers(0, len(phones), size)]
+            unknown = 79000000000 + rng.integers(0, 10 ** 9, size)
+            numbers = np.where(rng.random(size) < 0.5, known, unknown)
+            lines = []
+            for i, number in enumerate(numbers.tolist()):
+                digits = str(number)[1:]
+                fmt = i % len(FORMATS)
+                if fmt == 0:
+                    lines.append(str(number))
+                elif fmt == 3:
+                    lines.append(digits)
+                else:
+                    lines.append(FORMATS[fmt].format(digits[:3], digits[3:6], digits[6:8], digits[8:]))
+            f.write('\n'.join(lines) + '\n')
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк --mode lookup')
+    parser.add_argument('--attributions', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--inputs', type=int, default=2000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db = Database(str(tmp / 'lookup.db'), pragmas={})
+        phones, owners = synthetic(args.attributions, args.accounts, 0.9)
+        print(f"⏳ Подготовка: {len(phones)} привязок, {args.inputs} входных номеров...")
+        with sqlite3.connect(db.db_path) as conn:
+            conn.executemany('INSERT INTO accounts (account_id, username, token_url, phones_count) VALUES (?, ?, ?, ?)',
+                             ((str(i), f'user{i}', '', int(n))
+                              for i, n in enumerate(np.bincount(owners, minlength=args.accounts + 1)) if i))
+            conn.executemany('INSERT INTO phone_accounts (phone, account) VALUES (?, ?)',
+                             zip(phones.tolist(), owners.tolist()))
+        write_inputs(tmp / 'numbers.txt', phones, args.inputs)
+
+        config.PHONE_INDEX_DIR = str(tmp / 'index')
+        started = time.perf_counter()
+        PhoneIndex(db, config.PHONE_INDEX_DIR).build()
+        build = time.perf_counter() - started
+
+        rss_before = psutil.Process().memory_info().rss
+        started = time.perf_counter()
+        totals = run_lookup(db, str(tmp / 'numbers.txt'), str(tmp / 'lookup.csv'))
+        elapsed = time.perf_counter() - started
+        rss_after = psutil.Process().memory_info().rss
+
+    print(f"Сборка индекса: {build:.2f} сек ({len(phones) / build / 1e6:.2f} млн привязок/сек)")
+    print(f"Поиск: {elapsed:.2f} сек ({totals['input'] / elapsed / 1e6:.2f} млн номеров/сек), "
+          f"найдено {totals['found']} из {totals['input']}, RSS +{(rss_after - rss_before) / 2 ** 20:.0f} МБ")
+
+
+if __name__ == '__main__':
+    main()
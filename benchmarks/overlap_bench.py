@@ -0,0 +1,85 @@
+"""
+Бенчмарк анализа пересечений аккаунтов (utils.overlap)
+
+Расчет (overlap_stats) замеряется на синтетических массивах нужного
+размера без SQLite: номера выбираются случайно из пула, меньшего числа
+привязок, поэтому часть номеров попадает в несколько аккаунтов. Загрузка
+из phone_accounts (load_attributions) замеряется отдельно на БД
+--load-rows привязок и пересчитывается в строки/сек.
+
+Запуск:
+    python -m benchmarks.overlap_bench --attributions 100000000 --accounts 1000000
+    python -m benchmarks.overlap_bench --attributions 10000000 --load-rows 2000000
+"""
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+import numpy as np
+import psutil
+from database.db import Database
+from utils.overlap import load_attributions, overlap_stats
+
+FIRST_PHONE = 79000000000
+
+
+def synthetic(attributions: int, accounts: int, pool_ratio: float, seed: int = 1):
+    """Привязки в порядке первичного ключа phone_accounts (без повторов пар)"""
+    rng = np.random.default_rng(seed)
+    phones = FIRST_PHONE + rng.integers(0, max(1, int(attributions * pool_ratio)), attributions)
+    owners = rng.integers(1, accounts + 1, attributions).astype(np.int32)
+    order = np.lexsort((owners, phones))
+    phones, owners = phones[order], owners[order]
+    keep = np.ones(len(phones), dtype=bool)
+    keep[1:] = (phones[1:] != phones[:-1]) | (owners[1:] != owners[:-1])
+    return phones[keep], owners[keep]
+
+
+def bench_load(rows: int, accounts: int) -> float:
+    """Строк/сек при загрузке phone_accounts в массивы"""
+    phones, owners = synthetic(rows, accounts, 0.9)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / 'overlap.db'), pragmas={})
+        with sqlite3.connect(db.db_path) as conn:
+            conn.executemany('INSERT INTO phone_accounts (phone, account) VALUES (?, ?)',
+                             zip(phones.tolist(), owners.tolist()))
+        started = time.perf_counter()
+        loaded, _ = load_attributions(db)
+        elapsed = time.perf_counter() - started
+    return len(loaded) / elapsed
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк анализа пересечений')
+    parser.add_argument('--attributions', type=int, default=10000000)
+    parser.add_argument('--accounts', type=int, default=100000)
+    parser.add_argument('--pool-ratio', type=float, default=0.9,
+                        help='Размер пула номеров относительно числа привязок (меньше - больше общих)')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--load-rows', type=int, default=0,
+                        help='Замерить загрузку из SQLite на стольких привязках')
+    args = parser.parse_args()
+
+    print(f"⏳ Генерация {args.attributions} привязок, {args.accounts} аккаунтов...")
+    phones, owners = synthetic(args.attributions, args.accounts, args.pool_ratio)
+    rss_before = psutil.Process().memory_info().rss
+
+    started = time.perf_counter()
+    stats = overlap_stats(phones, owners, args.top)
+    elapsed = time.perf_counter() - started
+    peak = psutil.Process().memory_info().rss
+
+    print(f"Привязок: {stats['attributions']}, номеров: {stats['phones']}, "
+          f"общих: {stats['shared_phones']}, пар в топе: {len(stats['top_pairs'])}")
+    print(f"Расчет: {elapsed:.2f} сек ({stats['attributions'] / elapsed / 1e6:.1f} млн привязок/сек), "
+          f"RSS +{(peak - rss_before) / 2 ** 20:.0f} МБ")
+
+    if args.load_rows:
+        rate = bench_load(args.load_rows, args.accounts)
+        print(f"Загрузка из SQLite: {rate / 1e6:.2f} млн строк/сек "
+              f"(≈{args.attributions / rate:.0f} сек на {args.attributions} привязок)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Бенчмарк пула разбора страниц телефонов (scraper/page_parser.py)
+
+Без браузера: навигация - sleep(--latency) (поток браузера ждет сеть и
+не держит GIL), страница - --rows строк таблицы в разной записи номера.
+Для каждого PARSE_POOL страницы разбираются так же, как в
+PhoneScraper.scrape_account: разбор уходит в пул, результаты забираются
+в порядке страниц не более чем с PARSE_AHEAD страниц отставания.
+Печатаются страницы/сек и время сверх самой навигации - сколько браузер
+простаивал из-за разбора.
+
+Запуск:
+    python -m benchmarks.parse_pool_bench
+    python -m benchmarks.parse_pool_bench --rows 1000 --latency 0.05
+"""
+import time
+from collections import deque
+from argparse import ArgumentParser
+from typing import List
+import config
+from scraper.page_parser import ParsePool, Row
+
+FORMATS = ('+7 ({}) {}-{}-{}', '8 {} {} {} {}', '7{}{}{}{}')
+
+
+def make_page(page: int, rows: int) -> List[Row]:
+    result = [('№\tТЕЛЕФОН\tПРОЕКТ\tДАТА', [])]
+    for i in range(rows):
+        digits = str(9000000000 + page * rows + i)
+        phone = FORMATS[i % len(FORMATS)].format(digits[:3], digits[3:6], digits[6:8], digits[8:])
+        result.append((f'{i}\t{phone}\tПроект {i % 17}\t2024-01-{i % 28 + 1:02d}', []))
+    return result
+
+
+def run(kind: str, pages: List[List[Row]], latency: float) -> dict:
+    pool = ParsePool(kind)
+    pending = deque()
+    saved = 0
+    started = time.perf_counter()
+    for number, rows in enumerate(pages, 1):
+        time.sleep(latency)
+        pending.append(pool.submit(rows))
+        last = number == len(pages)
+        while pending and (last or len(pending) > config.PARSE_AHEAD or pending[0].done()):
+            saved += len(pending.popleft().result())
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return {'elapsed': elapsed, 'overhead': elapsed - latency * len(pages), 'phones': saved}
+
+
+def main():
+    parser = ArgumentParser(description='Бенчмарк пула разбора страниц')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02, help='Сек на навигацию')
+    args = parser.parse_args()
+
+    pages = [make_page(page, args.rows) for page in range(args.pages)]
+    print(f"{args.pages} страниц по {args.rows} строк, навигация {args.latency * 1000:.0f} мс")
+    for kind in ('off', 'thread'):
+        result = run(kind, pages, args.latency)
+        print(f"{kind:<8} {result['elapsed']:6.2f} сек ({args.pages / result['elapsed']:6.1f} страниц/сек), "
+              f"сверх навигации {result['overhead']:5.2f} сек, номеров {result['phones']}")
+
+
+if __name__ == '__main__':
+    main()
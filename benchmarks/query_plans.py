@@ -0,0 +1,174 @@
+"""
+Регрессионная проверка планов горячих запросов Database
+
+Горячие методы Database вызываются на синтетической БД (генератор из
+db_bench), а их SQL перехватывается trace callback соединения: проверяются
+ровно те запросы, которые выполняет код, с подставленными параметрами.
+Для каждого SELECT/UPDATE/DELETE строится EXPLAIN QUERY PLAN; полный
+проход таблицы (SCAN, кроме таблиц из нескольких строк) или временное
+B-дерево для сортировки/группировки (USE TEMP B-TREE) считаются ошибкой,
+код возврата 1.
+
+Проверка идет дважды: без статистики планировщика и после
+Database.optimize() (ANALYZE), потому что статистика может сменить индекс.
+Те же проверки запускает pytest (tests/test_query_plans.py).
+
+Запуск:
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --phones 1000000 --accounts 10000 --verbose
+"""
+import sys
+import sqlite3
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+from typing import Callable, List, Tuple
+import config
+from database.db import Database, SCHEDULING_ORDER
+from benchmarks.db_bench import build_database, FIRST_ACCOUNT_ID
+
+# Таблицы из нескольких строк (по строке на воркер/тенант/счетчик): полный проход
+# по ним дешевле поиска по индексу
+CONSTANT_TABLES = ('stats', 'tenant_settings', 'worker_heartbeats')
+
+# Запросы без метода Database: (название, SQL)
+EXTRA_QUERIES = [
+    # Сверка accounts.phones_count с таблицей номеров
+    ('phones_of_account', f"SELECT COUNT(*) FROM phones WHERE account_id = '{FIRST_ACCOUNT_ID}'"),
+]
+
+
+class TracedDatabase(Database):
+    """Database, записывающий SQL каждого соединения"""
+
+    statements = None
+
+    def _connect(self, timeout: float = 5.0) -> sqlite3.Connection:
+        conn = super()._connect(timeout)
+        if self.statements is not None:
+            conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def hot_operations(db: Database) -> List[Tuple[str, Callable]]:
+    """Горячие операции: очередь, прогресс, счетчики, выгрузка, дообход (refresh), пульс"""
+    account_id = str(FIRST_ACCOUNT_ID + 1)
+    pending_id = db.get_accounts_by_status('pending')[0]['account_id']
+    operations = []
+
+    for policy in SCHEDULING_ORDER:
+        def acquire(policy=policy):
+            config.SCHEDULING_POLICY = policy
+            db.acquire_account_for_processing('plans')
+
+        def by_status(policy=policy):
+            config.SCHEDULING_POLICY = policy
+            db.get_accounts_by_status('pending')
+
+        operations += [(f'acquire[{policy}]', acquire), (f'accounts_by_status[{policy}]', by_status)]
+
+    return operations + [
+        ('get_account', lambda: db.get_account(account_id)),
+        ('add_phones', lambda: db.add_phones(pending_id, ['70000000001', '70000000002'])),
+        ('count_known_phones', lambda: db.count_known_phones(pending_id, ['70000000001', '79000000005'])),
+        ('save_page_hash', lambda: db.save_page_hash(pending_id, 1, 42)),
+        ('page_hashes', lambda: db.get_page_hashes(pending_id)),
+        ('set_account_page_size', lambda: db.set_account_page_size(pending_id, 200)),
+        ('update_status[in_progress]', lambda: db.update_account_status(pending_id, 'in_progress', 1)),
+        ('update_status[completed]', lambda: db.update_account_status(pending_id, 'completed')),
+        ('release_leases', lambda: db.release_leases('plans')),
+        ('lease_owners', db.get_lease_owners),
+        ('pending_count', db.get_pending_count),
+        ('available_count', db.get_available_count),
+        ('leased_count', db.get_leased_count),
+        ('status_counts', db.get_status_counts),
+        ('total_phones', db.get_total_phones),
+        ('iter_attributions', lambda: [b for _, b in zip(range(3), db.iter_attributions(batch_size=1))]),
+        ('save_page', lambda: db.save_page(pending_id, 2, ['70000000003'], 43)),
+        ('remaining_pages', db.get_remaining_pages),
+        ('save_heartbeat', lambda: db.save_heartbeat('plans', {'account_id': pending_id, 'page': 2})),
+        ('heartbeats', db.get_heartbeats),
+        ('clear_heartbeats', db.clear_heartbeats),
+    ]
+
+
+def capture(db: TracedDatabase, func: Callable) -> List[str]:
+    """SQL, выполненный операцией (без PRAGMA, транзакций, триггеров и вставок)"""
+    db.statements = []
+    try:
+        func()
+    finally:
+        statements, db.statements = db.statements, None
+    checked = []
+    for sql in statements:
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if head in ('SELECT', 'UPDATE', 'DELETE', 'WITH') and sql not in checked:
+            checked.append(sql)
+    return checked
+
+
+def plan_problems(conn: sqlite3.Connection, sql: str) -> Tuple[List[str], List[str]]:
+    """(строки плана, проблемные строки плана)"""
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+    problems = [line for line in plan
+                if (line.startswith('SCAN ') and line.split()[1] not in ('CONSTANT',) + CONSTANT_TABLES)
+                or 'USE TEMP B-TREE' in line]
+    return plan, problems
+
+
+def hot_queries(db: TracedDatabase) -> List[Tuple[str, str]]:
+    """(операция, SQL) всех горячих запросов, выполненных на db"""
+    queries: List[Tuple[str, str]] = []
+    for name, func in hot_operations(db):
+        queries += [(name, sql) for sql in capture(db, func)]
+    return queries + EXTRA_QUERIES
+
+
+def check(db: TracedDatabase, verbose: bool) -> int:
+    """Проверить все горячие запросы, вернуть число ошибок"""
+    conn = sqlite3.connect(db.db_path)
+    failures = 0
+    for name, sql in hot_queries(db):
+        plan, problems = plan_problems(conn, sql)
+        failures += bool(problems)
+        if problems or verbose:
+            print(f"{'❌' if problems else '✅'} {name}: {' '.join(sql.split())[:150]}")
+            for line in plan:
+                print(f"      {'!!' if line in problems else '  '} {line}")
+        else:
+            print(f"✅ {name}")
+    conn.close()
+    return failures
+
+
+def main():
+    parser = ArgumentParser(description='EXPLAIN QUERY PLAN горячих запросов Database')
+    parser.add_argument('--phones', type=int, default=20000)
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--verbose', action='store_true', help='Показать планы всех запросов')
+    args = parser.parse_args()
+
+    policy = config.SCHEDULING_POLICY
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'plans.db'
+        build_database(path, args.phones, args.accounts)
+        db = TracedDatabase(str(path), pragmas={})
+        try:
+            for title, prepare in (('Без статистики планировщика', None),
+                                   ('После ANALYZE (Database.optimize)', db.optimize)):
+                if prepare:
+                    prepare()
+                print(f"\n{title}:")
+                failures += check(db, args.verbose)
+        finally:
+            config.SCHEDULING_POLICY = policy
+
+    if failures:
+        print(f"\n❌ Запросов с полным проходом или сортировкой: {failures}")
+        sys.exit(1)
+    print("\n✅ Все горячие запросы идут по индексам")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Офлайн-проверка и замер парсеров страниц на записанном трафике CRM
+
+Трафик записывается обычным запуском с --har record (см. BrowserManager).
+Здесь каждая записанная HTML-страница открывается в режиме replay (без
+сети, на полной скорости) и разбирается:
+    AccountHarvester._parse_accounts_on_page - страницы списка аккаунтов
+    PhoneScraper._parse_phones_on_page - остальные страницы
+
+Результаты сверяются с эталоном (число записей и хэш, самих номеров
+в эталоне нет). Расхождение - код возврата 1.
+
+Страницы аккаунта воспроизводятся из его HAR (BrowserManager.use_account):
+URL списка телефонов у всех аккаунтов одинаковые. Если один URL записан
+несколько раз с разным содержимым (например, список телефонов до и после
+смены размера страницы), воспроизводится самая свежая запись.
+
+Запуск:
+    python main.py --mode scrape --har record
+    python -m benchmarks.replay_parsers --update-golden
+    python -m benchmarks.replay_parsers
+"""
+import sys
+import json
+import time
+import hashlib
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional, Tuple
+import config
+from database.db import Database
+from scraper.browser import BrowserManager
+from scraper.harvester import AccountHarvester
+from scraper.phone_scraper import PhoneScraper
+
+GOLDEN_PATH = 'benchmarks/golden/parsers.json'
+
+
+def recorded_pages(har_dir: Path) -> List[Tuple[Optional[str], str]]:
+    """
+    (аккаунт, URL) успешно загруженных HTML-страниц из всех HAR (без повторов)
+
+    Аккаунт - из имени файла (BrowserManager пишет '<аккаунт>_...har'),
+    None для трафика вне аккаунтов ('session_...har'). Страницы вне
+    аккаунтов идут первыми.
+    """
+    pages = []
+    for har in sorted(har_dir.glob('*.har')):
+        account = har.name.split('_', 1)[0]
+        account = None if account == 'session' else account
+        with open(har, 'r', encoding='utf-8') as f:
+            entries = json.load(f)['log']['entries']
+        for entry in entries:
+            response = entry['response']
+            key = (account, entry['request']['url'])
+            if (entry['request']['method'] == 'GET' and response['status'] == 200
+                    and response['content'].get('mimeType', '').startswith('text/html')
+                    and key not in pages):
+                pages.append(key)
+    return sorted(pages, key=lambda key: key[0] is not None)
+
+
+def page_kind(url: str) -> str:
+    return 'accounts' if urlsplit(url).path == urlsplit(config.ACCOUNTS_URL).path else 'phones'
+
+
+def fingerprint(items: List[str]) -> Dict:
+    return {'count': len(items),
+            'sha256': hashlib.sha256('\n'.join(sorted(items)).encode('utf-8')).hexdigest()}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def main():
+    parser = ArgumentParser(description='Парсеры страниц на записанном трафике')
+    parser.add_argument('--har-dir', default=config.HAR_DIR)
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Перезаписать эталон текущими результатами')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов разбора каждой страницы')
+    args = parser.parse_args()
+
+    har_dir = Path(args.har_dir)
+    pages = recorded_pages(har_dir)
+    if not pages:
+        print(f"Нет записанных HTML-страниц в {har_dir}")
+        sys.exit(1)
+
+    results = {}
+    timings = {'accounts': [], 'phones': []}
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            BrowserManager(headless=True, har_mode='replay', har_dir=str(har_dir)) as browser:
+        db = Database(str(Path(tmp) / 'replay.db'))
+        page = browser.new_page()
+        harvester = AccountHarvester(page, db)
+        scraper = PhoneScraper(page, db)
+
+        for account, url in pages:
+            switched = browser.use_account(account)
+            if switched:
+                page = harvester.page = scraper.page = switched
+            kind = page_kind(url)
+            try:
+                page.goto(url, wait_until='networkidle')
+            except Exception as e:
+                print(f"⚠️ {url}: не воспроизводится ({e})")
+                continue
+
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                if kind == 'accounts':
+                    items = [f"{a['account_id']}:{a['username']}"
+                             for a in harvester._parse_accounts_on_page()]
+                else:
+                    items = scraper._parse_phones_on_page()
+                timings[kind].append(time.perf_counter() - started)
+
+            results[f'{account}:{url}' if account else url] = {'kind': kind, **fingerprint(items)}
+
+    print(f"\n{'Страницы':<10}{'Кол-во':>8}{'Записей':>10}{'p50, мс':>10}{'p99, мс':>10}{'Всего, с':>10}")
+    for kind, values in timings.items():
+        if not values:
+            continue
+        items = sum(r['count'] for r in results.values() if r['kind'] == kind)
+        print(f"{kind:<10}{len(values) // args.repeat:>8}{items:>10}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 99) * 1000:>10.1f}"
+              f"{sum(values):>10.2f}")
+
+    golden_path = Path(args.golden)
+    if args.update_golden:
+        golden_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(golden_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Эталон обновлен: {golden_path} ({len(results)} страниц)")
+        return
+
+    if not golden_path.exists():
+        print(f"\nЭталона нет ({golden_path}), запустите с --update-golden")
+        return
+
+    with open(golden_path, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    mismatches = [(url, expected, results.get(url)) for url, expected in golden.items()
+                  if results.get(url) != expected]
+    for url, expected, actual in mismatches:
+        got = f"{actual['count']} записей" if actual else 'нет результата'
+        print(f"❌ {url}: ожидалось {expected['count']} записей, получено {got}")
+
+    if mismatches:
+        print(f"\n❌ Расхождений с эталоном: {len(mismatches)} из {len(golden)}")
+        sys.exit(1)
+    print(f"\n✅ Все {len(golden)} страниц совпадают с эталоном")
+
+
+if __name__ == '__main__':
+    main()
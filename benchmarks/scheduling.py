@@ -0,0 +1,133 @@
+"""
+Симуляция планирования: makespan параллельного прогона для разных политик
+
+Размеры аккаунтов берутся из БД (size_estimate / phones_count),
+из JSON-файла со списком размеров или генерируются синтетически.
+
+Запуск:
+    python -m benchmarks.scheduling --workers 3
+    python -m benchmarks.scheduling --sizes sizes.json --unknown 0.3 --json
+"""
+import json
+import heapq
+import math
+import random
+import sqlite3
+from argparse import ArgumentParser
+from typing import List, Dict
+import config
+from database.db import Database, SCHEDULING_ORDER
+
+
+def load_sizes_from_db(db_path: str) -> List[int]:
+    """Записанные размеры аккаунтов из БД"""
+    Database(db_path)  # Миграция схемы старых БД
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.execute('''
+            SELECT MAX(size_estimate, phones_count) FROM accounts
+            WHERE MAX(size_estimate, phones_count) > 0
+            ORDER BY id
+        ''')
+        return [row[0] for row in cursor]
+
+
+def synthetic_sizes(count: int, seed: int) -> List[int]:
+    """Логнормальное распределение: много мелких аккаунтов и редкие гиганты"""
+    rng = random.Random(seed)
+    return [max(1, int(rng.lognormvariate(7, 1.5))) for _ in range(count)]
+
+
+def simulate(sizes: List[int], estimates: List[int], policy: str, workers: int,
+             page_size: int, page_time: float, account_overhead: float) -> Dict:
+    """
+    Жадная выдача работы: свободный воркер берет следующий аккаунт в
+    порядке политики (как acquire_account_for_processing, longest_first -
+    аккаунты без оценки первыми)
+    """
+    indexes = list(range(len(sizes)))
+    if policy == 'longest_first':
+        indexes.sort(key=lambda i: (estimates[i] != 0, -estimates[i], i))
+    elif policy == 'shortest_first':
+        indexes.sort(key=lambda i: (estimates[i], i))
+
+    durations = [account_overhead + math.ceil(size / page_size) * page_time
+                 for size in sizes]
+
+    free_at = [0.0] * workers
+    heapq.heapify(free_at)
+    for i in indexes:
+        start = heapq.heappop(free_at)
+        heapq.heappush(free_at, start + durations[i])
+
+    makespan = max(free_at)
+    total_work = sum(durations)
+    lower_bound = max(total_work / workers, max(durations))
+
+    return {
+        'policy': policy,
+        'makespan_sec': round(makespan, 1),
+        'lower_bound_sec': round(lower_bound, 1),
+        'vs_lower_bound': round(makespan / lower_bound, 3),
+        'utilization': round(total_work / (workers * makespan), 3),
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Симуляция политик планирования аккаунтов')
+    parser.add_argument('--workers', type=int, default=config.MAX_WORKERS)
+    parser.add_argument('--db', default=config.DB_PATH, help='БД с записанными размерами')
+    parser.add_argument('--sizes', help='JSON-файл со списком размеров аккаунтов')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Сгенерировать N синтетических аккаунтов')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--unknown', type=float, default=0.0,
+                        help='Доля аккаунтов без оценки размера (size_estimate = 0)')
+    parser.add_argument('--page-size', type=int, default=config.PHONES_PER_PAGE)
+    parser.add_argument('--page-time', type=float, default=6.0, help='Секунд на страницу')
+    parser.add_argument('--account-overhead', type=float, default=10.0,
+                        help='Секунд на вход в аккаунт и настройку страницы')
+    parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+    args = parser.parse_args()
+
+    if args.sizes:
+        with open(args.sizes, 'r', encoding='utf-8') as f:
+            sizes = json.load(f)
+    elif args.synthetic:
+        sizes = synthetic_sizes(args.synthetic, args.seed)
+    else:
+        sizes = load_sizes_from_db(args.db)
+
+    if not sizes:
+        print('Нет данных о размерах: укажите --sizes или --synthetic')
+        return
+
+    rng = random.Random(args.seed)
+    estimates = [0 if rng.random() < args.unknown else size for size in sizes]
+
+    results = [
+        simulate(sizes, estimates, policy, args.workers,
+                 args.page_size, args.page_time, args.account_overhead)
+        for policy in SCHEDULING_ORDER
+    ]
+
+    if args.json:
+        print(json.dumps({
+            'accounts': len(sizes),
+            'workers': args.workers,
+            'unknown_share': args.unknown,
+            'results': results,
+        }, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Аккаунтов: {len(sizes)}, воркеров: {args.workers}, "
+          f"без оценки: {args.unknown:.0%}")
+    print(f"{'Политика':<16}{'Makespan, ч':>14}{'Нижняя граница, ч':>20}"
+          f"{'× границы':>12}{'Загрузка':>10}")
+    for r in results:
+        print(f"{r['policy']:<16}{r['makespan_sec'] / 3600:>14.2f}"
+              f"{r['lower_bound_sec'] / 3600:>20.2f}"
+              f"{r['vs_lower_bound']:>12.3f}{r['utilization']:>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,32 +8,129 @@ ADMIN_LOGIN = os.getenv('ADMIN_LOGIN', '')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', '')
 
 # URL'ы
-BASE_URL = 'https://crm.it-datamaster.ru'
+BASE_URL = os.getenv('CRM_BASE_URL', 'https://crm.it-datamaster.ru')
 LOGIN_URL = f'{BASE_URL}/admin'
 ACCOUNTS_URL = f'{BASE_URL}/admin/visit/rt-admin'
 TOKEN_API_URL = f'{BASE_URL}/admin/user/create-token'
 
 # Настройки парсинга
 ACCOUNTS_PER_PAGE = 200
-PHONES_PER_PAGE = 50
-DELAY_BETWEEN_REQUESTS = (2, 5)
-DELAY_BETWEEN_ACCOUNTS = (10, 15)
+PHONES_PER_PAGE = 50  # Запасной размер, если больший подобрать не удалось
+PHONE_PAGE_SIZE_PROBES = (1000, 500, 200, 100)  # Пробуются сверх опций dropdown
 RETRY_ATTEMPTS = 3
 RETRY_DELAY = 5
+# Разбор страниц телефонов (scraper/page_parser.py): браузер не ждет извлечения номеров
+PARSE_POOL = os.getenv('CRM_PARSE_POOL', 'thread')  # thread | off - в потоке браузера
+PARSE_WORKERS = 1
+PARSE_AHEAD = 2  # Страниц в очереди разбора, дальше навигация ждет
+
+# Глобальный лимит запросов к CRM (общий для всех воркеров, AIMD)
+RATE_LIMIT_INITIAL = 0.5  # запросов/сек при первом запуске
+RATE_LIMIT_MIN = 0.1
+RATE_LIMIT_MAX = 5.0
+RATE_LIMIT_BURST = 3  # Максимум накопленных токенов
+RATE_LIMIT_INCREASE = 0.05  # Рост (запр/сек) за секунду успешной работы
+RATE_LIMIT_DECREASE = 0.5  # Множитель при 429/5xx/таймаутах
+RATE_LIMIT_TARGET_LATENCY = 15.0  # сек; нижняя граница порога медленного ответа
+RATE_LIMIT_SLOW_FACTOR = 3.0  # Медленный ответ - во столько раз дольше обычного (перцентиля)
+RATE_LIMIT_LATENCY_PERCENTILE = 90  # Обычная задержка - этот перцентиль недавних ответов
+RATE_LIMIT_LATENCY_WINDOW = 200  # Недавних ответов в оценке
+RATE_LIMIT_LATENCY_MIN_SAMPLES = 20  # До стольких ответов медленные не снижают темп
+RATE_LIMIT_COOLDOWN = 10.0  # сек между снижениями
 
 # Параллелизация
 MAX_WORKERS = 3
-WORKER_DELAY = (5, 10)
+MIN_WORKERS = 1
+MAX_WORKER_RESTARTS = 10  # Падений воркеров до остановки прогона
+ACCOUNT_LEASE_TTL = 600  # сек; аренда аккаунта продлевается каждой страницей
+WORKER_STATS_INTERVAL = 300  # сек между сводками памяти воркеров
+HEARTBEAT_INTERVAL = 5  # сек между записями пульса воркера (worker_heartbeats)
+HEARTBEAT_RATE_WINDOW = 300  # сек, окно темпа воркера (стр/мин)
+HEARTBEAT_STALE = 300  # сек без пульса - воркер считается зависшим (страница грузится до 2 мин)
+PROGRESS_INTERVAL = 60  # сек между сводками прогресса и ETA в консоли (--progress-interval, 0 - выкл.)
+SCHEDULING_POLICY = 'longest_first'  # fifo | longest_first | shortest_first (без оценок размера - как fifo)
+
+# Распределенный парсинг: --mode coordinator владеет БД, --mode worker --coordinator host:port
+COORDINATOR_HOST = '127.0.0.1'  # Для других машин - адрес сети, только вместе с COORDINATOR_TOKEN
+COORDINATOR_PORT = 8765
+COORDINATOR_TOKEN = os.getenv('CRM_COORDINATOR_TOKEN', '')  # Общий секрет с воркерами; пусто - только loopback
+COORDINATOR_TIMEOUT = 60  # сек на запрос к координатору
+COORDINATOR_RETRIES = 5  # Попыток запроса при обрыве связи
+
+# Автомасштабирование (--mode parallel)
+AUTOSCALE_INTERVAL = 60  # сек между решениями
+AUTOSCALE_MIN_GAIN = 0.1  # Минимальный прирост стр/мин от нового воркера
+AUTOSCALE_UP_COOLDOWN = 300  # сек после уменьшения числа воркеров без добавления новых
+AUTOSCALE_MAX_ERROR_RATE = 0.3  # Доля упавших аккаунтов за окно
+AUTOSCALE_MAX_CPU = 85  # %
+AUTOSCALE_MIN_FREE_MEM_MB = 1024
 
 # База данных
 DB_PATH = 'data/phones.db'
 BACKUP_DIR = 'data/backups'
 BACKUP_INTERVAL = 100
+SQLITE_PRAGMAS = {}  # PRAGMA на каждое соединение, например {'journal_mode': 'WAL'}
+DB_OPTIMIZE_INTERVAL = 3600  # сек между ANALYZE в долгих прогонах
+DB_ANALYSIS_LIMIT = 1000  # Строк выборки на индекс при ANALYZE
+
+# Метрики (счетчики и время этапов, сводятся по всем процессам)
+METRICS_DIR = 'data/metrics'
+METRICS_FLUSH_INTERVAL = 10  # сек между сбросами снимка процесса на диск
+METRICS_PORT = None  # --metrics-port: HTTP /metrics в формате Prometheus
+METRICS_HOST = '127.0.0.1'  # --metrics-host: для сборщика с другой машины - адрес сети или 0.0.0.0
+
+# Профилирование (--profile cprofile|sampling)
+PROFILE_MODE = None
+PROFILE_DIR = 'data/profiles'
+PROFILE_SAMPLE_INTERVAL = 0.01  # сек между снимками стеков в режиме sampling
+
+# Логи (один файл на запуск и все воркеры, запись в отдельном потоке)
+LOG_DIR = 'logs'
+LOG_FILE = 'scraper.log'
+LOG_MAX_BYTES = 50 * 1024 * 1024  # Ротация файла по размеру
+LOG_BACKUP_COUNT = 5
+LOG_JSON = os.getenv('CRM_LOG_JSON', '') == '1'  # JSON-строки в файле вместо текста
+LOG_RATE_LIMIT = 20  # INFO-сообщений одной категории (page, token...) за окно
+LOG_RATE_WINDOW = 10  # сек
 
 # Отчет
 REPORT_PATH = 'data/report.xlsx'
+OVERLAP_PATH = 'data/overlap.csv'  # --mode overlap: уникальные/общие номера по аккаунтам
+OVERLAP_MAX_GROUP = 50  # Номера в большем числе аккаунтов не участвуют в парах
+ATTRIBUTION_BATCH = 50000  # Привязок phone_accounts в пачке выгрузки (overlap, индекс номеров)
+PHONE_INDEX_DIR = 'data/phone_index'  # --mode lookup: отсортированный индекс номеров (memmap)
+LOOKUP_PATH = 'data/lookup.csv'
+LOOKUP_CHUNK = 1000000  # Строк входного файла в пачке поиска
+# Выгрузка реестра плана нумерации (CSV 'АВС/ DEF;От;До;Емкость;Оператор;Регион;...')
+NUMBERING_PLAN_PATH = 'data/numbering_plan.csv'
+ENRICH_BATCH = 100000  # Номеров в пачке --mode enrich
+
+# Дообход завершенных аккаунтов (--mode refresh)
+PHONE_LIST_ORDER = 'unknown'  # newest_first | oldest_first | unknown - где в списке CRM появляются новые номера
+REFRESH_MIN_AGE = float(os.getenv('CRM_REFRESH_MIN_AGE', 20 * 3600))  # Обновленные позже (сек назад) пропускаются
+
+# Фильтр известных номеров (utils/known_phones.py): страницы из известных номеров не пишутся в БД
+KNOWN_PHONES_MAX_MB = 256  # Снимок индекса номеров (memmap, общий для воркеров); 0 - фильтр выключен
+KNOWN_PHONES_DELTA_MAX = 2000000  # Номеров и привязок, записанных процессом после снимка
 
 # Браузер
 HEADLESS = False
 BROWSER_TIMEOUT = 120000  # УВЕЛИЧЕНО: 120 секунд (2 минуты) для долгих страниц
 PAGE_LOAD_TIMEOUT = 120000  # Таймаут для загрузки страниц
+BROWSER_RECYCLE_NAVIGATIONS = 500  # Пересоздать контекст после N загрузок страниц
+BROWSER_MAX_RSS_MB = 1500  # Перезапустить Chromium при превышении памяти
+BROWSER_CRASH_RETRIES = 3  # Перезапусков после падения на один аккаунт
+SHARED_BROWSER = False  # --shared-browser: один Chromium на все воркеры (CDP)
+SHARED_BROWSER_PORT = 9333
+HAR_MODE = None  # --har: 'record' - записать трафик CRM, 'replay' - воспроизвести без сети
+HAR_DIR = 'data/har'
+
+# Трассы Playwright для медленных страниц (дешевая трассировка кусками)
+SLOW_TRACE = True
+SLOW_TRACE_DIR = 'data/traces'
+SLOW_TRACE_PERCENTILE = 99  # Сохранять страницы медленнее этого перцентиля...
+SLOW_TRACE_MIN_SEC = 10  # ...но не быстрее этого порога
+SLOW_TRACE_WINDOW = 200  # Последних страниц в расчете перцентиля
+SLOW_TRACE_MIN_SAMPLES = 20  # До этого числа замеров сохраняются только ошибки
+SLOW_TRACE_MAX_FILES = 50  # Хранить не больше N трасс (старые удаляются)
+SLOW_TRACE_SNAPSHOTS = False  # DOM-снимки в трассе: нагляднее, но дороже
@@ -1,26 +1,153 @@
+import time
 import sqlite3
 import shutil
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
 import config
+from utils.metrics import metrics
+from utils.phones import phone_to_int
+
+# Колонки, добавленные после первого релиза: (таблица, колонка, определение)
+COLUMN_MIGRATIONS = [
+    ('accounts', 'size_estimate', 'INTEGER DEFAULT 0'),
+    ('accounts', 'lease_owner', 'TEXT'),
+    ('accounts', 'lease_expires_at', 'REAL'),
+    ('accounts', 'page_size', 'INTEGER DEFAULT 0'),
+    ('phones', 'carrier_id', 'INTEGER'),
+]
+
+# Триггеры, чье тело изменилось: (имя, фрагмент старого тела). Старый
+# удаляется один раз, новый создает schema.sql
+TRIGGER_MIGRATIONS = [
+    ('stats_phones_delete', 'phones_count'),
+]
+# Индексы старой схемы, которые больше не нужны
+DROPPED_INDEXES = [
+    'idx_accounts_queue_longest',
+]
+
+# Колонки пульса воркера, которые пишет save_heartbeat
+HEARTBEAT_COLUMNS = ('host', 'pid', 'account_id', 'page', 'pages_done', 'pages_per_min', 'rss_mb',
+                     'last_error', 'last_error_at', 'started_at', 'finished_at')
+
+# Порядок выдачи аккаунтов в работу для каждой политики планирования.
+# longest_first начинает с аккаунтов без оценки размера (еще не открывались):
+# среди них могут быть самые крупные. Пока оценок нет ни у кого, это fifo
+SCHEDULING_ORDER = {
+    'fifo': 'id',
+    'longest_first': 'size_estimate = 0 DESC, size_estimate DESC, id',
+    'shortest_first': 'size_estimate, id',
+}
 
 
 class Database:
-    def __init__(self, db_path: str = config.DB_PATH):
+    def __init__(self, db_path: str = config.DB_PATH, pragmas: Dict = None):
+        """
+        Args:
+            pragmas: PRAGMA для каждого соединения (по умолчанию config.SQLITE_PRAGMAS)
+        """
         self.db_path = db_path
+        self.pragmas = config.SQLITE_PRAGMAS if pragmas is None else pragmas
+        self._plan_carriers = None  # индекс плана нумерации -> carriers.id (см. _carrier_ids)
+        self._account_refs = {}  # account_id -> accounts.id (ключ phone_accounts)
+        self.known = None  # Фильтр известных номеров (enable_known_filter)
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self._init_db()
 
+    def _connect(self, timeout: float = 5.0) -> sqlite3.Connection:
+        """Открыть соединение с настроенными PRAGMA"""
+        conn = sqlite3.connect(self.db_path, timeout=timeout)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
     def _init_db(self):
         """Инициализация БД со схемой"""
         schema_path = Path(__file__).parent / 'schema.sql'
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            self._migrate(conn)
             with open(schema_path, 'r', encoding='utf-8') as f:
                 conn.executescript(f.read())
+            # БД до появления phone_accounts: номер - аккаунту из phones
+            if (not conn.execute('SELECT 1 FROM phone_accounts LIMIT 1').fetchone()
+                    and conn.execute('SELECT 1 FROM phones LIMIT 1').fetchone()):
+                self._backfill_attribution(conn)
+            # БД до появления таблицы stats: посчитать агрегаты один раз
+            if not conn.execute("SELECT 1 FROM stats WHERE name = 'phones'").fetchone():
+                self.rebuild_stats(conn)
+
+    def _backfill_attribution(self, conn: sqlite3.Connection):
+        """Заполнить phone_accounts по phones (для БД старой схемы)"""
+        conn.create_function('phone_to_int', 1, phone_to_int, deterministic=True)
+        conn.execute('''
+            INSERT OR IGNORE INTO phone_accounts (phone, account)
+            SELECT phone_to_int(p.phone_number), a.id
+            FROM phones p JOIN accounts a ON a.account_id = p.account_id
+            WHERE phone_to_int(p.phone_number) IS NOT NULL
+        ''')
+        conn.commit()
 
+    def rebuild_stats(self, conn: sqlite3.Connection = None):
+        """
+        Пересчитать stats и accounts.phones_count полным проходом
+
+        Нужен после миграции и массовой загрузки в обход триггеров;
+        в обычной работе агрегаты ведут триггеры схемы.
+        """
+        if conn is None:
+            with self._connect(timeout=30) as conn:
+                return self.rebuild_stats(conn)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM stats')
+            conn.execute('''
+                INSERT INTO stats (name, value)
+                SELECT 'phones', COUNT(*) FROM phones
+            ''')
+            conn.execute('''
+                INSERT INTO stats (name, value)
+                SELECT 'status:' || COALESCE(status, ''), COUNT(*)
+                FROM accounts GROUP BY status
+            ''')
+            conn.execute('''
+                CREATE TEMP TABLE account_counts (account INTEGER PRIMARY KEY, n INTEGER)
+            ''')
+            conn.execute('''
+                INSERT INTO account_counts
+                SELECT account, COUNT(*) FROM phone_accounts GROUP BY account
+            ''')
+            conn.execute('''
+                UPDATE accounts SET phones_count = COALESCE(
+                    (SELECT n FROM account_counts WHERE account = accounts.id), 0)
+            ''')
+            conn.execute('DROP TABLE account_counts')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Добавить новые колонки и удалить устаревшие триггеры старой схемы"""
+        for table, column, definition in COLUMN_MIGRATIONS:
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+            if columns and column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        # Только при старом теле: DROP на каждом старте брал бы блокировку
+        # записи и сбрасывал подготовленные запросы всех соединений
+        for trigger, old_body in TRIGGER_MIGRATIONS:
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                               (trigger,)).fetchone()
+            if row and old_body in row[0]:
+                conn.execute(f'DROP TRIGGER {trigger}')
+        for index in DROPPED_INDEXES:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)).fetchone():
+                conn.execute(f'DROP INDEX {index}')
+
+    @metrics.timed('database')
     def add_account(self, account_id: str, username: str, token_url: str):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT INTO accounts (account_id, username, token_url, status)
                 VALUES (?, ?, ?, 'pending')
@@ -35,68 +162,256 @@ class Database:
 
     def update_account_token(self, account_id: str, token_url: str):
         """Обновить токен-ссылку"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 UPDATE accounts 
                 SET token_url = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE account_id = ?
             ''', (token_url, account_id))
 
+    @metrics.timed('database')
     def update_account_status(self, account_id: str, status: str, last_page: int = None):
-        """Обновить статус аккаунта"""
-        with sqlite3.connect(self.db_path) as conn:
-            if last_page is not None:
-                conn.execute('''
-                    UPDATE accounts 
-                    SET status = ?, last_page = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE account_id = ?
-                ''', (status, last_page, account_id))
-            else:
-                conn.execute('''
-                    UPDATE accounts 
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE account_id = ?
-                ''', (status, account_id))
+        """
+        Обновить статус аккаунта
+
+        Прогресс по in_progress продлевает аренду воркера,
+        финальные статусы освобождают ее.
+        """
+        fields = ['status = ?']
+        params = [status]
 
+        if last_page is not None:
+            fields.append('last_page = ?')
+            params.append(last_page)
+
+        if status == 'in_progress':
+            fields.append('lease_expires_at = CASE WHEN lease_owner IS NULL THEN NULL ELSE ? END')
+            params.append(time.time() + config.ACCOUNT_LEASE_TTL)
+        else:
+            fields.append('lease_owner = NULL, lease_expires_at = NULL')
+
+        with self._connect(timeout=30) as conn:
+            conn.execute(f'''
+                UPDATE accounts 
+                SET {', '.join(fields)}, updated_at = CURRENT_TIMESTAMP
+                WHERE account_id = ?
+            ''', (*params, account_id))
+
+    @metrics.timed('database')
     def add_phones(self, account_id: str, phone_numbers: List[str]):
-        """Добавить номера (с дедупликацией)"""
-        with sqlite3.connect(self.db_path) as conn:
+        """
+        Добавить номера (с дедупликацией)
+
+        В phones номер попадает один раз, а в phone_accounts - для каждого
+        аккаунта, где встретился. Возвращает число новых уникальных номеров.
+
+        С фильтром известных номеров (enable_known_filter) в SQLite идут
+        только номера и привязки, которых нет в фильтре; страница, где
+        известно все, не открывает соединение вовсе.
+        """
+        numbers = [phone_to_int(phone) for phone in phone_numbers]
+        to_insert = list(zip(phone_numbers, numbers))
+        to_attribute = [number for number in numbers if number is not None]
+
+        ref = self._account_refs.get(account_id)
+        if self.known is not None and ref is not None:
+            pair_known, phone_known = self.known.classify(numbers, ref)
+            to_insert = [item for item, known in zip(to_insert, phone_known) if not known]
+            to_attribute = [number for number, known in zip(numbers, pair_known)
+                            if not known and number is not None]
+            if not to_insert and not to_attribute:
+                return 0
+
+        carrier_ids = self._carrier_ids([phone for phone, _ in to_insert])
+        with self._connect() as conn:
+            if ref is None:
+                row = conn.execute('SELECT id FROM accounts WHERE account_id = ?', (account_id,)).fetchone()
+                ref = self._account_refs[account_id] = row[0] if row else None
+            attributed = 0
+            if ref is not None:
+                changes = conn.total_changes
+                conn.executemany('''
+                    INSERT OR IGNORE INTO phone_accounts (phone, account) VALUES (?, ?)
+                ''', ((phone, ref) for phone in to_attribute))
+                attributed = conn.total_changes - changes
+
             added = 0
-            for phone in phone_numbers:
+            for (phone, _), carrier_id in zip(to_insert, carrier_ids):
                 try:
                     conn.execute('''
-                        INSERT INTO phones (account_id, phone_number)
-                        VALUES (?, ?)
-                    ''', (account_id, phone))
+                        INSERT INTO phones (account_id, phone_number, carrier_id)
+                        VALUES (?, ?, ?)
+                    ''', (account_id, phone, carrier_id))
                     added += 1
                 except sqlite3.IntegrityError:
                     # Номер уже есть в БД
                     pass
 
-            # Обновить счетчик
+            # Счетчики (stats и phones_count) и оценка размера для планировщика
             conn.execute('''
-                UPDATE accounts 
-                SET phones_count = (
-                    SELECT COUNT(*) FROM phones WHERE account_id = ?
-                )
+                UPDATE stats SET value = value + ? WHERE name = 'phones'
+            ''', (added,))
+            conn.execute('''
+                UPDATE accounts
+                SET phones_count = phones_count + ?,
+                    size_estimate = MAX(size_estimate, phones_count + ?)
                 WHERE account_id = ?
-            ''', (account_id, account_id))
+            ''', (attributed, attributed, account_id))
 
-            return added
+        # После коммита все эти номера и привязки точно есть в БД
+        if self.known is not None and ref is not None:
+            self.known.remember([number for _, number in to_insert if number is not None], to_attribute, ref)
+        return added
 
-    def get_accounts_by_status(self, status: str) -> List[Dict]:
-        """Получить аккаунты по статусу"""
-        with sqlite3.connect(self.db_path) as conn:
+    def enable_known_filter(self):
+        """Подключить фильтр известных номеров процесса (см. utils/known_phones.py)"""
+        from utils.known_phones import attach
+        self.known = attach(self)
+
+    def _carrier_ids(self, phone_numbers: List[str]) -> List[Optional[int]]:
+        """carriers.id для новых номеров (0 - нет в плане, None - плана нумерации нет)"""
+        # numpy и план нумерации нужны только при записи номеров: не в импорте CLI
+        from utils.numbering import get_plan, normalize_phones
+        plan = get_plan()
+        if plan is None or not phone_numbers:
+            return [None] * len(phone_numbers)
+        if self._plan_carriers is None:
+            self._plan_carriers = self.ensure_carriers(plan.carriers) + [0]
+        found = plan.match(normalize_phones(phone_numbers))
+        return [self._plan_carriers[i] for i in found.tolist()]
+
+    def ensure_carriers(self, carriers: List[Tuple[str, str]]) -> List[int]:
+        """carriers.id для каждой пары (оператор, регион), недостающие добавляются"""
+        with self._connect() as conn:
+            conn.executemany('INSERT OR IGNORE INTO carriers (operator, region) VALUES (?, ?)', carriers)
+            ids = dict(((operator, region), carrier_id) for carrier_id, operator, region
+                       in conn.execute('SELECT id, operator, region FROM carriers'))
+            return [ids[carrier] for carrier in carriers]
+
+    def iter_phones_to_enrich(self, batch_size: int = 100000,
+                              only_missing: bool = True) -> Iterator[Tuple[List[int], List[str]]]:
+        """Пачки (id, номера) для обогащения: без carrier_id или все, по первичному ключу"""
+        condition = 'AND carrier_id IS NULL' if only_missing else ''
+        last_id = 0
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(f'''
+                    SELECT id, phone_number FROM phones
+                    WHERE id > ? {condition} ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            ids, phones = map(list, zip(*rows))
+            yield ids, phones
+            last_id = ids[-1]
+
+    def set_phone_carriers(self, pairs: Iterable[Tuple[int, int]]):
+        """Записать (carrier_id, id номера) одной транзакцией"""
+        with self._connect(timeout=30) as conn:
+            conn.executemany('UPDATE phones SET carrier_id = ? WHERE id = ?', pairs)
+
+    def count_known_phones(self, account_id: str, phone_numbers: List[str]) -> int:
+        """Сколько номеров уже привязано к аккаунту (phone_accounts)"""
+        phones = [phone for phone in map(phone_to_int, phone_numbers) if phone is not None]
+        if not phones:
+            return 0
+        with self._connect() as conn:
+            return conn.execute(f'''
+                SELECT COUNT(*) FROM phone_accounts
+                WHERE account = (SELECT id FROM accounts WHERE account_id = ?)
+                  AND phone IN ({','.join('?' * len(phones))})
+            ''', (account_id, *phones)).fetchone()[0]
+
+    def get_page_hashes(self, account_id: str) -> Dict[int, int]:
+        """Отпечатки страниц аккаунта с прошлого обхода: страница -> хэш"""
+        with self._connect() as conn:
+            return dict(conn.execute('''
+                SELECT page, hash FROM page_hashes
+                WHERE account = (SELECT id FROM accounts WHERE account_id = ?)
+            ''', (account_id,)))
+
+    def save_page_hash(self, account_id: str, page: int, page_hash: int):
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO page_hashes (account, page, hash)
+                SELECT id, ?, ? FROM accounts WHERE account_id = ?
+            ''', (page, page_hash, account_id))
+
+    def save_page(self, account_id: str, page: int, phone_numbers: List[str], page_hash: int) -> int:
+        """
+        Сохранить страницу телефонов: номера, отпечаток и прогресс аккаунта
+
+        Прогресс пишется последним, поэтому last_page не обгоняет номера.
+        Одна операция вместо трех - один запрос к координатору у удаленных
+        воркеров. Возвращает число добавленных номеров.
+        """
+        added = self.add_phones(account_id, phone_numbers) if phone_numbers else 0
+        self.save_page_hash(account_id, page, page_hash)
+        self.update_account_status(account_id, 'in_progress', page)
+        return added
+
+    def set_account_page_size(self, account_id: str, page_size: int) -> Optional[int]:
+        """
+        Перевести прогресс аккаунта на размер страницы page_size
+
+        last_page и отпечатки страниц считаются в страницах того размера,
+        при котором записаны (accounts.page_size; 0 - PHONES_PER_PAGE, как
+        до подбора размера). При смене размера last_page пересчитывается по
+        числу пройденных строк с округлением вниз (неполная страница
+        пройдется заново, строки не пропускаются), а отпечатки страниц
+        аккаунта сбрасываются.
+
+        Returns: новый last_page, если размер сменился, иначе None
+        """
+        with self._connect(timeout=30) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT last_page, page_size FROM accounts WHERE account_id = ?
+            ''', (account_id,)).fetchone()
+            if row is None:
+                return None
+            last_page, recorded = row[0] or 0, row[1] or 0
+            if recorded == page_size:
+                return None
+
+            old_size = recorded or config.PHONES_PER_PAGE
+            changed = old_size != page_size
+            if changed:
+                last_page = last_page * old_size // page_size
+                conn.execute('''
+                    DELETE FROM page_hashes
+                    WHERE account = (SELECT id FROM accounts WHERE account_id = ?)
+                ''', (account_id,))
+            conn.execute('''
+                UPDATE accounts SET page_size = ?, last_page = ? WHERE account_id = ?
+            ''', (page_size, last_page, account_id))
+            return last_page if changed else None
+
+    def get_accounts_to_refresh(self, min_age: float) -> List[Dict]:
+        """Завершенные аккаунты, не обновлявшиеся min_age сек, начиная с самых давних"""
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute('''
+                SELECT * FROM accounts
+                WHERE status = 'completed' AND updated_at <= datetime('now', ?)
+                ORDER BY updated_at
+            ''', (f'-{int(min_age)} seconds',))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_accounts_by_status(self, status: str) -> List[Dict]:
+        """Получить аккаунты по статусу (в порядке SCHEDULING_POLICY)"""
+        order = SCHEDULING_ORDER[config.SCHEDULING_POLICY]
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.execute(f'''
                 SELECT * FROM accounts WHERE status = ?
-                ORDER BY id
+                ORDER BY {order}
             ''', (status,))
             return [dict(row) for row in cursor.fetchall()]
 
     def get_account(self, account_id: str) -> Optional[Dict]:
         """Получить аккаунт по ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute('''
                 SELECT * FROM accounts WHERE account_id = ?
@@ -104,9 +419,45 @@ class Database:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def get_account_status(self, account_id: str) -> Optional[str]:
+        """Статус аккаунта (без токен-ссылки - можно отдавать удаленному воркеру)"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT status FROM accounts WHERE account_id = ?', (account_id,)).fetchone()
+            return row[0] if row else None
+
+    def get_account_refs(self) -> Dict[int, Tuple[str, str]]:
+        """accounts.id -> (account_id, username): ключи phone_accounts в имена"""
+        with self._connect() as conn:
+            cursor = conn.execute('SELECT id, account_id, username FROM accounts')
+            return {row[0]: (row[1], row[2]) for row in cursor}
+
+    def iter_attributions(self, batch_size: int = config.ATTRIBUTION_BATCH) -> Iterator[List[Tuple[int, int]]]:
+        """
+        Пачки (phone, account) из phone_accounts в порядке номеров
+
+        Каждая пачка - отдельный короткий запрос по первичному ключу после
+        последней пары: выгрузка не держит чтение открытым и не мешает писателям.
+        """
+        last = (-1, -1)
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute('''
+                    SELECT phone, account FROM phone_accounts
+                    WHERE (phone, account) > (?, ?) ORDER BY phone, account LIMIT ?
+                ''', (*last, batch_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1]
+
+    def get_attribution_count(self) -> int:
+        """Число привязок номер-аккаунт (сумма phones_count, без прохода по phone_accounts)"""
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(phones_count), 0) FROM accounts').fetchone()[0]
+
     def get_all_accounts_summary(self) -> List[Dict]:
         """Получить сводку по всем аккаунтам"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.execute('''
                 SELECT account_id, username, status, phones_count
@@ -115,11 +466,38 @@ class Database:
             ''')
             return [dict(row) for row in cursor.fetchall()]
 
+    @metrics.timed('database')
     def get_total_phones(self) -> int:
         """Получить общее количество уникальных номеров"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute('SELECT COUNT(*) FROM phones')
-            return cursor.fetchone()[0]
+        with self._connect() as conn:
+            cursor = conn.execute("SELECT value FROM stats WHERE name = 'phones'")
+            row = cursor.fetchone()
+            return row[0] if row else 0
+
+    def get_status_counts(self) -> Dict[str, int]:
+        """Число аккаунтов в каждом статусе (из stats, без прохода по accounts)"""
+        with self._connect() as conn:
+            # Диапазон по первичному ключу (';' - следующий символ после ':')
+            cursor = conn.execute('''
+                SELECT SUBSTR(name, 8), value FROM stats
+                WHERE name >= 'status:' AND name < 'status;' AND value > 0
+                ORDER BY name
+            ''')
+            return dict(cursor.fetchall())
+
+    @metrics.timed('database')
+    def optimize(self):
+        """
+        Обновить статистику планировщика запросов (ANALYZE)
+
+        Для долгих прогонов: распределение статусов и размеров аккаунтов
+        меняется по ходу работы. analysis_limit ограничивает ANALYZE
+        выборкой строк из каждого индекса, так что вызов дешев и на
+        больших таблицах.
+        """
+        with self._connect(timeout=30) as conn:
+            conn.execute(f'PRAGMA analysis_limit = {config.DB_ANALYSIS_LIMIT}')
+            conn.execute('ANALYZE')
 
     def backup(self):
         """Создать резервную копию БД"""
@@ -131,41 +509,55 @@ class Database:
 
     # НОВЫЕ МЕТОДЫ ДЛЯ ПАРАЛЛЕЛИЗАЦИИ
 
-    def acquire_account_for_processing(self) -> Optional[Dict]:
+    @metrics.timed('database')
+    def acquire_account_for_processing(self, owner: str = None) -> Optional[Dict]:
         """
         Атомарно получить следующий аккаунт для обработки
         (thread-safe операция для мультипроцессинга)
+
+        Аккаунт выдается в аренду owner на ACCOUNT_LEASE_TTL секунд:
+        in_progress чужого живого воркера не выдается повторно, а аренда
+        упавшего воркера истекает (или снимается release_leases).
+
+        Среди аккаунтов одного статуса порядок задает SCHEDULING_POLICY:
+        при longest_first крупные аккаунты стартуют первыми и не
+        растягивают хвост параллельного прогона. Аккаунты без оценки
+        размера идут раньше всех: оценка появляется, только когда аккаунт
+        открыт, поэтому в первом прогоне longest_first выдает их как fifo.
         """
-        with sqlite3.connect(self.db_path, timeout=30) as conn:
+        order = SCHEDULING_ORDER[config.SCHEDULING_POLICY]
+        with self._connect(timeout=30) as conn:
             conn.row_factory = sqlite3.Row
 
             # Начинаем транзакцию
             conn.execute('BEGIN IMMEDIATE')
 
             try:
-                # Ищем аккаунт со статусом pending или in_progress
-                cursor = conn.execute('''
-                    SELECT * FROM accounts 
-                    WHERE status IN ('pending', 'in_progress')
-                    ORDER BY 
-                        CASE status 
-                            WHEN 'in_progress' THEN 1 
-                            WHEN 'pending' THEN 2 
-                        END,
-                        id
-                    LIMIT 1
-                ''')
-
-                account = cursor.fetchone()
+                # Сначала брошенные in_progress, затем pending. Отдельный
+                # запрос на статус идет по индексу очереди уже в нужном
+                # порядке, без сортировки всех кандидатов
+                account = None
+                for status in ('in_progress', 'pending'):
+                    cursor = conn.execute(f'''
+                        SELECT * FROM accounts 
+                        WHERE status = ?
+                          AND (lease_owner IS NULL OR lease_expires_at < ?)
+                        ORDER BY {order}
+                        LIMIT 1
+                    ''', (status, time.time()))
+                    account = cursor.fetchone()
+                    if account:
+                        break
 
                 if account:
                     # Помечаем как обрабатываемый
                     account_id = account['account_id']
                     conn.execute('''
                         UPDATE accounts 
-                        SET status = 'in_progress', updated_at = CURRENT_TIMESTAMP
+                        SET status = 'in_progress', updated_at = CURRENT_TIMESTAMP,
+                            lease_owner = ?, lease_expires_at = ?
                         WHERE account_id = ?
-                    ''', (account_id,))
+                    ''', (owner, time.time() + config.ACCOUNT_LEASE_TTL, account_id))
 
                     conn.commit()
                     return dict(account)
@@ -179,10 +571,119 @@ class Database:
 
     def get_pending_count(self) -> int:
         """Получить количество необработанных аккаунтов"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.execute('''
-                SELECT COUNT(*) FROM accounts 
-                WHERE status IN ('pending', 'in_progress')
+                SELECT COALESCE(SUM(value), 0) FROM stats
+                WHERE name IN ('status:pending', 'status:in_progress')
             ''')
             return cursor.fetchone()[0]
-    
+
+    def release_leases(self, owner: str) -> int:
+        """Снять аренду всех аккаунтов воркера (например, после его падения)"""
+        with self._connect(timeout=30) as conn:
+            cursor = conn.execute('''
+                UPDATE accounts SET lease_owner = NULL, lease_expires_at = NULL
+                WHERE lease_owner = ?
+            ''', (owner,))
+            return cursor.rowcount
+
+    def get_lease_owners(self) -> List[str]:
+        """Воркеры, за которыми числятся аккаунты (включая истекшие аренды)"""
+        with self._connect() as conn:
+            cursor = conn.execute('SELECT DISTINCT lease_owner FROM accounts WHERE lease_owner IS NOT NULL')
+            return [row[0] for row in cursor.fetchall()]
+
+    def save_heartbeat(self, worker: str, fields: Dict):
+        """Записать пульс воркера (колонки worker_heartbeats, updated_at - сейчас)"""
+        fields = {name: value for name, value in fields.items() if name in HEARTBEAT_COLUMNS}
+        fields['updated_at'] = time.time()
+        names = ', '.join(fields)
+        with self._connect(timeout=30) as conn:
+            conn.execute(f'''
+                INSERT INTO worker_heartbeats (worker, {names})
+                VALUES (?, {', '.join('?' * len(fields))})
+                ON CONFLICT(worker) DO UPDATE SET
+                    {', '.join(f'{name} = excluded.{name}' for name in fields)}
+            ''', (worker, *fields.values()))
+
+    def get_heartbeats(self) -> List[Dict]:
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute('SELECT * FROM worker_heartbeats ORDER BY worker')]
+
+    def clear_heartbeats(self):
+        """Забыть воркеров прошлого запуска"""
+        with self._connect(timeout=30) as conn:
+            conn.execute('DELETE FROM worker_heartbeats')
+
+    def get_remaining_pages(self) -> Dict[str, int]:
+        """
+        Оценка оставшейся работы: аккаунты pending/in_progress и их страницы
+
+        Страниц у аккаунта - size_estimate / размер страницы его тенанта
+        (tenant_settings, иначе PHONES_PER_PAGE) минус пройденные строки
+        (last_page в размере страницы аккаунта), не меньше одной.
+        unknown - аккаунты без оценки размера (по странице).
+        """
+        with self._connect() as conn:
+            accounts, unknown, pages = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(a.size_estimate = 0), 0),
+                       COALESCE(SUM(MAX(1, (a.size_estimate - a.last_page * a.page_size
+                                            + COALESCE(t.page_size, :default) - 1)
+                                           / COALESCE(t.page_size, :default))), 0)
+                FROM (
+                    SELECT size_estimate, last_page, COALESCE(NULLIF(page_size, 0), :default) AS page_size,
+                           SUBSTR(token_url, INSTR(token_url, '://') + 3) AS rest
+                    FROM accounts WHERE status IN ('pending', 'in_progress')
+                ) a
+                LEFT JOIN tenant_settings t ON t.tenant = SUBSTR(a.rest, 1, INSTR(a.rest || '/', '/') - 1)
+            ''', {'default': config.PHONES_PER_PAGE}).fetchone()
+            return {'accounts': accounts, 'unknown': unknown, 'pages': pages}
+
+    @metrics.timed('database')
+    def get_available_count(self) -> int:
+        """Количество аккаунтов, которые можно взять в работу прямо сейчас"""
+        with self._connect(timeout=30) as conn:
+            cursor = conn.execute('''
+                SELECT COUNT(*) FROM accounts
+                WHERE status IN ('pending', 'in_progress')
+                  AND (lease_owner IS NULL OR lease_expires_at < ?)
+            ''', (time.time(),))
+            return cursor.fetchone()[0]
+
+    def get_leased_count(self) -> int:
+        """Аккаунты очереди под неистекшей арендой (сейчас их нельзя взять в работу)"""
+        with self._connect(timeout=30) as conn:
+            cursor = conn.execute('''
+                SELECT COUNT(*) FROM accounts
+                WHERE status IN ('pending', 'in_progress')
+                  AND lease_owner IS NOT NULL AND lease_expires_at >= ?
+            ''', (time.time(),))
+            return cursor.fetchone()[0]
+
+    def update_account_size(self, account_id: str, size_estimate: int):
+        """Сохранить оценку размера аккаунта (число записей в CRM)"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE accounts SET size_estimate = ? WHERE account_id = ?
+            ''', (size_estimate, account_id))
+
+    def get_tenant_page_size(self, tenant: str) -> Optional[int]:
+        """Получить подобранный размер страницы для тенанта"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT page_size FROM tenant_settings WHERE tenant = ?
+            ''', (tenant,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def set_tenant_page_size(self, tenant: str, page_size: int):
+        """Сохранить подобранный размер страницы для тенанта"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO tenant_settings (tenant, page_size)
+                VALUES (?, ?)
+                ON CONFLICT(tenant) DO UPDATE SET
+                    page_size = excluded.page_size,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (tenant, page_size))
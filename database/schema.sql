@@ -6,6 +6,10 @@ CREATE TABLE IF NOT EXISTS accounts (
     status TEXT DEFAULT 'pending',
     phones_count INTEGER DEFAULT 0,
     last_page INTEGER DEFAULT 0,
+    page_size INTEGER DEFAULT 0,  -- размер страницы, в которой записаны last_page и page_hashes (0 - PHONES_PER_PAGE)
+    size_estimate INTEGER DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -14,10 +18,111 @@ CREATE TABLE IF NOT EXISTS phones (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     account_id TEXT NOT NULL,
     phone_number TEXT NOT NULL,
+    carrier_id INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(phone_number),
     FOREIGN KEY (account_id) REFERENCES accounts(account_id)
 );
 
+-- Оператор и регион по плану нумерации (utils/numbering.py). phones.carrier_id:
+-- NULL - номер еще не обогащен (--mode enrich), 0 - номера нет в плане
+CREATE TABLE IF NOT EXISTS carriers (
+    id INTEGER PRIMARY KEY,
+    operator TEXT NOT NULL,
+    region TEXT NOT NULL,
+    UNIQUE(operator, region)
+);
+
+-- Подобранный размер страницы телефонов для каждого тенанта CRM
+CREATE TABLE IF NOT EXISTS tenant_settings (
+    tenant TEXT PRIMARY KEY,
+    page_size INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE INDEX IF NOT EXISTS idx_accounts_status ON accounts(status);
 CREATE INDEX IF NOT EXISTS idx_phones_account ON phones(account_id);
+
+-- Очередь аккаунтов: выборка по статусу сразу в порядке SCHEDULING_POLICY,
+-- без сортировки (fifo обслуживает idx_accounts_status - id входит в него неявно).
+-- Планы горячих запросов проверяет benchmarks/query_plans.py.
+-- longest_first: сначала аккаунты без оценки размера (size_estimate = 0)
+CREATE INDEX IF NOT EXISTS idx_accounts_queue_unknown_longest
+    ON accounts(status, size_estimate = 0 DESC, size_estimate DESC, id);
+CREATE INDEX IF NOT EXISTS idx_accounts_queue_shortest ON accounts(status, size_estimate, id);
+
+-- Аренды воркеров (release_leases): в индексе только взятые аккаунты
+CREATE INDEX IF NOT EXISTS idx_accounts_lease ON accounts(lease_owner) WHERE lease_owner IS NOT NULL;
+
+-- Все аккаунты, в которых встретился номер (в phones - только первый).
+-- Целые ключи: номер (utils.phones.phone_to_int) и accounts.id; без rowid
+-- таблица - это сам индекс (phone, account), строки идут в порядке номеров.
+CREATE TABLE IF NOT EXISTS phone_accounts (
+    phone INTEGER NOT NULL,
+    account INTEGER NOT NULL,
+    PRIMARY KEY (phone, account)
+) WITHOUT ROWID;
+
+-- Отпечаток номеров каждой страницы аккаунта с прошлого обхода (--mode refresh
+-- пропускает неизменившиеся страницы). account - accounts.id
+CREATE TABLE IF NOT EXISTS page_hashes (
+    account INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    PRIMARY KEY (account, page)
+) WITHOUT ROWID;
+
+-- Пульс воркеров для --mode status: строка на воркер (worker-N или хост-pid
+-- удаленного), перезаписывается не чаще HEARTBEAT_INTERVAL. finished_at NULL -
+-- воркер работает; давно не обновлявшаяся строка - зависший воркер.
+CREATE TABLE IF NOT EXISTS worker_heartbeats (
+    worker TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    account_id TEXT,
+    page INTEGER,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_per_min REAL NOT NULL DEFAULT 0,
+    rss_mb REAL,
+    last_error TEXT,
+    last_error_at REAL,
+    started_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+
+-- Агрегаты для статистики и отчета: чтение за O(1) вместо COUNT(*) по таблицам.
+-- Строки: 'phones' - всего уникальных номеров, 'status:<статус>' - аккаунтов
+-- в статусе; номера аккаунта (включая общие с другими) - accounts.phones_count.
+-- Меняются в той же транзакции, что и данные: статусы и удаления - триггерами,
+-- вставку номеров учитывает Database.add_phones одним UPDATE на страницу
+-- (триггер на каждую строку заметно замедляет пакетную вставку).
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+-- phones_count считается по phone_accounts, удаление из phones его не меняет
+CREATE TRIGGER IF NOT EXISTS stats_phones_delete AFTER DELETE ON phones
+BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'phones';
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_accounts_insert AFTER INSERT ON accounts
+BEGIN
+    INSERT INTO stats (name, value) VALUES ('status:' || COALESCE(NEW.status, ''), 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_accounts_delete AFTER DELETE ON accounts
+BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'status:' || COALESCE(OLD.status, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_accounts_status AFTER UPDATE OF status ON accounts
+WHEN COALESCE(OLD.status, '') != COALESCE(NEW.status, '')
+BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'status:' || COALESCE(OLD.status, '');
+    INSERT INTO stats (name, value) VALUES ('status:' || COALESCE(NEW.status, ''), 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1;
+END;
@@ -1,19 +1,18 @@
 import sys
 import time
-import random
 import signal
 import sqlite3
 from pathlib import Path
 from argparse import ArgumentParser
 import config
 from database.db import Database
-from scraper.browser import BrowserManager
-from scraper.auth import login_to_admin
-from scraper.harvester import AccountHarvester
-from scraper.phone_scraper import PhoneScraper
-from utils.report import generate_excel_report
 from utils.logger import logger
-from scraper.parallel_scraper import ParallelScraper
+from utils.metrics import metrics, serve as serve_metrics
+from utils.profiler import profiler, merge_profiles
+
+# Playwright, pandas и параллельный режим импортируются в тех режимах,
+# где нужны: report/clear/stats стартуют без драйвера браузера, а
+# воркеры при spawn не тянут pandas (см. benchmarks/import_time.py)
 
 
 class ScraperOrchestrator:
@@ -39,6 +38,10 @@ class ScraperOrchestrator:
         logger.info("🌾 ФАЗА 1: Сбор аккаунтов и генерация токенов")
         logger.info("=" * 60)
 
+        from scraper.browser import BrowserManager
+        from scraper.auth import login_to_admin
+        from scraper.harvester import AccountHarvester
+
         with BrowserManager() as browser:
             page = browser.new_page()
 
@@ -75,9 +78,17 @@ class ScraperOrchestrator:
         logger.info(f"   • В процессе: {len(in_progress_accounts)}")
         logger.info(f"   • Ожидают: {len(pending_accounts)}")
 
+        from scraper.browser import BrowserManager
+        from scraper.phone_scraper import PhoneScraper
+        from utils.known_phones import prepare
+
+        prepare(self.db)
+        self.db.enable_known_filter()
+        optimized_at = time.time()
+
         with BrowserManager() as browser:
             page = browser.new_page()
-            scraper = PhoneScraper(page, self.db)
+            scraper = PhoneScraper(page, self.db, browser=browser)
 
             for idx, account in enumerate(accounts_to_process, 1):
                 if self.interrupted:
@@ -109,12 +120,10 @@ class ScraperOrchestrator:
                     backup_path = self.db.backup()
                     logger.info(f"💾 Создан бэкап: {backup_path}")
 
-                # Задержка между аккаунтами
-                if idx < total:
-                    delay = random.uniform(*config.DELAY_BETWEEN_ACCOUNTS)
-                    logger.info(
-                        f"⏳ Ожидание {delay:.1f}сек перед следующим аккаунтом...")
-                    time.sleep(delay)
+                # Статистика планировщика SQLite в долгих прогонах
+                if time.time() - optimized_at >= config.DB_OPTIMIZE_INTERVAL:
+                    self.db.optimize()
+                    optimized_at = time.time()
 
         # Финальный бэкап
         if self.accounts_processed > 0:
@@ -123,6 +132,52 @@ class ScraperOrchestrator:
 
         return True
 
+    def run_refresh(self):
+        """Дообход завершенных аккаунтов: новые номера без полного повторного парсинга"""
+        logger.info("=" * 60)
+        logger.info("🔁 ОБНОВЛЕНИЕ ЗАВЕРШЕННЫХ АККАУНТОВ")
+        logger.info("=" * 60)
+
+        accounts = self.db.get_accounts_to_refresh(config.REFRESH_MIN_AGE)
+        total = len(accounts)
+        if total == 0:
+            logger.info("✅ Нет аккаунтов для обновления")
+            return True
+
+        logger.info(f"📋 Аккаунтов к обновлению: {total} (порядок списка: {config.PHONE_LIST_ORDER})")
+
+        from scraper.browser import BrowserManager
+        from scraper.phone_scraper import PhoneScraper
+        from utils.known_phones import prepare
+
+        prepare(self.db)
+        self.db.enable_known_filter()
+        added_total = pages_total = full_pages = 0
+        with BrowserManager() as browser:
+            page = browser.new_page()
+            scraper = PhoneScraper(page, self.db, browser=browser)
+
+            for idx, account in enumerate(accounts, 1):
+                if self.interrupted:
+                    logger.warning("⏸️ Обновление приостановлено пользователем")
+                    break
+
+                if not account['token_url']:
+                    logger.error(f"❌ Нет токен-ссылки для аккаунта {account['account_id']}")
+                    continue
+
+                logger.info(f"\n[{idx}/{total}] 🔄 Обновление: {account['username']} "
+                            f"(ID: {account['account_id']})")
+                added, pages = scraper.refresh_account(account)
+                added_total += added
+                pages_total += pages
+                full_pages += max(account['last_page'], 1)
+                self.accounts_processed += 1
+
+        logger.info(f"\n✅ Обновление завершено: {added_total} новых номеров, "
+                    f"загружено страниц: {pages_total} (полный обход: ~{full_pages})")
+        return True
+
     def run_full(self):
         """Полный цикл: сбор + парсинг"""
         logger.info("🚀 ЗАПУСК ПОЛНОГО ЦИКЛА ПАРСИНГА")
@@ -148,29 +203,29 @@ class ScraperOrchestrator:
 
     def generate_report(self):
         """Генерация отчета"""
+        from utils.report import generate_excel_report
         generate_excel_report(self.db)
 
-    # ✅ ИСПРАВЛЕНИЕ (в main.py, строки 172-192)
     @staticmethod
     def show_stats():
         db = Database()
         
         logger.info("📊 Статистика аккаунтов:")
         
-        # Получаем статистику через SQL
-        with sqlite3.connect(config.DB_PATH) as conn:
-            cursor = conn.execute('''
-                SELECT status, COUNT(*) as count 
-                FROM accounts 
-                GROUP BY status
-            ''')
-            for row in cursor:
-                logger.info(f"   {row[0]}: {row[1]}")
+        # Агрегаты из таблицы stats (ведутся триггерами), без проходов по таблицам
+        status_counts = db.get_status_counts()
+        for status, count in status_counts.items():
+            logger.info(f"   {status}: {count}")
         
-        # Общие данные через методы Database
-        logger.info(f"\n📋 Всего аккаунтов: {len(db.get_all_accounts_summary())}")
+        logger.info(f"\n📋 Всего аккаунтов: {sum(status_counts.values())}")
         logger.info(f"📞 Всего номеров: {db.get_total_phones()}")
 
+    @staticmethod
+    def show_status():
+        """Прогресс идущего запуска: пульс воркеров, темп, остаток и ETA"""
+        from utils.heartbeat import progress_summary, log_progress
+        log_progress(progress_summary(Database()), workers=True)
+
 
 def main():
     # ИСПРАВЛЕНИЕ: Создаем parser перед использованием
@@ -179,7 +234,8 @@ def main():
     parser.add_argument(
         '--mode',
         choices=['full', 'harvest', 'scrape', 'report',
-                 'parallel', 'clear'],  # ДОБАВЛЕНО clear
+                 'parallel', 'clear', 'stats', 'overlap', 'lookup', 'enrich', 'refresh',
+                 'coordinator', 'worker', 'status'],  # ДОБАВЛЕНО clear
         default='full',
         help='Режим работы'
     )
@@ -196,6 +252,95 @@ def main():
         default=config.MAX_WORKERS,
         help=f'Количество параллельных воркеров (по умолчанию: {config.MAX_WORKERS})'
     )
+    parser.add_argument(
+        '--min-workers',
+        type=int,
+        default=config.MIN_WORKERS,
+        help=f'Минимум воркеров при автомасштабировании (по умолчанию: {config.MIN_WORKERS})'
+    )
+    parser.add_argument(
+        '--shared-browser',
+        action='store_true',
+        default=config.SHARED_BROWSER,
+        help='Один общий Chromium для всех воркеров (--mode parallel)'
+    )
+    parser.add_argument(
+        '--coordinator',
+        metavar='HOST:PORT',
+        help=f'Адрес координатора: --mode worker подключается к нему, --mode coordinator '
+             f'слушает его (по умолчанию: {config.COORDINATOR_HOST}:{config.COORDINATOR_PORT})'
+    )
+    parser.add_argument(
+        '--schedule',
+        choices=['fifo', 'longest_first', 'shortest_first'],
+        default=config.SCHEDULING_POLICY,
+        help=f'Порядок выдачи аккаунтов (по умолчанию: {config.SCHEDULING_POLICY})'
+    )
+    parser.add_argument(
+        '--list-order',
+        choices=['newest_first', 'oldest_first', 'unknown'],
+        default=config.PHONE_LIST_ORDER,
+        help=f'Порядок списка номеров в CRM для --mode refresh (по умолчанию: {config.PHONE_LIST_ORDER})'
+    )
+    parser.add_argument(
+        '--har',
+        choices=['record', 'replay'],
+        default=config.HAR_MODE,
+        help='Записать трафик CRM в HAR или воспроизвести его без сети'
+    )
+    parser.add_argument(
+        '--har-dir',
+        default=config.HAR_DIR,
+        help=f'Каталог HAR-файлов (по умолчанию: {config.HAR_DIR})'
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=config.METRICS_PORT,
+        help='Отдавать метрики по HTTP (/metrics, /metrics.json) на этом порту'
+    )
+    parser.add_argument(
+        '--metrics-host',
+        default=config.METRICS_HOST,
+        help=f'Адрес для --metrics-port (по умолчанию: {config.METRICS_HOST})'
+    )
+    parser.add_argument(
+        '--progress-interval',
+        type=int,
+        default=config.PROGRESS_INTERVAL,
+        help=f'Сек между сводками прогресса и ETA в консоли, 0 - выключить (по умолчанию: {config.PROGRESS_INTERVAL})'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=['cprofile', 'sampling'],
+        default=config.PROFILE_MODE,
+        help='Профилировать оркестратор и все воркеры (отчет в data/profiles/)'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=20,
+        help='Пар аккаунтов в отчете --mode overlap (по умолчанию: 20)'
+    )
+    parser.add_argument(
+        '--input',
+        help='Файл номеров для --mode lookup (по одному в строке, любой записи)'
+    )
+    parser.add_argument(
+        '--output',
+        default=config.LOOKUP_PATH,
+        help=f'CSV с результатами --mode lookup (по умолчанию: {config.LOOKUP_PATH})'
+    )
+    parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help='Пересобрать индекс номеров для --mode lookup'
+    )
+    parser.add_argument(
+        '--reenrich',
+        action='store_true',
+        help='--mode enrich: обогатить заново все номера (после обновления плана нумерации)'
+    )
     parser.add_argument(
         '--resume',
         action='store_true',
@@ -210,19 +355,36 @@ def main():
 
     args = parser.parse_args()
 
-    # Проверка credentials
-    if not config.ADMIN_LOGIN or not config.ADMIN_PASSWORD:
+    # Проверка credentials (воркеру координатора хватает токен-ссылок аккаунтов)
+    if args.mode not in ('worker', 'coordinator') and (not config.ADMIN_LOGIN or not config.ADMIN_PASSWORD):
         logger.error("❌ Не заданы ADMIN_LOGIN и ADMIN_PASSWORD в файле .env")
         sys.exit(1)
 
     # Установка headless режима
     config.HEADLESS = args.headless
+    config.SCHEDULING_POLICY = args.schedule
+    config.PHONE_LIST_ORDER = args.list_order
+    config.HAR_MODE = args.har
+    config.HAR_DIR = args.har_dir
+    config.PROGRESS_INTERVAL = args.progress_interval
+
+    # Метрики всех процессов запуска сводятся в data/metrics/<запуск>/
+    if args.mode not in ('clear', 'report', 'stats', 'status', 'overlap', 'lookup', 'enrich'):
+        metrics.start_run()
+        if args.metrics_port:
+            serve_metrics(args.metrics_port, args.metrics_host)
+        if args.profile:
+            profiler.start(args.profile)
+
+    if args.mode == 'worker' and not args.coordinator:
+        logger.error("❌ Укажите координатора: --coordinator host:port")
+        sys.exit(1)
 
-    # Запуск
-    orchestrator = ScraperOrchestrator()
+    # Запуск (удаленный воркер не открывает локальную БД: все через координатора)
+    orchestrator = ScraperOrchestrator() if args.mode != 'worker' else None
 
     try:
-        if args.resume:
+        if args.resume and orchestrator:
             orchestrator.resume()
         elif args.mode == 'full':
             orchestrator.run_full()
@@ -230,11 +392,45 @@ def main():
             orchestrator.run_harvest()
         elif args.mode == 'scrape':
             orchestrator.run_scrape()
+        elif args.mode == 'refresh':
+            orchestrator.run_refresh()
         elif args.mode == 'parallel':
-            parallel_scraper = ParallelScraper(max_workers=args.workers)
+            from scraper.parallel_scraper import ParallelScraper
+            parallel_scraper = ParallelScraper(
+                max_workers=args.workers, min_workers=args.min_workers,
+                shared_browser=args.shared_browser)
             parallel_scraper.run()
+        elif args.mode == 'worker':
+            from scraper.parallel_scraper import run_remote_worker
+            run_remote_worker(args.coordinator)
+            return
+        elif args.mode == 'coordinator':
+            from scraper.coordinator import run_coordinator
+            run_coordinator(orchestrator.db, args.coordinator, stop=lambda: orchestrator.interrupted)
+            return
         elif args.mode == 'report':
             orchestrator.generate_report()
+        elif args.mode == 'stats':
+            orchestrator.show_stats()
+            return
+        elif args.mode == 'status':
+            orchestrator.show_status()
+            return
+        elif args.mode == 'overlap':
+            from utils.overlap import run_overlap
+            run_overlap(orchestrator.db, top=args.top)
+            return
+        elif args.mode == 'lookup':
+            if not args.input:
+                logger.error("❌ Укажите файл номеров: --input numbers.txt")
+                sys.exit(1)
+            from utils.phone_index import run_lookup
+            run_lookup(orchestrator.db, args.input, args.output, rebuild=args.rebuild_index)
+            return
+        elif args.mode == 'enrich':
+            from utils.numbering import run_enrich
+            run_enrich(orchestrator.db, refresh=args.reenrich)
+            return
         elif args.mode == 'clear':
             if not args.clear:
                 logger.error(
@@ -253,36 +449,45 @@ def main():
             if args.clear == 'tokens':
                 with sqlite3.connect(config.DB_PATH) as conn:
                     conn.execute(
-                        'UPDATE accounts SET token_url = NULL, status = "pending"')
+                        'UPDATE accounts SET token_url = NULL, status = "pending", '
+                        'lease_owner = NULL, lease_expires_at = NULL')
                 logger.info("✅ Токены очищены")
 
             elif args.clear == 'accounts':
                 with sqlite3.connect(config.DB_PATH) as conn:
+                    conn.execute('DELETE FROM phone_accounts')
+                    conn.execute('DELETE FROM page_hashes')
                     conn.execute('DELETE FROM accounts')
                 logger.info("✅ Аккаунты удалены")
 
             elif args.clear == 'phones':
                 with sqlite3.connect(config.DB_PATH) as conn:
                     conn.execute('DELETE FROM phones')
+                    conn.execute('DELETE FROM phone_accounts')
+                    conn.execute('DELETE FROM page_hashes')
                     conn.execute('UPDATE accounts SET phones_count = 0')
                 logger.info("✅ Номера удалены")
 
             elif args.clear == 'all':
                 with sqlite3.connect(config.DB_PATH) as conn:
                     conn.execute('DELETE FROM phones')
+                    conn.execute('DELETE FROM phone_accounts')
+                    conn.execute('DELETE FROM page_hashes')
                     conn.execute('DELETE FROM accounts')
                 logger.info("✅ БД очищена")
 
             elif args.clear == 'reset-failed':
                 with sqlite3.connect(config.DB_PATH) as conn:
                     cursor = conn.execute(
-                        'UPDATE accounts SET status = "pending" WHERE status = "failed"')
+                        'UPDATE accounts SET status = "pending", lease_owner = NULL, lease_expires_at = NULL '
+                        'WHERE status = "failed"')
                     logger.info(f"✅ Сброшено {cursor.rowcount} аккаунтов")
 
             elif args.clear == 'reset-progress':
                 with sqlite3.connect(config.DB_PATH) as conn:
                     cursor = conn.execute(
-                        'UPDATE accounts SET status = "pending" WHERE status = "in_progress"')
+                        'UPDATE accounts SET status = "pending", lease_owner = NULL, lease_expires_at = NULL '
+                        'WHERE status = "in_progress"')
                     logger.info(f"✅ Сброшено {cursor.rowcount} аккаунтов")
 
             return
@@ -296,6 +501,12 @@ def main():
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        metrics.finish()
+        if profiler.run_dir:
+            run_dir = profiler.run_dir
+            profiler.stop()
+            merge_profiles(run_dir)
 
 
 if __name__ == '__main__':
@@ -1,17 +1,24 @@
-import time
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeout
 import config
 from utils.logger import logger
+from utils.metrics import metrics
 
 
 def login_to_admin(page: Page) -> bool:
     """Авторизация в админке"""
+    with metrics.timer('auth', 'login'):
+        success = _login(page)
+    metrics.inc('crm_logins_total', result='ok' if success else 'failed')
+    return success
+
+
+def _login(page: Page) -> bool:
     try:
         logger.info("🔐 Авторизация в админке...")
 
         # Переход на страницу входа с увеличенным таймаутом
         page.goto(config.LOGIN_URL, timeout=config.PAGE_LOAD_TIMEOUT)
-        time.sleep(2)
+        metrics.sleep(2, 'auth')
 
         # Проверяем что мы на странице входа
         current_url = page.url
@@ -66,9 +73,9 @@ def login_to_admin(page: Page) -> bool:
         # Заполняем форму
         logger.info("   Заполнение формы...")
         login_input.fill(config.ADMIN_LOGIN)
-        time.sleep(0.5)
+        metrics.sleep(0.5, 'auth')
         password_input.fill(config.ADMIN_PASSWORD)
-        time.sleep(0.5)
+        metrics.sleep(0.5, 'auth')
 
         # Ищем кнопку входа
         button_selectors = [
@@ -103,7 +110,7 @@ def login_to_admin(page: Page) -> bool:
         except PlaywrightTimeout:
             # Вариант 2: Проверяем текущий URL после задержки
             logger.debug("   Таймаут wait_for_url, проверяю текущий URL...")
-            time.sleep(3)
+            metrics.sleep(3, 'auth')
 
             current_url = page.url
             logger.debug(f"   URL после входа: {current_url}")
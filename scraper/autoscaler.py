@@ -0,0 +1,93 @@
+import time
+from typing import Optional
+import psutil
+import config
+from utils.logger import logger
+
+
+class Autoscaler:
+    """
+    Решает, сколько воркеров держать активными
+
+    Раз в AUTOSCALE_INTERVAL сравнивает пропускную способность (страниц/мин)
+    с предыдущим окном и добавляет воркера, пока это дает прирост.
+    Убирает воркера при высокой доле ошибок, нехватке CPU/RAM или
+    когда rate limiter снижает темп (сервер перегружен). После уменьшения
+    воркеры не добавляются AUTOSCALE_UP_COOLDOWN сек, иначе число воркеров
+    качалось бы вверх-вниз через окно.
+    """
+
+    def __init__(self, min_workers: int, max_workers: int):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.window_started = time.time()
+        self.pages = 0
+        self.accounts = 0
+        self.failures = 0
+        self.prev_throughput = None
+        self.prev_rate = None
+        self.last_action = None
+        self.scaled_down_at = 0.0
+        psutil.cpu_percent(interval=None)  # Первый вызов инициализирует замер
+
+    def record_page(self):
+        self.pages += 1
+
+    def record_account(self, failed: bool):
+        self.accounts += 1
+        if failed:
+            self.failures += 1
+
+    def decide(self, active: int, available: int, limiter_rate: Optional[float] = None) -> int:
+        """
+        Целевое число воркеров на следующее окно
+
+        Args:
+            active: Текущее целевое число воркеров
+            available: Аккаунтов, которые можно взять в работу
+            limiter_rate: Текущий бюджет RateLimiter, запросов/сек
+        """
+        elapsed = time.time() - self.window_started
+        if elapsed < config.AUTOSCALE_INTERVAL:
+            return active
+
+        throughput = self.pages / elapsed * 60
+        error_rate = self.failures / self.accounts if self.accounts else 0.0
+        cpu = psutil.cpu_percent(interval=None)
+        free_mb = psutil.virtual_memory().available / 1024 / 1024
+        throttled = (limiter_rate is not None and self.prev_rate is not None
+                     and limiter_rate < self.prev_rate * 0.9)
+
+        target = active
+        reason = None
+
+        if error_rate > config.AUTOSCALE_MAX_ERROR_RATE:
+            target, reason = active - 1, f"ошибки {error_rate:.0%}"
+        elif cpu > config.AUTOSCALE_MAX_CPU:
+            target, reason = active - 1, f"CPU {cpu:.0f}%"
+        elif free_mb < config.AUTOSCALE_MIN_FREE_MEM_MB:
+            target, reason = active - 1, f"свободно RAM {free_mb:.0f}MB"
+        elif throttled:
+            target, reason = active - 1, f"лимитер снизил темп до {limiter_rate:.2f}"
+        elif (self.last_action == 'up' and self.prev_throughput is not None
+              and throughput < self.prev_throughput * (1 + config.AUTOSCALE_MIN_GAIN)):
+            # Прошлое добавление воркера не окупилось - откатываем
+            target, reason = active - 1, f"нет прироста ({throughput:.1f} стр/мин)"
+        elif available > 0 and time.time() - self.scaled_down_at >= config.AUTOSCALE_UP_COOLDOWN:
+            target, reason = active + 1, f"{throughput:.1f} стр/мин, есть очередь"
+
+        target = max(self.min_workers, min(self.max_workers, target))
+
+        if target != active:
+            self.last_action = 'up' if target > active else 'down'
+            if target < active:
+                self.scaled_down_at = time.time()
+            logger.info(f"⚖️ Автомасштабирование: {active} → {target} воркеров ({reason})")
+        else:
+            self.last_action = None
+
+        self.prev_throughput = throughput
+        self.prev_rate = limiter_rate
+        self.window_started = time.time()
+        self.pages = self.accounts = self.failures = 0
+        return target
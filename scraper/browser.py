@@ -1,37 +1,232 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import urllib.request
+import psutil
+from pathlib import Path
+from typing import List, Optional
 from playwright.sync_api import sync_playwright, Browser, Page, TimeoutError
 import config
+from utils.logger import logger
+
+
+class BrowserCrashed(Exception):
+    """Страница или браузер упали во время работы"""
+
+
+def is_target_closed(error: Exception) -> bool:
+    """Ошибка Playwright из-за закрытой/упавшей страницы, контекста или браузера"""
+    message = str(error)
+    return (isinstance(error, BrowserCrashed)
+            or 'has been closed' in message
+            or 'Target closed' in message
+            or 'Page crashed' in message)
+
+
+def processes_rss_mb(processes) -> float:
+    """Суммарный RSS процессов, МБ (завершившиеся пропускаются)"""
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 1024 / 1024
+
+
+class BrowserServer:
+    """
+    Общий Chromium для всех воркеров
+
+    Родительский процесс запускает один браузер с CDP-портом, а воркеры
+    подключаются к нему (BrowserManager(cdp_endpoint=...)) и работают в
+    собственных изолированных контекстах. Порт фиксирован, поэтому после
+    перезапуска сервера воркеры переподключаются по тому же адресу.
+    """
+
+    def __init__(self, headless: bool = config.HEADLESS, port: int = config.SHARED_BROWSER_PORT):
+        self.headless = headless
+        self.port = port
+        self.endpoint = f'http://127.0.0.1:{port}'
+        self.process = None
+        self.user_data_dir = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self) -> str:
+        """Запустить Chromium и дождаться готовности CDP. Возвращает endpoint"""
+        with sync_playwright() as playwright:
+            executable = playwright.chromium.executable_path
+
+        self.user_data_dir = tempfile.mkdtemp(prefix='crm_browser_')
+        args = [
+            executable,
+            f'--remote-debugging-port={self.port}',
+            f'--user-data-dir={self.user_data_dir}',
+            '--disable-blink-features=AutomationControlled',
+            '--no-first-run',
+            '--no-default-browser-check',
+        ]
+        if self.headless:
+            args.append('--headless=new')
+
+        self.process = subprocess.Popen(
+            args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(f'{self.endpoint}/json/version', timeout=1)
+                logger.info(f"🌐 Общий браузер запущен: {self.endpoint}")
+                return self.endpoint
+            except OSError:
+                if self.process.poll() is not None:
+                    break
+                time.sleep(0.2)
+
+        self.stop()
+        raise RuntimeError(f"Общий браузер не поднял CDP на порту {self.port}")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def rss_mb(self) -> float:
+        """Память всех процессов общего Chromium, МБ"""
+        if not self.is_alive():
+            return 0.0
+        try:
+            root = psutil.Process(self.process.pid)
+            return processes_rss_mb([root] + root.children(recursive=True))
+        except psutil.Error:
+            return 0.0
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.user_data_dir:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            self.user_data_dir = None
 
 
 class BrowserManager:
-    def __init__(self, headless: bool = config.HEADLESS):
+    def __init__(self, headless: bool = config.HEADLESS, cdp_endpoint: str = None,
+                 har_mode: str = None, har_dir: str = None):
+        """
+        Args:
+            cdp_endpoint: Подключиться к общему браузеру (BrowserServer)
+                вместо запуска собственного Chromium
+            har_mode: 'record' - записывать трафик в HAR, 'replay' - отдавать
+                ответы из записанных HAR без сети (по умолчанию config.HAR_MODE)
+            har_dir: Каталог HAR-файлов (по умолчанию config.HAR_DIR)
+        """
         self.headless = headless
+        self.cdp_endpoint = cdp_endpoint
+        self.har_mode = har_mode or config.HAR_MODE
+        self.har_dir = Path(har_dir or config.HAR_DIR)
         self.playwright = None
+        self.driver: List[psutil.Process] = []  # Процесс драйвера Playwright (rss_mb)
         self.browser = None
         self.context = None
+        self.har_account = None  # Аккаунт, чей трафик пишет/воспроизводит контекст (use_account)
+        self.navigations = 0
+        self.restarts = 0
+        self.crashed = False
 
     def __enter__(self):
+        # Драйвер - дочерний процесс, появившийся при старте Playwright;
+        # Chromium запускается уже его потомком
+        started = {process.pid for process in psutil.Process().children()}
         self.playwright = sync_playwright().start()
+        self.driver = [process for process in psutil.Process().children() if process.pid not in started]
+        self._launch_browser()
+        self._new_context()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.context:
+            self.context.close()
+        if self.browser:
+            self.browser.close()
+        if self.playwright:
+            self.playwright.stop()
+
+    def _launch_browser(self):
+        if self.cdp_endpoint:
+            self.browser = self.playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+            return
         self.browser = self.playwright.chromium.launch(
             headless=self.headless,
             args=['--disable-blink-features=AutomationControlled']
         )
+
+    def _new_context(self):
+        options = {}
+        if self.har_mode == 'record':
+            # HAR пишется при закрытии контекста, поэтому у каждого
+            # контекста (и каждого воркера) свой файл; в имени - аккаунт
+            self.har_dir.mkdir(parents=True, exist_ok=True)
+            options['record_har_path'] = str(
+                self.har_dir / f"{self.har_account or 'session'}_"
+                               f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self.restarts}.har")
+
         self.context = self.browser.new_context(
             viewport={'width': 1920, 'height': 1080},
             user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             # ДОБАВЛЕНО: разрешение на clipboard
-            permissions=['clipboard-read', 'clipboard-write']
+            permissions=['clipboard-read', 'clipboard-write'],
+            **options
         )
         self.context.set_default_timeout(config.BROWSER_TIMEOUT)
         self.context.set_default_navigation_timeout(config.PAGE_LOAD_TIMEOUT)
-        return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.context:
-            self.context.close()
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        if self.har_mode == 'replay':
+            self._route_from_har()
+
+    def _route_from_har(self):
+        """
+        Отдавать ответы из записанных HAR, не выходя в сеть
+
+        Внутри аккаунта - только его HAR (см. use_account), до входа в
+        аккаунт - все. Обработчики, добавленные позже, проверяются раньше:
+        при совпадении URL побеждает более свежая запись. Запросы, которых
+        нет ни в одном HAR, обрываются.
+        """
+        pattern = f'{self.har_account}_*.har' if self.har_account else '*.har'
+        hars = sorted(self.har_dir.glob(pattern))
+        if not hars:
+            raise FileNotFoundError(f"Нет записанных HAR ({pattern}) в {self.har_dir}")
+
+        self.context.route('**/*', lambda route: route.abort())
+        for har in hars:
+            self.context.route_from_har(str(har), not_found='fallback')
+        logger.info(f"📼 Воспроизведение трафика из {len(hars)} HAR ({self.har_dir})")
+
+    def use_account(self, account_id: Optional[str]) -> Optional[Page]:
+        """
+        Перейти к трафику аккаунта в режиме HAR: новый контекст и страница
+
+        URL списка телефонов у всех аккаунтов CRM одинаковые (аккаунт
+        задает сессия), поэтому общий HAR отдавал бы каждому аккаунту
+        страницы последнего записанного. Трафик аккаунта пишется в свой
+        файл и воспроизводится только из него (account_id None - трафик
+        вне аккаунтов, все HAR). Без HAR или для того же аккаунта - None,
+        текущая страница остается.
+        """
+        if not self.har_mode or account_id == self.har_account:
+            return None
+        self.har_account = account_id
+        return self.restart()
 
     def new_page(self) -> Page:
         """Создать новую страницу"""
@@ -39,4 +234,67 @@ class BrowserManager:
         # Устанавливаем увеличенный таймаут для страницы
         page.set_default_timeout(config.BROWSER_TIMEOUT)
         page.set_default_navigation_timeout(config.PAGE_LOAD_TIMEOUT)
+        page.on('load', self._on_load)
+        page.on('crash', self._on_crash)
         return page
+
+    def _on_load(self, page: Page):
+        self.navigations += 1
+
+    def _on_crash(self, page: Page):
+        logger.warning("💥 Страница браузера упала")
+        self.crashed = True
+
+    def rss_mb(self) -> float:
+        """
+        Память браузера (драйвер Playwright и все процессы Chromium), МБ
+
+        Считается только дерево процессов драйвера: пул разбора и другие
+        дочерние процессы воркера к браузеру не относятся. При подключении
+        к общему браузеру учитывается только драйвер.
+        """
+        processes = []
+        for driver in self.driver:
+            try:
+                processes += [driver] + driver.children(recursive=True)
+            except psutil.Error:
+                pass
+        return processes_rss_mb(processes)
+
+    def needs_recycle(self) -> Optional[str]:
+        """Причина планового перезапуска или None"""
+        if self.navigations >= config.BROWSER_RECYCLE_NAVIGATIONS:
+            return f'{self.navigations} навигаций'
+        rss = self.rss_mb()
+        if rss >= config.BROWSER_MAX_RSS_MB:
+            return f'память {rss:.0f}MB'
+        return None
+
+    def restart(self) -> Page:
+        """
+        Пересоздать контекст и вернуть новую страницу
+
+        После падения, потери соединения или превышения лимита памяти
+        перезапускается и сам Chromium (для общего браузера -
+        переподключение к нему).
+        """
+        full = (self.crashed or not self.browser.is_connected()
+                or self.rss_mb() >= config.BROWSER_MAX_RSS_MB)
+
+        try:
+            self.context.close()
+        except Exception:
+            pass
+
+        if full:
+            try:
+                self.browser.close()
+            except Exception:
+                pass
+            self._launch_browser()
+
+        self._new_context()
+        self.navigations = 0
+        self.crashed = False
+        self.restarts += 1
+        return self.new_page()
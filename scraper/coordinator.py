@@ -0,0 +1,271 @@
+import hmac
+import json
+import time
+import socket
+import ipaddress
+import threading
+import http.client
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, Optional, Tuple
+import config
+from database.db import Database
+from scraper.rate_limiter import RateLimiter
+from utils.known_phones import prepare
+from utils.heartbeat import progress_summary, log_progress
+from utils.logger import logger
+from utils.metrics import metrics
+
+# Методы Database, которые координатор выполняет за удаленных воркеров
+# (без get_account: токен-ссылки отдаются только вместе с арендой аккаунта)
+DB_METHODS = {
+    'acquire_account_for_processing', 'release_leases', 'update_account_status', 'get_account_status',
+    'save_page', 'add_phones', 'save_page_hash', 'get_page_hashes', 'count_known_phones',
+    'update_account_size', 'get_tenant_page_size', 'set_tenant_page_size', 'set_account_page_size',
+    'get_pending_count',
+    'save_heartbeat',
+}
+# Общий лимит запросов к CRM: методы RateLimiter координатора
+RATE_METHODS = {'rate_try_take': '_try_take', 'rate_report': 'report', 'rate_current': 'current_rate'}
+
+TOKEN_HEADER = 'X-Coordinator-Token'
+
+
+class CoordinatorError(Exception):
+    """Координатор выполнил запрос с ошибкой (повтор не поможет)"""
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """'host:port' или ':port' -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def is_loopback(host: str) -> bool:
+    """Адрес доступен только с этой машины"""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+class Coordinator:
+    """
+    Координатор распределенного парсинга: владелец БД и лимита запросов
+
+    Воркеры на других машинах (--mode worker --coordinator host:port) не
+    открывают SQLite: аренда аккаунтов, сохранение страниц и токены
+    лимитера идут сюда запросами POST /rpc с JSON {"method", "args",
+    "kwargs"}. Каждый запрос выполняется обычным методом Database или
+    RateLimiter в своем потоке, поэтому семантика (аренда с TTL, прогресс
+    после номеров, AIMD) та же, что у воркеров --mode parallel.
+
+    Без COORDINATOR_TOKEN координатор слушает только loopback: через него
+    выдаются токен-ссылки CRM и меняется очередь аккаунтов.
+    """
+
+    def __init__(self, host: str = None, port: int = None, db: Database = None):
+        host = host or config.COORDINATOR_HOST
+        if not config.COORDINATOR_TOKEN and not is_loopback(host):
+            raise ValueError(f"Координатор на {host} без токена: задайте CRM_COORDINATOR_TOKEN "
+                             f"или слушайте 127.0.0.1")
+        self.db = db or Database()
+        self.rate_limiter = RateLimiter(self.db.db_path)
+        # Фильтр известных номеров работает здесь, в add_phones координатора
+        prepare(self.db)
+        self.db.enable_known_filter()
+        # port 0 - любой свободный порт (бенчмарки, тесты)
+        port = config.COORDINATOR_PORT if port is None else port
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'{host}:{port}'
+
+    def call(self, method: str, args: list, kwargs: Dict):
+        if method in DB_METHODS:
+            target = getattr(self.db, method)
+        elif method in RATE_METHODS:
+            target = getattr(self.rate_limiter, RATE_METHODS[method])
+        else:
+            raise KeyError(method)
+        metrics.inc('crm_coordinator_requests_total', method=method)
+        # Координатор - единственный писатель БД: запросы по очереди внутри
+        # процесса вместо ожидания блокировки SQLite с нарастающими паузами
+        with self.lock, metrics.timer('coordinator', method):
+            return target(*args, **kwargs)
+
+    def _handler(self):
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive: воркер держит одно соединение на все запросы
+            protocol_version = 'HTTP/1.1'
+            # Заголовки и тело ответа уходят отдельными записями: без TCP_NODELAY
+            # каждый ответ ждал бы delayed ACK клиента (~40 мс)
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, code: int, payload: Dict):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorized(self) -> bool:
+                if not config.COORDINATOR_TOKEN:
+                    return True
+                token = self.headers.get(TOKEN_HEADER, '')
+                return hmac.compare_digest(token.encode('utf-8'), config.COORDINATOR_TOKEN.encode('utf-8'))
+
+            def do_POST(self):
+                try:
+                    body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                    request = json.loads(body or b'{}')
+                    if not isinstance(request, dict):
+                        raise ValueError('ожидался JSON-объект')
+                except ValueError as e:
+                    # Тело уже не согласовано с потоком: соединение не переиспользуем
+                    self.close_connection = True
+                    self._reply(400, {'error': f'Неверный запрос: {e}'})
+                    return
+
+                if self.path != '/rpc':
+                    self._reply(404, {'error': f'Нет пути {self.path}'})
+                elif not self._authorized():
+                    self._reply(403, {'error': 'Неверный токен координатора'})
+                else:
+                    method = request.get('method')
+                    try:
+                        result = coordinator.call(method, request.get('args', []), request.get('kwargs', {}))
+                    except KeyError:
+                        self._reply(404, {'error': f'Нет метода {method}'})
+                    except Exception as e:
+                        logger.error(f"❌ Координатор: ошибка {method}: {e}")
+                        self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+                    else:
+                        self._reply(200, {'result': result})
+
+        return Handler
+
+    def start(self) -> 'Coordinator':
+        """Обслуживать запросы в фоновом потоке"""
+        self.thread = threading.Thread(target=self.server.serve_forever, name='coordinator', daemon=True)
+        self.thread.start()
+        logger.info(f"🛰️ Координатор слушает {self.address} (БД: {self.db.db_path})")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CoordinatorClient:
+    """
+    Соединение воркера с координатором (JSON поверх HTTP/1.1 keep-alive)
+
+    Обрыв связи и таймаут повторяются COORDINATOR_RETRIES раз с паузой
+    RETRY_DELAY: запросы воркера можно повторять (номера дедуплицируются,
+    прогресс и отпечатки перезаписываются). Исключение - повторная аренда:
+    если ответ на нее потерян, аккаунт вернется в очередь по ACCOUNT_LEASE_TTL.
+    """
+
+    def __init__(self, address: str):
+        self.host, self.port = parse_address(address)
+        self.connection: Optional[http.client.HTTPConnection] = None
+        self.lock = threading.Lock()
+
+    def call(self, method: str, *args, **kwargs):
+        body = json.dumps({'method': method, 'args': args, 'kwargs': kwargs}, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if config.COORDINATOR_TOKEN:
+            headers[TOKEN_HEADER] = config.COORDINATOR_TOKEN
+
+        for attempt in range(1, config.COORDINATOR_RETRIES + 1):
+            try:
+                with self.lock, metrics.timer('coordinator_client', method):
+                    if self.connection is None:
+                        self.connection = http.client.HTTPConnection(
+                            self.host, self.port, timeout=config.COORDINATOR_TIMEOUT)
+                    self.connection.request('POST', '/rpc', body, headers)
+                    response = self.connection.getresponse()
+                    payload = json.loads(response.read() or b'{}')
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                if attempt == config.COORDINATOR_RETRIES:
+                    raise
+                # Первый повтор сразу: чаще всего координатор закрыл простаивавшее соединение
+                if attempt > 1:
+                    logger.warning(f"  ⚠️ Нет связи с координатором {self.host}:{self.port} ({e}), "
+                                   f"повтор {attempt}...")
+                    time.sleep(config.RETRY_DELAY)
+                continue
+
+            if response.status != 200:
+                raise CoordinatorError(f"{method}: {payload.get('error', response.status)}")
+            return payload['result']
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class RemoteDatabase:
+    """Database воркера, методы которой выполняет координатор (см. DB_METHODS)"""
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+        self.db_path = f'coordinator://{client.host}:{client.port}'
+
+    def __getattr__(self, name: str):
+        if name not in DB_METHODS:
+            raise AttributeError(f'{name} недоступен удаленному воркеру')
+        return lambda *args, **kwargs: self.client.call(name, *args, **kwargs)
+
+    def get_page_hashes(self, account_id: str) -> Dict[int, int]:
+        # Ключи JSON-объекта - строки
+        return {int(page): page_hash
+                for page, page_hash in self.client.call('get_page_hashes', account_id).items()}
+
+
+class RemoteRateLimiter(RateLimiter):
+    """Общий лимит запросов к CRM, который ведет координатор"""
+
+    def __init__(self, client: CoordinatorClient):
+        self.client = client
+        self.db_path = None
+
+    def _try_take(self) -> float:
+        return self.client.call('rate_try_take')
+
+    def report(self, latency: float, status: Optional[int] = None, timeout: bool = False):
+        self.client.call('rate_report', latency, status, timeout)
+
+    def current_rate(self) -> float:
+        return self.client.call('rate_current')
+
+
+def run_coordinator(db: Database, address: str = None, stop: Callable[[], bool] = lambda: False):
+    """--mode coordinator: обслуживать воркеров, пока stop() не вернет True"""
+    host, port = parse_address(address) if address else (None, None)
+    db.clear_heartbeats()
+    coordinator = Coordinator(host, port, db).start()
+    progress_logged_at = time.time()
+    try:
+        while not stop():
+            time.sleep(1)
+            # Сводка по удаленным воркерам (их пульс пишется через координатора)
+            if config.PROGRESS_INTERVAL and time.time() - progress_logged_at >= config.PROGRESS_INTERVAL:
+                progress_logged_at = time.time()
+                log_progress(progress_summary(db))
+    finally:
+        coordinator.stop()
+        logger.info(f"🏁 Координатор остановлен. Осталось аккаунтов: {db.get_pending_count()}")
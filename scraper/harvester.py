@@ -1,49 +1,36 @@
-import time
-import random
 import re
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeout
 from typing import List, Dict
 import config
 from database.db import Database
+from scraper.rate_limiter import RateLimiter, throttled_goto
 from utils.logger import logger
+from utils.metrics import metrics
 
 
 class AccountHarvester:
-    def __init__(self, page: Page, db: Database):
+    def __init__(self, page: Page, db: Database, rate_limiter: RateLimiter = None):
         self.page = page
         self.db = db
+        self.rate_limiter = rate_limiter or RateLimiter(db.db_path)
 
     def harvest_all_accounts(self):
         """Собрать все аккаунты со всех страниц"""
         logger.info("🌾 Начало сбора аккаунтов...")
 
-        # Переход на страницу с retry логикой
-        max_retries = 3
-        for attempt in range(1, max_retries + 1):
-            try:
-                logger.info(
-                    f"⏳ Загрузка страницы (попытка {attempt}/{max_retries})...")
-                logger.info(
-                    "   (Страница может грузиться до 2 минут - это нормально)")
-
-                self.page.goto(config.ACCOUNTS_URL,
-                               timeout=config.PAGE_LOAD_TIMEOUT)
-
-                # Ждем загрузки
-                logger.info("⏳ Ожидание полной загрузки контента...")
-                time.sleep(5)
-
-                break  # Успешно загрузилось
+        # Переход на страницу (таймауты повторяет throttled_goto)
+        logger.info("⏳ Загрузка страницы...")
+        logger.info("   (Страница может грузиться до 2 минут - это нормально)")
+        try:
+            throttled_goto(self.page, self.rate_limiter, config.ACCOUNTS_URL,
+                           timeout=config.PAGE_LOAD_TIMEOUT)
+        except PlaywrightTimeout:
+            logger.error("❌ Не удалось загрузить страницу после всех попыток")
+            raise
 
-            except PlaywrightTimeout:
-                if attempt < max_retries:
-                    logger.warning(
-                        f"⚠️ Таймаут загрузки. Повтор через {config.RETRY_DELAY} сек...")
-                    time.sleep(config.RETRY_DELAY)
-                else:
-                    logger.error(
-                        "❌ Не удалось загрузить страницу после всех попыток")
-                    raise
+        # Ждем загрузки
+        logger.info("⏳ Ожидание полной загрузки контента...")
+        metrics.sleep(5, 'harvester')
 
         current_page = 1
         total_accounts = 0
@@ -52,10 +39,11 @@ class AccountHarvester:
             logger.info(f"📄 Обработка страницы {current_page}...")
 
             # Ждем загрузки контента (динамическая таблица)
-            time.sleep(3)
+            metrics.sleep(3, 'harvester')
 
             # Парсим аккаунты на текущей странице
-            accounts = self._parse_accounts_on_page()
+            with metrics.timer('harvester', 'parse'):
+                accounts = self._parse_accounts_on_page()
 
             if not accounts:
                 logger.warning("⚠️ Аккаунты не найдены на странице")
@@ -77,9 +65,11 @@ class AccountHarvester:
             # Генерируем токены для каждого аккаунта
             for idx, account in enumerate(accounts, 1):
                 logger.info(
-                    f"   [{idx}/{len(accounts)}] Обработка: {account['username']}")
+                    f"   [{idx}/{len(accounts)}] Обработка: {account['username']}",
+                    extra={'category': 'token'})
 
-                token_url = self._generate_token(account['account_id'])
+                with metrics.timer('harvester', 'token'):
+                    token_url = self._generate_token(account['account_id'])
 
                 if token_url:
                     self.db.add_account(
@@ -88,11 +78,13 @@ class AccountHarvester:
                         token_url=token_url
                     )
                     total_accounts += 1
-                    logger.info(f"   ✅ Токен получен")
+                    metrics.inc('crm_tokens_total', result='ok')
+                    logger.info(f"   ✅ Токен получен", extra={'category': 'token'})
                 else:
                     logger.error(f"   ❌ Не удалось получить токен")
+                    metrics.inc('crm_tokens_total', result='failed')
 
-                time.sleep(random.uniform(*config.DELAY_BETWEEN_REQUESTS))
+            metrics.inc('crm_pages_total', component='harvester')
 
             # Проверяем следующую страницу
             if not self._has_next_page():
@@ -100,9 +92,9 @@ class AccountHarvester:
                 break
 
             # Переход на следующую страницу
-            self._go_to_next_page()
+            with metrics.timer('harvester', 'next_page'):
+                self._go_to_next_page()
             current_page += 1
-            time.sleep(random.uniform(3, 5))
 
         logger.info(f"🎉 Сбор завершен! Всего аккаунтов: {total_accounts}")
 
@@ -233,14 +225,15 @@ class AccountHarvester:
             # СПОСОБ 3: Читаем буфер обмена (после клика токен копируется туда)
             # Для этого нужно дать разрешение на чтение clipboard
 
-            # Кликаем на кнопку
+            # Кликаем на кнопку (create-token - запрос к CRM)
+            self.rate_limiter.acquire()
             try:
                 button.click(timeout=5000)
             except Exception as e:
                 logger.error(f"   Ошибка клика: {e}")
 
             # Ждем результата
-            time.sleep(2)
+            metrics.sleep(2, 'harvester')
 
             # Пробуем прочитать из буфера обмена
             if not token_url:
@@ -373,6 +366,7 @@ class AccountHarvester:
                 return False
             
             # Кликаем
+            self.rate_limiter.acquire()
             next_button.click()
             logger.info("   🖱️ Клик по кнопке 'Следующая'")
             
@@ -381,7 +375,7 @@ class AccountHarvester:
             updated = False
             
             for i in range(max_wait):
-                time.sleep(1)
+                metrics.sleep(1, 'harvester')
                 
                 # Проверяем, изменился ли текст пагинации
                 try:
@@ -399,7 +393,7 @@ class AccountHarvester:
                 logger.warning("   ⚠️ Данные не обновились после клика")
             
             # Дополнительная задержка для стабильности
-            time.sleep(2)
+            metrics.sleep(2, 'harvester')
             return True
             
         except Exception as e:
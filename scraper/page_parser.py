@@ -0,0 +1,117 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import config
+from utils.logger import logger
+from utils.numbering import normalize_phones
+from utils.phones import PHONE_CANDIDATE, PHONE_COLUMN_CANDIDATE
+
+# Селекторы строк таблицы телефонов, по порядку (первый непустой)
+ROW_SELECTORS = (
+    'table tbody tr',
+    'table tr',
+    'tr[data-key]',
+    '.grid-view tbody tr',
+    'div[role="row"]',
+)
+
+# Текст строк и их ячеек одним запросом к браузеру (вместо inner_text на каждую строку).
+# Ячейки заголовка (th) - чтобы найти колонку телефона
+ROWS_SCRIPT = '''(selectors) => {
+    for (const selector of selectors) {
+        const rows = document.querySelectorAll(selector);
+        if (rows.length) {
+            return Array.from(rows, row => [
+                row.innerText,
+                Array.from(row.querySelectorAll('th, td'), cell => cell.innerText.trim()),
+            ]);
+        }
+    }
+    return [];
+}'''
+
+Row = Tuple[str, List[str]]
+
+
+def is_header(row_text: str) -> bool:
+    """Строка заголовка таблицы телефонов"""
+    return 'ТЕЛЕФОН' in row_text or 'ПРОЕКТ' in row_text
+
+
+def extract_phones(rows: Sequence[Row]) -> List[str]:
+    """
+    Номера из текста строк таблицы: канонический вид, без повторов
+
+    Чистая функция без браузера - выполняется в пуле разбора. По строке
+    заголовка определяется колонка телефона; в остальных строках номера
+    с кодом страны или префиксом 8 ищутся по всему тексту, а десять цифр
+    без префикса - только в колонке телефона. Нормализация одной пачкой
+    на страницу.
+    """
+    candidates = []
+    phone_column = None
+    for row_text, cells in rows:
+        # Ячейки без разметки (div-строки) - колонки текста через табуляцию
+        columns = cells or row_text.split('\t')
+        # Заголовок не разбираем, только запоминаем колонку телефона
+        if is_header(row_text):
+            phone_column = next((i for i, name in enumerate(columns) if 'ТЕЛЕФОН' in name.upper()),
+                                phone_column)
+            continue
+        # Regex поиск номеров в любой записи (+7 (9xx) ..., 8 9xx ..., 7xxxxxxxxxx)
+        candidates.extend(PHONE_CANDIDATE.findall(row_text))
+        if phone_column is not None and phone_column < len(columns):
+            candidates.extend(PHONE_COLUMN_CANDIDATE.findall(columns[phone_column]))
+
+    normalized = normalize_phones(candidates)
+    return [str(phone) for phone in np.unique(normalized[normalized > 0]).tolist()]
+
+
+class ParsePool:
+    """
+    Пул разбора страниц телефонов
+
+    Браузер отдает сырой текст таблицы и сразу идет на следующую страницу,
+    а номера из него извлекаются в пуле: 'thread' - потоки процесса
+    (разбор идет, пока поток браузера ждет загрузку страницы и не держит
+    GIL), 'off' - в потоке браузера, как раньше. Результаты забираются в
+    порядке страниц.
+
+    Пула процессов нет: передача строк страницы в другой процесс дороже
+    самого разбора (benchmarks/parse_pool_bench.py - медленнее, чем 'off').
+    """
+
+    def __init__(self, kind: str = None, workers: int = None):
+        self.kind = kind or config.PARSE_POOL
+        workers = workers or config.PARSE_WORKERS
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if self.kind == 'thread':
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix='parse')
+        elif self.kind != 'off':
+            logger.warning(f"⚠️ Неизвестный PARSE_POOL={self.kind}, разбор в потоке браузера")
+            self.kind = 'off'
+
+    def submit(self, rows: Sequence[Row]) -> Future:
+        if self.executor is not None:
+            return self.executor.submit(extract_phones, rows)
+        future = Future()
+        try:
+            future.set_result(extract_phones(rows))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+_pools = {}
+
+
+def get_pool() -> ParsePool:
+    """Пул разбора процесса (один на вид пула, создается при первом вызове)"""
+    if config.PARSE_POOL not in _pools:
+        _pools[config.PARSE_POOL] = ParsePool()
+    return _pools[config.PARSE_POOL]
@@ -1,97 +1,340 @@
+import os
+import re
 import time
-import random
+import queue
+import socket
 import multiprocessing as mp
-from typing import Optional
-from pathlib import Path
+from typing import Callable, Dict
+import psutil
 import config
 from database.db import Database
-from scraper.browser import BrowserManager
+from scraper.autoscaler import Autoscaler
+from scraper.browser import BrowserManager, BrowserServer
 from scraper.phone_scraper import PhoneScraper
-from utils.logger import logger
+from scraper.rate_limiter import RateLimiter
+from utils.known_phones import prepare
+from utils.heartbeat import WorkerHeartbeat, progress_summary, log_progress
+from utils.logger import logger, setup_worker_logger, worker_log_queue
+from utils.metrics import metrics, merge_snapshots, export
+from utils.profiler import profiler
 
+# Имена воркеров --mode parallel (worker-1, worker-2, ...), одинаковые в каждом запуске
+LOCAL_WORKER = re.compile(r'worker-\d+')
 
-def worker_process(worker_id: int, total_workers: int):
+
+def process_accounts(db: Database, scraper: PhoneScraper, owner: str, worker_logger,
+                     should_stop: Callable[[], bool], on_account: Callable[[bool], None] = None):
+    """
+    Брать аккаунты в аренду и парсить, пока они есть и не попросили остановиться
+
+    Общий цикл воркеров --mode parallel и удаленных --mode worker
+    (у них db - RemoteDatabase координатора). on_account(failed) - после
+    каждого обработанного аккаунта.
+    """
+    while not should_stop():
+        # Атомарно получаем следующий аккаунт
+        account = db.acquire_account_for_processing(owner)
+
+        if not account:
+            worker_logger.info("📭 Нет больше аккаунтов для обработки")
+            break
+
+        account_id = account['account_id']
+        username = account['username']
+        token_url = account['token_url']
+        last_page = account['last_page']
+
+        worker_logger.info(
+            f"🔄 Обработка: {username} (ID: {account_id})")
+
+        if not token_url:
+            worker_logger.error(f"❌ Нет токен-ссылки для {account_id}")
+            db.update_account_status(account_id, 'failed')
+            continue
+
+        # Парсим аккаунт
+        start_page = last_page + 1 if last_page > 0 else 1
+        phones_count = scraper.scrape_account(
+            account_id, token_url, start_page)
+
+        if on_account:
+            on_account(db.get_account_status(account_id) == 'failed')
+        worker_logger.info(f"✅ Обработано: {phones_count} номеров")
+
+
+def worker_process(worker_id: int, stop_event, events, log_queue, cdp_endpoint: str = None):
     """
     Воркер процесс для параллельной обработки аккаунтов
 
     Args:
         worker_id: ID воркера (1, 2, 3...)
-        total_workers: Общее количество воркеров
+        stop_event: Сигнал супервизора завершиться после текущего аккаунта
+        events: Очередь событий для супервизора (страницы, аккаунты, выход)
+        log_queue: Очередь записей лога (пишет оркестратор)
+        cdp_endpoint: Адрес общего браузера (режим --shared-browser)
     """
+    # Логи воркера уходят в очередь оркестратора
+    worker_logger = setup_worker_logger(log_queue, worker_id)
+
+    # Профиль воркера (если запуск с --profile)
+    profiler.start()
+
     # Создаем свою БД для каждого процесса
     db = Database()
-
-    # Настройка логгера для воркера
-    from utils.logger import setup_logger
-    worker_logger = setup_logger(f'Worker-{worker_id}')
+    db.enable_known_filter()
+    owner = f'worker-{worker_id}'
 
     worker_logger.info(f"🚀 Воркер #{worker_id} запущен")
 
-    # Задержка перед стартом (чтобы не все воркеры стартовали одновременно)
-    if worker_id > 1:
-        delay = random.uniform(*config.WORKER_DELAY)
-        worker_logger.info(f"⏳ Ожидание {delay:.1f}сек перед стартом...")
-        time.sleep(delay)
+    # Общий для всех воркеров лимит запросов: он же разносит их старт
+    rate_limiter = RateLimiter(db.db_path)
 
     processed_count = 0
+    crashed = False
+    heartbeat = None
 
     try:
         # Открываем браузер один раз для всех аккаунтов этого воркера
-        with BrowserManager(headless=config.HEADLESS) as browser:
+        with BrowserManager(headless=config.HEADLESS, cdp_endpoint=cdp_endpoint) as browser:
             page = browser.new_page()
-            scraper = PhoneScraper(page, db)
+            heartbeat = WorkerHeartbeat(db, owner, browser.rss_mb)
 
-            while True:
-                # Атомарно получаем следующий аккаунт
-                account = db.acquire_account_for_processing()
+            def on_page(account_id, page_num, added):
+                heartbeat.page(account_id, page_num, added)
+                events.put({'type': 'page', 'worker': worker_id,
+                            'rss_mb': browser.rss_mb(), 'restarts': browser.restarts})
 
-                if not account:
-                    worker_logger.info("📭 Нет больше аккаунтов для обработки")
-                    break
-
-                account_id = account['account_id']
-                username = account['username']
-                token_url = account['token_url']
-                last_page = account['last_page']
-
-                worker_logger.info(
-                    f"🔄 Обработка: {username} (ID: {account_id})")
-
-                if not token_url:
-                    worker_logger.error(f"❌ Нет токен-ссылки для {account_id}")
-                    db.update_account_status(account_id, 'failed')
-                    continue
-
-                # Парсим аккаунт
-                start_page = last_page + 1 if last_page > 0 else 1
-                phones_count = scraper.scrape_account(
-                    account_id, token_url, start_page)
+            scraper = PhoneScraper(page, db, rate_limiter, on_page=on_page, browser=browser)
 
+            def on_account(failed):
+                nonlocal processed_count
                 processed_count += 1
-                worker_logger.info(f"✅ Обработано: {phones_count} номеров")
+                events.put({'type': 'account', 'worker': worker_id, 'failed': failed})
 
-                # Задержка между аккаунтами
-                delay = random.uniform(*config.DELAY_BETWEEN_ACCOUNTS)
-                worker_logger.info(f"⏳ Пауза {delay:.1f}сек...")
-                time.sleep(delay)
+            process_accounts(db, scraper, owner, worker_logger, stop_event.is_set, on_account)
 
     except KeyboardInterrupt:
         worker_logger.warning("⚠️ Воркер остановлен пользователем")
     except Exception as e:
+        crashed = True
         worker_logger.error(
             f"❌ Критическая ошибка в воркере: {e}", exc_info=True)
     finally:
         worker_logger.info(
             f"🏁 Воркер #{worker_id} завершен. Обработано: {processed_count} аккаунтов")
+        if heartbeat:
+            heartbeat.finish()
+        metrics.flush()
+        profiler.stop()
+        events.put({'type': 'exit', 'worker': worker_id, 'crashed': crashed})
         return processed_count
 
 
+def run_remote_worker(address: str) -> int:
+    """
+    --mode worker: парсить аккаунты координатора с этой машины
+
+    БД и лимит запросов - на координаторе (scraper/coordinator.py), здесь
+    только браузер и разбор страниц. Аренда воркера снимается при выходе,
+    аккаунт упавшего воркера вернется в очередь по ACCOUNT_LEASE_TTL.
+    """
+    from scraper.coordinator import CoordinatorClient, RemoteDatabase, RemoteRateLimiter
+
+    client = CoordinatorClient(address)
+    db = RemoteDatabase(client)
+    owner = f'{socket.gethostname()}-{os.getpid()}'
+    processed_count = 0
+
+    def on_account(failed):
+        nonlocal processed_count
+        processed_count += 1
+
+    heartbeat = None
+
+    logger.info(f"🚀 Удаленный воркер {owner}, координатор {address}")
+    try:
+        with BrowserManager(headless=config.HEADLESS) as browser:
+            heartbeat = WorkerHeartbeat(db, owner, browser.rss_mb)
+            scraper = PhoneScraper(browser.new_page(), db, RemoteRateLimiter(client),
+                                   on_page=heartbeat.page, browser=browser)
+            process_accounts(db, scraper, owner, logger, lambda: False, on_account)
+    except KeyboardInterrupt:
+        logger.warning("⚠️ Воркер остановлен пользователем")
+    finally:
+        if heartbeat:
+            heartbeat.finish()
+        try:
+            db.release_leases(owner)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось снять аренду {owner}: {e}")
+        client.close()
+        logger.info(f"🏁 Воркер {owner} завершен. Обработано: {processed_count} аккаунтов")
+    return processed_count
+
+
 class ParallelScraper:
-    """Оркестратор параллельной обработки"""
+    """
+    Оркестратор параллельной обработки
 
-    def __init__(self, max_workers: int = config.MAX_WORKERS):
+    Супервизор держит число воркеров между min_workers и max_workers
+    (решение принимает Autoscaler) и заменяет упавшие воркеры.
+    """
+
+    def __init__(self, max_workers: int = config.MAX_WORKERS,
+                 min_workers: int = config.MIN_WORKERS,
+                 shared_browser: bool = config.SHARED_BROWSER):
         self.max_workers = max_workers
+        self.min_workers = min(min_workers, max_workers)
+        # Один Chromium на всех: воркеры стартуют мгновенно и берут
+        # только память своего контекста
+        self.browser_server = BrowserServer() if shared_browser else None
         self.db = Database()
+        self.rate_limiter = RateLimiter(self.db.db_path)
+        self.events = mp.Queue()
+        self.workers: Dict[int, Dict] = {}
+        self.next_worker_id = 1
+        self.total_processed = 0
+        self.autoscaler = Autoscaler(self.min_workers, self.max_workers)
+        self.memory: Dict[int, tuple] = {}  # worker_id -> (RSS браузера МБ, перезапусков)
+        self.memory_logged_at = time.time()
+        self.progress_logged_at = time.time()
+        self.metrics_exported_at = time.time()
+        self.db_optimized_at = time.time()
+
+    def _start_worker(self):
+        """Запустить новый воркер"""
+        worker_id = self.next_worker_id
+        self.next_worker_id += 1
+
+        stop_event = mp.Event()
+        process = mp.Process(
+            target=worker_process,
+            args=(worker_id, stop_event, self.events, worker_log_queue(),
+                  self.browser_server.endpoint if self.browser_server else None),
+            name=f'Worker-{worker_id}'
+        )
+        process.start()
+        self.workers[worker_id] = {
+            'process': process, 'stop': stop_event, 'exit': None}
+
+    def _active_workers(self):
+        """Живые воркеры, которых не просили остановиться"""
+        return [worker_id for worker_id, w in self.workers.items()
+                if w['process'].is_alive() and not w['stop'].is_set()]
+
+    def _drain_events(self):
+        """Забрать события воркеров из очереди"""
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+
+            if event['type'] == 'page':
+                self.autoscaler.record_page()
+                self.memory[event['worker']] = (event['rss_mb'], event['restarts'])
+                metrics.set_gauge('crm_browser_rss_mb', event['rss_mb'], worker=str(event['worker']))
+            elif event['type'] == 'account':
+                self.autoscaler.record_account(event['failed'])
+                self.total_processed += 1
+            elif event['type'] == 'exit' and event['worker'] in self.workers:
+                self.workers[event['worker']]['exit'] = event
+
+    def _release_stale_leases(self):
+        """
+        Снять аренды воркеров прошлого запуска, процессов которых уже нет
+
+        Имена воркеров повторяются между запусками: после падения или kill
+        их аккаунты иначе простаивали бы до ACCOUNT_LEASE_TTL. Процесс
+        владельца берется из его последнего пульса; аренды воркеров другого
+        идущего запуска или другого хоста не трогаются и истекают по TTL.
+        """
+        host = socket.gethostname()
+        beats = {beat['worker']: beat for beat in self.db.get_heartbeats()}
+        released = 0
+        for owner in self.db.get_lease_owners():
+            beat = beats.get(owner)
+            if (LOCAL_WORKER.fullmatch(owner) and beat and beat['host'] == host
+                    and beat['pid'] and not psutil.pid_exists(beat['pid'])):
+                released += self.db.release_leases(owner)
+        if released:
+            logger.info(f"🔓 Сняты аренды прошлого запуска: {released} аккаунтов")
+
+    def _reap_workers(self) -> int:
+        """Убрать завершившиеся воркеры. Возвращает число упавших"""
+        finished = {worker_id: w for worker_id, w in self.workers.items()
+                    if not w['process'].is_alive()}
+        for w in finished.values():
+            w['process'].join()
+
+        # Событие выхода могло прийти уже после предыдущего чтения очереди
+        self._drain_events()
+
+        crashed = 0
+        for worker_id, w in finished.items():
+            process = w['process']
+            exit_event = w['exit']
+            if process.exitcode != 0 or exit_event is None or exit_event['crashed']:
+                crashed += 1
+                metrics.inc('crm_worker_crashes_total')
+                released = self.db.release_leases(f'worker-{worker_id}')
+                if exit_event is None:
+                    # Процесс не дошел до finally: пульс закрываем за него
+                    self.db.save_heartbeat(f'worker-{worker_id}', {
+                        'finished_at': time.time(), 'last_error_at': time.time(),
+                        'last_error': f'Процесс завершился без выхода (exitcode={process.exitcode})'})
+                logger.warning(
+                    f"💥 Воркер #{worker_id} упал (exitcode={process.exitcode}), "
+                    f"освобождено аккаунтов: {released}")
+            del self.workers[worker_id]
+            self.memory.pop(worker_id, None)
+            metrics.set_gauge('crm_browser_rss_mb', 0, worker=str(worker_id))
+
+        return crashed
+
+    def _log_memory(self):
+        """Периодически выводить память браузеров по воркерам"""
+        if not self.memory or time.time() - self.memory_logged_at < config.WORKER_STATS_INTERVAL:
+            return
+        self.memory_logged_at = time.time()
+        stats = ', '.join(
+            f"#{worker_id}: {rss:.0f}MB (перезапусков {restarts})"
+            for worker_id, (rss, restarts) in sorted(self.memory.items()))
+        if self.browser_server:
+            stats += f"; общий браузер: {self.browser_server.rss_mb():.0f}MB"
+        logger.info(f"🧠 Память браузеров: {stats}")
+
+    def _log_progress(self):
+        """Периодически выводить общий темп, остаток и ETA (--progress-interval)"""
+        if not config.PROGRESS_INTERVAL or time.time() - self.progress_logged_at < config.PROGRESS_INTERVAL:
+            return
+        self.progress_logged_at = time.time()
+        log_progress(progress_summary(self.db))
+
+    def _export_metrics(self):
+        """Периодически обновлять textfile со сводными метриками запуска"""
+        if not metrics.run_dir or time.time() - self.metrics_exported_at < config.METRICS_FLUSH_INTERVAL:
+            return
+        self.metrics_exported_at = time.time()
+        metrics.flush()
+        export(merge_snapshots(metrics.run_dir), metrics.run_dir)
+
+    def _optimize_db(self):
+        """Периодически обновлять статистику планировщика SQLite"""
+        if time.time() - self.db_optimized_at < config.DB_OPTIMIZE_INTERVAL:
+            return
+        self.db_optimized_at = time.time()
+        self.db.optimize()
+
+    def _stop_workers(self):
+        """Остановить все воркеры (после текущего аккаунта, затем принудительно)"""
+        for w in self.workers.values():
+            w['stop'].set()
+        for w in self.workers.values():
+            w['process'].join(timeout=30)
+            if w['process'].is_alive():
+                w['process'].terminate()
+        self._drain_events()
 
     def run(self):
         """Запустить параллельную обработку"""
@@ -102,41 +345,86 @@ class ParallelScraper:
             return
 
         logger.info("=" * 60)
-        logger.info(f"🚀 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА: {self.max_workers} воркеров")
+        logger.info(
+            f"🚀 ПАРАЛЛЕЛЬНАЯ ОБРАБОТКА: {self.min_workers}-{self.max_workers} воркеров")
         logger.info(f"📋 Аккаунтов к обработке: {pending_count}")
         logger.info("=" * 60)
 
-        # Оптимизируем количество воркеров
-        actual_workers = min(self.max_workers, pending_count)
-        logger.info(f"🔢 Запускаю {actual_workers} воркеров...")
+        # Снимок известных номеров собирается до старта воркеров, пока он совпадает с БД
+        prepare(self.db)
+        # Пульсы прошлого запуска нужны, чтобы отличить его завершенные воркеры
+        self._release_stale_leases()
+        self.db.clear_heartbeats()
+
+        target = self.min_workers
+        crashes = 0
+        waiting_logged = False
+        logger.info(f"🔢 Запускаю {min(target, pending_count)} воркеров...")
 
         start_time = time.time()
 
+        if self.browser_server:
+            self.browser_server.start()
+
         try:
-            # Создаем пул процессов
-            with mp.Pool(processes=actual_workers) as pool:
-                # Запускаем воркеры
-                results = []
-                for worker_id in range(1, actual_workers + 1):
-                    result = pool.apply_async(
-                        worker_process,
-                        args=(worker_id, actual_workers)
-                    )
-                    results.append(result)
-
-                # Ждем завершения всех воркеров
-                pool.close()
-                pool.join()
-
-                # Собираем результаты
-                total_processed = sum([r.get() for r in results])
+            while True:
+                self._drain_events()
+                crashes += self._reap_workers()
+                self._log_memory()
+                self._log_progress()
+                self._export_metrics()
+                self._optimize_db()
+
+                if self.browser_server and not self.browser_server.is_alive():
+                    logger.warning("💥 Общий браузер упал, перезапускаю...")
+                    crashes += 1
+                    self.browser_server.start()
+
+                if crashes > config.MAX_WORKER_RESTARTS:
+                    logger.error(
+                        f"❌ Воркеры упали {crashes} раз, останавливаю обработку")
+                    self._stop_workers()
+                    break
+
+                available = self.db.get_available_count()
+                active = self._active_workers()
+
+                if not self.workers and available == 0:
+                    # Аккаунты под чужой арендой (удаленные воркеры, другой
+                    # запуск) вернутся в очередь после завершения или по TTL
+                    leased = self.db.get_leased_count()
+                    if leased == 0:
+                        break
+                    if not waiting_logged:
+                        logger.info(f"⏳ {leased} аккаунтов в аренде у других воркеров, жду...")
+                        waiting_logged = True
+                else:
+                    waiting_logged = False
+
+                target = self.autoscaler.decide(
+                    target, available, self.rate_limiter.current_rate())
+                metrics.set_gauge('crm_workers_active', len(active))
+                metrics.set_gauge('crm_workers_target', target)
+
+                # Масштабирование вниз: новые воркеры доделывают аккаунт и выходят
+                for worker_id in sorted(active, reverse=True)[:max(0, len(active) - target)]:
+                    self.workers[worker_id]['stop'].set()
+
+                # Масштабирование вверх и замена упавших воркеров
+                for _ in range(min(target - len(active), available)):
+                    self._start_worker()
+
+                time.sleep(1)
 
         except KeyboardInterrupt:
             logger.warning(
                 "\n⚠️ Прерывание пользователем. Останавливаю воркеры...")
-            pool.terminate()
-            pool.join()
-            total_processed = 0
+            self._stop_workers()
+        finally:
+            if self.browser_server:
+                self.browser_server.stop()
+
+        total_processed = self.total_processed
 
         # Финальная статистика
         elapsed_time = time.time() - start_time
@@ -1,69 +1,124 @@
-import time
-import random
 import re
+import time
+import hashlib
+from collections import deque
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeout
-from typing import List
+from typing import List, Optional, Callable, Dict, Tuple
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qs, urlencode
 import config
 from database.db import Database
+from scraper.browser import BrowserManager, BrowserCrashed, is_target_closed
+from scraper.rate_limiter import RateLimiter, throttled_goto
+from scraper.slow_page_tracer import SlowPageTracer
+from scraper.page_parser import ROW_SELECTORS, ROWS_SCRIPT, Row, extract_phones, get_pool, is_header
 from utils.logger import logger
+from utils.metrics import metrics
 
 class PhoneScraper:
-    def __init__(self, page: Page, db: Database):
+    def __init__(self, page: Page, db: Database, rate_limiter: RateLimiter = None,
+                 on_page: Callable[[str, int, int], None] = None,
+                 browser: BrowserManager = None):
+        """
+        Args:
+            on_page: Вызывается после сохранения каждой страницы
+                (account_id, номер страницы, добавлено номеров)
+            browser: Менеджер браузера для плановых перезапусков и
+                восстановления после падений (без него - как раньше)
+        """
         self.page = page
         self.db = db
+        self.rate_limiter = rate_limiter or RateLimiter(db.db_path)
+        self.on_page = on_page
+        self.browser = browser
+        self.page_size = config.PHONES_PER_PAGE
+        self._page_sizes = {}
+        self._page_size_href = None  # Путь и query ссылки updatepagesize, без хоста тенанта
+        self.tracer = SlowPageTracer() if config.SLOW_TRACE else None
+        self.total_rows = None  # Записей в аккаунте по сводке таблицы (_open_account)
+        self.resume_page = None  # Страница продолжения, если размер страницы сменился (_open_account)
     
     def scrape_account(self, account_id: str, token_url: str, start_page: int = 1):
         """Парсинг всех номеров из аккаунта"""
         try:
             logger.info(f"📞 Парсинг аккаунта {account_id}...")
             
-            # Переход по токен-ссылке
-            self.page.goto(token_url)
-            
-            # Ждем загрузки страницы
-            time.sleep(5)
-            
-            # НОВОЕ: Устанавливаем 50 записей на странице
-            self._set_page_size(50)
+            self.resume_page = None
+            recoveries = 0
+            try:
+                self._open_account(account_id, token_url)
+            except Exception as e:
+                recoveries = self._recover(e, account_id, token_url, recoveries)
             
             # Обновляем статус
             self.db.update_account_status(account_id, 'in_progress')
             
-            current_page = start_page
+            current_page = self._resume_from(start_page)
             total_phones = 0
+            pending = deque()  # (страница, разбор в пуле), в порядке страниц
             
             while True:
-                logger.info(f"  📄 Страница {current_page}...")
+                logger.info(f"  📄 Страница {current_page}...", extra={'category': 'page'})
                 
-                # Если не первая страница, переходим на нужную
-                if current_page > 1:
-                    self._go_to_page(current_page)
-                    time.sleep(3)
+                page_started = time.time()
+                if self.tracer:
+                    self.tracer.begin(self.page)
                 
-                # Парсим номера на текущей странице
-                phones = self._parse_phones_on_page()
+                try:
+                    # Если не первая страница, переходим на нужную
+                    if current_page > 1:
+                        self._go_to_page(current_page)
+                        metrics.sleep(3, 'phone_scraper')
+                    
+                    # Забираем текст таблицы, номера из него извлекает пул разбора
+                    with metrics.timer('phone_scraper', 'parse'):
+                        rows = self._grab_rows()
+                        has_next = self._has_next_page()
+                    
+                    # Ошибки внутри парсинга гасятся, поэтому падение
+                    # страницы проверяем явно, до сохранения прогресса
+                    self._ensure_page_alive()
+                except Exception as e:
+                    if self.tracer and not is_target_closed(e):
+                        self.tracer.end(self.page, time.time() - page_started,
+                                        f'{account_id}_p{current_page}', failed=True)
+                    # Уже снятые страницы сохраняем до восстановления браузера
+                    total_phones += self._save_parsed(account_id, pending, wait=True)
+                    recoveries = self._recover(e, account_id, token_url, recoveries)
+                    current_page = self._resume_from(current_page)
+                    continue
                 
-                if phones:
-                    added = self.db.add_phones(account_id, phones)
-                    total_phones += added
-                    logger.info(f"  ✅ Добавлено {added} номеров (всего: {total_phones})")
-                else:
-                    logger.info(f"  ℹ️ Номеров не найдено на странице {current_page}")
+                if self.tracer:
+                    self.tracer.end(self.page, time.time() - page_started,
+                                    f'{account_id}_p{current_page}')
                 
-                # Сохраняем прогресс
-                self.db.update_account_status(account_id, 'in_progress', current_page)
+                # Браузер не ждет разбора: сохраняются страницы, разобранные к этому
+                # моменту (по порядку), последняя - после завершения разбора
+                pending.append((current_page, get_pool().submit(rows)))
+                total_phones += self._save_parsed(account_id, pending, wait=not has_next)
                 
                 # Проверяем наличие следующей страницы
-                if not self._has_next_page():
+                if not has_next:
                     logger.info(f"  📭 Достигнута последняя страница")
                     break
                 
-                # Переход на следующую страницу
+                # Переход на следующую страницу (темп задает rate_limiter)
                 current_page += 1
-                time.sleep(random.uniform(*config.DELAY_BETWEEN_REQUESTS))
+                
+                # Плановый перезапуск браузера против роста памяти
+                reason = self.browser.needs_recycle() if self.browser else None
+                if reason:
+                    logger.info(f"  ♻️ Плановый перезапуск браузера: {reason}")
+                    metrics.inc('crm_browser_restarts_total', reason='recycle')
+                    # Прогресс в БД должен дойти до текущей страницы: после
+                    # перезапуска размер страницы может смениться
+                    total_phones += self._save_parsed(account_id, pending, wait=True)
+                    self.page = self.browser.restart()
+                    self._open_account(account_id, token_url)
+                    current_page = self._resume_from(current_page)
             
             # Завершаем обработку аккаунта
             self.db.update_account_status(account_id, 'completed')
+            metrics.inc('crm_accounts_total', status='completed')
             logger.info(f"✅ Аккаунт {account_id} обработан: {total_phones} номеров")
             
             return total_phones
@@ -71,137 +126,353 @@ class PhoneScraper:
         except Exception as e:
             logger.error(f"❌ Ошибка парсинга аккаунта {account_id}: {e}")
             self.db.update_account_status(account_id, 'failed')
+            metrics.inc('crm_accounts_total', status='failed')
             return 0
     
-    def _set_page_size(self, size: int = 50):
-        """Установить количество записей на странице"""
-        try:
-            logger.info(f"  ⚙️ Устанавливаю {size} записей на странице...")
-            
-            # Ищем кнопку dropdown "Длина страницы"
-            dropdown_selectors = [
-                '//button[contains(., "Длина страницы")]',
-                'button[data-toggle="dropdown"]',
-                '.btn-group button.dropdown-toggle',
-            ]
-            
-            dropdown_button = None
-            for selector in dropdown_selectors:
-                dropdown_button = self.page.query_selector(selector)
-                if dropdown_button:
-                    logger.debug(f"    Найдена кнопка dropdown: {selector}")
-                    break
-            
-            if not dropdown_button:
-                logger.warning(f"  ⚠️ Кнопка dropdown не найдена")
-                return
-            
-            # Кликаем на кнопку чтобы открыть меню
-            dropdown_button.click()
-            time.sleep(0.5)
-            
-            # Ищем ссылку с нужным размером
-            # Вариант 1: По точному href
-            link_selector = f'a[href*="updatepagesize?pageSize={size}"]'
-            size_link = self.page.query_selector(link_selector)
-            
-            # Вариант 2: По тексту
-            if not size_link:
-                size_link = self.page.query_selector(f'ul.dropdown-menu a:has-text("{size}")')
-            
-            # Вариант 3: XPath
-            if not size_link:
-                size_link = self.page.query_selector(f'//ul[contains(@class, "dropdown-menu")]//a[text()="{size}"]')
-            
-            if size_link:
-                # Проверяем что это не активная опция
-                parent_li = self.page.query_selector(f'//a[contains(@href, "pageSize={size}")]/parent::li')
-                
-                if parent_li and 'active' in parent_li.get_attribute('class'):
-                    logger.info(f"  ✅ Уже установлено {size} записей")
-                    # Закрываем меню
-                    self.page.keyboard.press('Escape')
-                    return
-                
-                # Кликаем на ссылку
-                size_link.click()
-                time.sleep(3)  # Ждем перезагрузки страницы
-                logger.info(f"  ✅ Установлено {size} записей")
-            else:
-                logger.warning(f"  ⚠️ Опция {size} не найдена в меню")
-                # Закрываем меню
-                self.page.keyboard.press('Escape')
-            
-        except Exception as e:
-            logger.warning(f"  ⚠️ Не удалось установить размер страницы: {e}")
-    
-    def _parse_phones_on_page(self) -> List[str]:
-        """Парсинг номеров на текущей странице"""
-        phones = []
+    def refresh_account(self, account: Dict) -> Tuple[int, int]:
+        """
+        Дообход завершенного аккаунта: только страницы, где могли появиться номера
+
+        Порядок списка в CRM задает config.PHONE_LIST_ORDER:
+            newest_first - новые записи сверху: обход с первой страницы до
+                страницы, все номера которой уже известны
+            oldest_first - новые записи в конце: обход с последней
+                страницы прошлого обхода
+            unknown - все страницы, но номера пишутся только со страниц,
+                чей отпечаток изменился; если не изменились ни первая
+                страница, ни число записей, аккаунт пропускается сразу
+
+        Статус остается completed. Returns: (новых номеров, загружено страниц)
+        """
+        account_id, token_url = account['account_id'], account['token_url']
+        order = config.PHONE_LIST_ORDER
+        hashes = self.db.get_page_hashes(account_id)
+        added_total = pages = 0
+        self.resume_page = None
         
         try:
-            # Ждем появления таблицы
-            time.sleep(2)
-            
-            selectors = [
-                'table tbody tr',
-                'table tr',
-                'tr[data-key]',
-                '.grid-view tbody tr',
-                'div[role="row"]',
-            ]
+            logger.info(f"🔁 Обновление аккаунта {account_id} (порядок списка: {order})...")
             
-            rows = []
-            for selector in selectors:
-                rows = self.page.query_selector_all(selector)
-                if len(rows) > 0:
-                    logger.debug(f"   ✓ Найдено {len(rows)} строк (селектор: {selector})")
-                    break
+            recoveries = 0
+            try:
+                self._open_account(account_id, token_url)
+            except Exception as e:
+                recoveries = self._recover(e, account_id, token_url, recoveries)
             
-            if len(rows) == 0:
-                logger.warning("   ✗ Таблица не найдена")
-                self.page.screenshot(path='debug_phones_page.png')
-                logger.info("   📸 Скриншот: debug_phones_page.png")
-                return []
+            current_page = max(account['last_page'], 1) if order == 'oldest_first' else 1
+            last_page = account['last_page']
             
-            # Парсим каждую строку
-            for idx, row in enumerate(rows):
+            while True:
+                if self.resume_page:
+                    # Размер страницы сменился (с прошлого обхода или после
+                    # перезапуска браузера): отпечатки сброшены, обход заново
+                    last_page, hashes = self._resume_from(1) - 1, {}
+                    current_page = max(last_page, 1) if order == 'oldest_first' else 1
+                
                 try:
-                    row_text = row.inner_text()
-                    
-                    # Пропускаем заголовки
-                    if 'ТЕЛЕФОН' in row_text or 'ПРОЕКТ' in row_text:
-                        continue
+                    if current_page > 1:
+                        self._go_to_page(current_page)
+                        metrics.sleep(3, 'phone_scraper')
                     
-                    # ВАРИАНТ 1: Regex поиск 11-значных номеров
-                    phone_matches = re.findall(r'\b(7\d{10})\b', row_text)
+                    with metrics.timer('phone_scraper', 'parse'):
+                        phones = self._parse_phones_on_page()
+                        has_next = self._has_next_page()
                     
-                    if phone_matches:
-                        for phone in phone_matches:
-                            if phone not in phones:
-                                phones.append(phone)
-                    else:
-                        # ВАРИАНТ 2: Поиск по ячейкам
-                        phone_cells = row.query_selector_all('td')
-                        
-                        for cell in phone_cells:
-                            cell_text = cell.inner_text().strip()
-                            
-                            if cell_text.isdigit() and len(cell_text) == 11 and cell_text.startswith('7'):
-                                if cell_text not in phones:
-                                    phones.append(cell_text)
-                
+                    self._ensure_page_alive()
                 except Exception as e:
-                    logger.debug(f"   Ошибка парсинга строки {idx}: {e}")
+                    recoveries = self._recover(e, account_id, token_url, recoveries)
                     continue
+                
+                pages += 1
+                last_page = max(last_page, current_page)
+                metrics.inc('crm_pages_total', component='refresh')
+                page_hash = self._page_hash(phones)
+                unchanged = hashes.get(current_page) == page_hash
+                known = len(phones) if unchanged else self.db.count_known_phones(account_id, phones)
+                
+                if not unchanged:
+                    added = self.db.add_phones(account_id, phones) if phones else 0
+                    added_total += added
+                    metrics.inc('crm_phones_added_total', added)
+                    self.db.save_page_hash(account_id, current_page, page_hash)
+                    logger.info(f"  📄 Страница {current_page}: новых номеров {len(phones) - known}, "
+                                f"добавлено {added}", extra={'category': 'page'})
+                
+                if order == 'newest_first' and known == len(phones):
+                    logger.info(f"  ⏹️ Страница {current_page} без новых номеров: дальше только известные")
+                    break
+                if (order == 'unknown' and current_page == 1 and unchanged
+                        and self.total_rows is not None and self.total_rows == account['size_estimate']):
+                    logger.info("  ⏹️ Первая страница и число записей не изменились")
+                    break
+                if not has_next:
+                    break
+                
+                current_page += 1
+                
+                reason = self.browser.needs_recycle() if self.browser else None
+                if reason:
+                    logger.info(f"  ♻️ Плановый перезапуск браузера: {reason}")
+                    metrics.inc('crm_browser_restarts_total', reason='recycle')
+                    self.page = self.browser.restart()
+                    self._open_account(account_id, token_url)
             
-            # Дедупликация
-            phones = list(set(phones))
+            # Статус не меняется, обновляются last_page и updated_at (очередь refresh)
+            self.db.update_account_status(account_id, 'completed', last_page)
+            logger.info(f"✅ Аккаунт {account_id} обновлен: {added_total} новых номеров, страниц: {pages}")
             
         except Exception as e:
+            # Номера аккаунта уже собраны: ошибка обновления не переводит его в failed
+            logger.error(f"❌ Ошибка обновления аккаунта {account_id}: {e}")
+        
+        return added_total, pages
+    
+    def _save_parsed(self, account_id: str, pending: deque, wait: bool = False) -> int:
+        """
+        Сохранить разобранные страницы из очереди в порядке страниц
+
+        Сохраняются страницы от начала очереди, чей разбор уже закончен;
+        если в очереди больше PARSE_AHEAD страниц или wait - ждем разбора.
+        Прогресс аккаунта (last_page) поэтому не обгоняет сохраненные номера.
+        """
+        added = 0
+        while pending and (wait or len(pending) > config.PARSE_AHEAD or pending[0][1].done()):
+            page_num, future = pending.popleft()
+            with metrics.timer('phone_scraper', 'parse_wait'):
+                phones = future.result()
+            added += self._save_page(account_id, page_num, phones)
+        return added
+
+    def _save_page(self, account_id: str, page_num: int, phones: List[str]) -> int:
+        """Сохранить страницу и сообщить о ней (on_page)"""
+        # Номера, отпечаток страницы для --mode refresh и прогресс
+        added = self.db.save_page(account_id, page_num, phones, self._page_hash(phones))
+        if phones:
+            metrics.inc('crm_phones_added_total', added)
+            logger.info(f"  ✅ Страница {page_num}: добавлено {added} номеров",
+                        extra={'category': 'page'})
+        else:
+            logger.info(f"  ℹ️ Номеров не найдено на странице {page_num}", extra={'category': 'page'})
+        metrics.inc('crm_pages_total', component='phone_scraper')
+        if self.on_page:
+            self.on_page(account_id, page_num, added)
+        return added
+
+    @staticmethod
+    def _page_hash(phones: List[str]) -> int:
+        """Отпечаток набора номеров страницы (64 бита, не зависит от порядка строк)"""
+        digest = hashlib.blake2b('\n'.join(sorted(phones)).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big', signed=True)
+    
+    def _open_account(self, account_id: str, token_url: str):
+        """Войти в аккаунт по токен-ссылке и настроить таблицу"""
+        # При записи/воспроизведении HAR у каждого аккаунта свой контекст
+        page = self.browser.use_account(account_id) if self.browser else None
+        if page:
+            self.page = page
+        
+        # Переход по токен-ссылке
+        throttled_goto(self.page, self.rate_limiter, token_url)
+        
+        # Ждем загрузки страницы
+        metrics.sleep(5, 'phone_scraper')
+        
+        # Устанавливаем максимальный размер страницы
+        with metrics.timer('phone_scraper', 'page_size'):
+            self.page_size = self._set_page_size(token_url)
+        
+        # Прогресс аккаунта записан в страницах прежнего размера - пересчитываем
+        last_page = self.db.set_account_page_size(account_id, self.page_size)
+        if last_page is not None:
+            logger.info(f"  📐 Размер страницы теперь {self.page_size}: продолжаю со страницы {last_page + 1}")
+            self.resume_page = last_page + 1
+        
+        # Оценка размера аккаунта для планировщика (longest_first)
+        total_rows = self.total_rows = self._read_total_rows()
+        if total_rows:
+            self.db.update_account_size(account_id, total_rows)
+    
+    def _resume_from(self, page_num: int) -> int:
+        """Страница продолжения после _open_account: пересчитанная при смене размера, иначе page_num"""
+        page, self.resume_page = self.resume_page, None
+        return page or page_num
+    
+    def _ensure_page_alive(self):
+        if self.page.is_closed() or (self.browser and self.browser.crashed):
+            raise BrowserCrashed("Страница браузера упала")
+    
+    def _recover(self, error: Exception, account_id: str, token_url: str,
+                 recoveries: int) -> int:
+        """
+        Перезапустить браузер после падения и вернуться в аккаунт
+
+        Аккаунт остается in_progress за тем же воркером, поэтому аренда
+        не теряется. Прочие ошибки и исчерпание попыток пробрасываются.
+        """
+        if (not self.browser or not is_target_closed(error)
+                or recoveries >= config.BROWSER_CRASH_RETRIES):
+            raise error
+        
+        logger.warning(
+            f"  💥 Браузер упал ({error}), перезапуск {recoveries + 1}/{config.BROWSER_CRASH_RETRIES}...")
+        metrics.inc('crm_browser_restarts_total', reason='crash')
+        self.page = self.browser.restart()
+        self._open_account(account_id, token_url)
+        return recoveries + 1
+    
+    def _set_page_size(self, token_url: str) -> int:
+        """
+        Установить максимальный размер страницы, который принимает CRM
+
+        Подобранный размер кэшируется по тенанту (в памяти и в БД),
+        поэтому перебор вариантов выполняется только один раз.
+        """
+        tenant = urlsplit(token_url).netloc
+        cached = self._page_sizes.get(tenant) or self.db.get_tenant_page_size(tenant)
+
+        try:
+            if cached:
+                if self._apply_page_size(cached) is not False:
+                    self._page_sizes[tenant] = cached
+                    return cached
+                logger.warning(
+                    f"  ⚠️ Размер {cached} больше не принимается, подбираю заново...")
+
+            options = self._page_size_options()
+            if not options:
+                logger.warning("  ⚠️ Ссылки выбора размера страницы не найдены")
+                return config.PHONES_PER_PAGE
+
+            candidates = sorted(
+                set(options) | {s for s in config.PHONE_PAGE_SIZE_PROBES if s > max(options)},
+                reverse=True)
+
+            for size in candidates:
+                accepted = self._apply_page_size(size)
+                if accepted is False:
+                    logger.debug(f"    Размер {size} не принят")
+                    continue
+
+                if accepted:
+                    # Кэшируем только подтвержденный размер: если все записи
+                    # поместились на странице, проверить лимит CRM нельзя
+                    self._page_sizes[tenant] = size
+                    self.db.set_tenant_page_size(tenant, size)
+                logger.info(f"  ✅ Установлено {size} записей на странице")
+                return size
+
+        except Exception as e:
+            logger.warning(f"  ⚠️ Не удалось установить размер страницы: {e}")
+
+        return config.PHONES_PER_PAGE
+
+    def _page_size_options(self) -> List[int]:
+        """Прочитать варианты размера страницы из dropdown «Длина страницы»"""
+        links = self.page.query_selector_all('a[href*="updatepagesize?pageSize="]')
+
+        if not links:
+            # Меню может рендериться только после открытия dropdown
+            for selector in ['//button[contains(., "Длина страницы")]',
+                             'button[data-toggle="dropdown"]',
+                             '.btn-group button.dropdown-toggle']:
+                dropdown_button = self.page.query_selector(selector)
+                if dropdown_button:
+                    dropdown_button.click()
+                    metrics.sleep(0.5, 'phone_scraper')
+                    links = self.page.query_selector_all(
+                        'a[href*="updatepagesize?pageSize="]')
+                    self.page.keyboard.press('Escape')
+                    break
+
+        options = []
+        for link in links:
+            href = link.get_attribute('href') or ''
+            # Хост не запоминаем: следующий аккаунт может быть на другом тенанте
+            self._page_size_href = urlunsplit(
+                urlsplit(urljoin(self.page.url, href))._replace(scheme='', netloc=''))
+            value = parse_qs(urlsplit(href).query).get('pageSize', [''])[0]
+            if value.isdigit():
+                options.append(int(value))
+
+        return options
+
+    def _apply_page_size(self, size: int) -> Optional[bool]:
+        """
+        Перейти по updatepagesize и проверить фактическое число строк
+
+        Returns:
+            True - размер подтвержден, None - все записи поместились
+            (лимит не проверить), False - CRM урезала размер
+        """
+        if not self._page_size_href:
+            self._page_size_options()
+        if not self._page_size_href:
+            return False
+
+        list_url = self.page.url
+        parts = urlsplit(urljoin(list_url, self._page_size_href))
+        query = parse_qs(parts.query)
+        query['pageSize'] = [str(size)]
+        throttled_goto(self.page, self.rate_limiter,
+                       urlunsplit(parts._replace(query=urlencode(query, doseq=True))))
+
+        # Если CRM не вернула нас к списку после смены размера
+        if urlsplit(self.page.url)[1:3] != urlsplit(list_url)[1:3]:
+            throttled_goto(self.page, self.rate_limiter, list_url)
+        metrics.sleep(3, 'phone_scraper')
+
+        rows = self._count_data_rows()
+        if rows >= size:
+            return True
+        if not self._has_next_page():
+            return None
+        return False
+
+    def _parse_phones_on_page(self) -> List[str]:
+        """Парсинг номеров на текущей странице (в потоке браузера)"""
+        return extract_phones(self._grab_rows())
+    
+    def _grab_rows(self) -> List[Row]:
+        """Текст строк таблицы телефонов и их ячеек - один запрос к браузеру"""
+        try:
+            # Загрузку таблицы ждут вызывающие (_open_account, _go_to_page)
+            rows = self.page.evaluate(ROWS_SCRIPT, list(ROW_SELECTORS))
+        except Exception as e:
+            # Падение страницы проверяют вызывающие (_ensure_page_alive)
             logger.error(f"Ошибка парсинга номеров: {e}")
+            return []
+        
+        if len(rows) == 0:
+            logger.warning("   ✗ Таблица не найдена")
+            self.page.screenshot(path='debug_phones_page.png')
+            logger.info("   📸 Скриншот: debug_phones_page.png")
+        return rows
+    
+    def _count_data_rows(self) -> int:
+        """Количество строк с данными (без заголовков) - один запрос к браузеру"""
+        rows = self.page.evaluate(ROWS_SCRIPT, list(ROW_SELECTORS))
+        return sum(1 for row_text, _ in rows if not is_header(row_text))
+    
+    def _read_total_rows(self) -> Optional[int]:
+        """Общее число записей из сводки/пагинации таблицы"""
+        try:
+            # Yii2 GridView: "Показаны записи 1-50 из 1 234."
+            summary = self.page.query_selector('.summary')
+            if summary:
+                match = re.search(r'(?:из|of)\s+(\d[\d \u00a0]*)', summary.inner_text())
+                if match:
+                    return int(re.sub(r'\D', '', match.group(1)))
+            
+            # Иначе по номеру последней страницы (data-page с нуля)
+            pages = [int(link.get_attribute('data-page'))
+                     for link in self.page.query_selector_all('.pagination a[data-page]')
+                     if (link.get_attribute('data-page') or '').isdigit()]
+            if pages:
+                return (max(pages) + 1) * self.page_size
+        except Exception as e:
+            logger.debug(f"   Не удалось определить размер аккаунта: {e}")
         
-        return phones
+        return None
     
     def _has_next_page(self) -> bool:
         """Проверка наличия следующей страницы"""
@@ -239,8 +510,8 @@ class PhoneScraper:
             else:
                 new_url = f"{current_url}?page={page_num}"
             
-            self.page.goto(new_url)
-            time.sleep(3)
+            throttled_goto(self.page, self.rate_limiter, new_url)
+            metrics.sleep(3, 'phone_scraper')
             
         except Exception as e:
             logger.error(f"Ошибка перехода на страницу {page_num}: {e}")
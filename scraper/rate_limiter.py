@@ -0,0 +1,184 @@
+import time
+import sqlite3
+from collections import deque
+from pathlib import Path
+from typing import Optional
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeout
+import config
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+def bucket_path(db_path: str) -> str:
+    """Файл token bucket рядом с БД номеров: data/phones.db -> data/phones.ratelimit.db"""
+    return str(Path(db_path).with_suffix('.ratelimit.db'))
+
+
+class RateLimiter:
+    """
+    Глобальный token bucket, общий для всех процессов через SQLite
+
+    Бюджет запросов/сек подстраивается по AIMD: аддитивно растет,
+    пока CRM отвечает быстро, и мультипликативно падает при 429/5xx,
+    таймаутах и медленных ответах.
+
+    Bucket лежит в отдельном маленьком файле (bucket_path), а не в БД
+    номеров: две записи на каждую навигацию не занимают блокировку
+    записи, которую ждут сохранения страниц.
+    """
+
+    def __init__(self, db_path: str = config.DB_PATH):
+        self.db_path = bucket_path(db_path)
+        # Задержки успешных ответов для порога медленного ответа (см. report)
+        self.latencies = deque(maxlen=config.RATE_LIMIT_LATENCY_WINDOW)
+        with self._connect() as conn:
+            # WAL: чтение текущего темпа не ждет взявших токен
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limiter (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    rate REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_decrease REAL NOT NULL DEFAULT 0
+                )
+            ''')
+            # Выученный ранее темп сохраняется между запусками
+            conn.execute('''
+                INSERT OR IGNORE INTO rate_limiter (id, rate, tokens, updated_at)
+                VALUES (1, ?, 1, ?)
+            ''', (config.RATE_LIMIT_INITIAL, time.time()))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # Состояние bucket не ценно: после сбоя темп просто подстроится заново
+        conn.execute('PRAGMA synchronous = OFF')
+        return conn
+
+    def acquire(self) -> float:
+        """Дождаться токена на запрос. Возвращает время ожидания"""
+        started = time.time()
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                waited = time.time() - started
+                metrics.observe('crm_stage_seconds', waited, component='rate_limiter', stage='wait')
+                return waited
+            time.sleep(min(wait, 1.0))
+
+    def _try_take(self) -> float:
+        """Атомарно взять токен или вернуть, сколько ждать до следующего"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rate, tokens, updated_at = conn.execute(
+                'SELECT rate, tokens, updated_at FROM rate_limiter WHERE id = 1'
+            ).fetchone()
+
+            now = time.time()
+            tokens = min(config.RATE_LIMIT_BURST,
+                         tokens + max(0.0, now - updated_at) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+
+            conn.execute('''
+                UPDATE rate_limiter SET tokens = ?, updated_at = ? WHERE id = 1
+            ''', (tokens, now))
+            return wait
+
+    def slow_threshold(self) -> Optional[float]:
+        """
+        Порог медленного ответа, сек: RATE_LIMIT_SLOW_FACTOR x перцентиль
+        RATE_LIMIT_LATENCY_PERCENTILE недавних задержек, не меньше
+        RATE_LIMIT_TARGET_LATENCY. Пока задержек мало - None (судим только
+        по таймаутам и статусам): обычное время страниц CRM заранее
+        неизвестно, страница аккаунтов грузится и по 2 минуты.
+        """
+        if len(self.latencies) < config.RATE_LIMIT_LATENCY_MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        typical = latencies[(len(latencies) - 1) * config.RATE_LIMIT_LATENCY_PERCENTILE // 100]
+        return max(config.RATE_LIMIT_TARGET_LATENCY, config.RATE_LIMIT_SLOW_FACTOR * typical)
+
+    def report(self, latency: float, status: Optional[int] = None, timeout: bool = False):
+        """Учесть результат запроса и подстроить темп (AIMD)"""
+        threshold = self.slow_threshold()
+        overloaded = (
+            timeout
+            or status == 429
+            or (status is not None and status >= 500)
+            or (threshold is not None and latency > threshold)
+        )
+        if not timeout:
+            self.latencies.append(latency)
+
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            rate, last_decrease = conn.execute(
+                'SELECT rate, last_decrease FROM rate_limiter WHERE id = 1'
+            ).fetchone()
+            now = time.time()
+
+            if overloaded:
+                # Несколько воркеров видят один и тот же всплеск ошибок,
+                # поэтому снижаем не чаще раза за COOLDOWN
+                if now - last_decrease < config.RATE_LIMIT_COOLDOWN:
+                    return
+                new_rate = max(config.RATE_LIMIT_MIN, rate * config.RATE_LIMIT_DECREASE)
+                conn.execute('''
+                    UPDATE rate_limiter SET rate = ?, tokens = 0, last_decrease = ?
+                    WHERE id = 1
+                ''', (new_rate, now))
+                logger.warning(
+                    f"🐢 Снижение темпа: {rate:.2f} → {new_rate:.2f} запр/сек "
+                    f"(status={status}, timeout={timeout}, {latency:.1f}сек)")
+            else:
+                # Прирост ~RATE_LIMIT_INCREASE запр/сек за секунду успешной работы
+                new_rate = min(config.RATE_LIMIT_MAX,
+                               rate + config.RATE_LIMIT_INCREASE / rate)
+                conn.execute('UPDATE rate_limiter SET rate = ? WHERE id = 1', (new_rate,))
+
+    def current_rate(self) -> float:
+        """Текущий глобальный бюджет, запросов/сек"""
+        with self._connect() as conn:
+            return conn.execute('SELECT rate FROM rate_limiter WHERE id = 1').fetchone()[0]
+
+
+def throttled_goto(page: Page, limiter: RateLimiter, url: str, **kwargs):
+    """
+    page.goto через общий лимитер с обратной связью по статусу и задержке
+
+    Единственный уровень повторов навигации: таймауты и 429/5xx
+    повторяются до RETRY_ATTEMPTS раз (пауза - через лимитер, который
+    после них снижает темп); таймаут последней попытки пробрасывается
+    наружу, вызывающие его не повторяют.
+    """
+    for attempt in range(1, config.RETRY_ATTEMPTS + 1):
+        limiter.acquire()
+        started = time.time()
+
+        try:
+            with metrics.timer('http', 'navigation'):
+                response = page.goto(url, **kwargs)
+        except PlaywrightTimeout:
+            limiter.report(time.time() - started, timeout=True)
+            metrics.inc('crm_http_responses_total', code='timeout')
+            if attempt == config.RETRY_ATTEMPTS:
+                raise
+            logger.warning(f"  ⚠️ Таймаут загрузки (попытка {attempt}/{config.RETRY_ATTEMPTS}), повтор...")
+            continue
+
+        status = response.status if response else None
+        limiter.report(time.time() - started, status)
+        metrics.inc('crm_http_responses_total', code=str(status))
+
+        if status == 429 or (status is not None and status >= 500):
+            logger.warning(f"  ⚠️ Ответ {status} (попытка {attempt}/{config.RETRY_ATTEMPTS}), повтор...")
+            continue
+
+        return response
+
+    return response
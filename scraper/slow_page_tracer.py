@@ -0,0 +1,113 @@
+import json
+import time
+from pathlib import Path
+from collections import deque
+from typing import Optional
+from playwright.sync_api import Page
+import config
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+class SlowPageTracer:
+    """
+    Трасса Playwright только для медленных страниц
+
+    Трассировка контекста идет постоянно, но в дешевом режиме (без
+    скриншотов и, по умолчанию, без DOM-снимков) и кусками: на каждую
+    страницу свой chunk. Если страница обработана быстрее скользящего
+    перцентиля SLOW_TRACE_PERCENTILE, chunk выбрасывается. Иначе
+    сохраняются трасса, HTML страницы и сетевые тайминги
+    (Performance API). Хранится не больше SLOW_TRACE_MAX_FILES трасс.
+
+    Ошибки трассировки не мешают парсингу: они только пишутся в debug.
+    """
+
+    def __init__(self, out_dir: str = config.SLOW_TRACE_DIR):
+        self.out_dir = Path(out_dir)
+        self.latencies = deque(maxlen=config.SLOW_TRACE_WINDOW)
+        self.context = None
+        self.chunk_open = False
+
+    def threshold(self) -> Optional[float]:
+        """Текущий порог, сек (None - пока мало замеров)"""
+        if len(self.latencies) < config.SLOW_TRACE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(config.SLOW_TRACE_PERCENTILE / 100 * len(ordered)))
+        return max(ordered[index], config.SLOW_TRACE_MIN_SEC)
+
+    def begin(self, page: Page):
+        """Начать chunk для страницы (после перезапуска браузера - новая трассировка)"""
+        try:
+            if page.context is not self.context:
+                self.context = page.context
+                self.chunk_open = False
+                self.context.tracing.start(
+                    screenshots=False, snapshots=config.SLOW_TRACE_SNAPSHOTS, sources=False)
+            if self.chunk_open:
+                self.context.tracing.stop_chunk()
+            self.context.tracing.start_chunk()
+            self.chunk_open = True
+        except Exception as e:
+            logger.debug(f"   Трассировка недоступна: {e}")
+            self.chunk_open = False
+
+    def end(self, page: Page, latency: float, label: str, failed: bool = False) -> Optional[Path]:
+        """
+        Закрыть chunk страницы: сохранить, если страница медленная или упала
+
+        Returns:
+            Путь к сохраненной трассе или None
+        """
+        threshold = self.threshold()
+        if not failed:
+            self.latencies.append(latency)
+        if not self.chunk_open:
+            return None
+        self.chunk_open = False
+
+        slow = threshold is not None and latency > threshold
+        try:
+            if not (slow or failed):
+                self.context.tracing.stop_chunk()
+                return None
+
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            reason = 'error' if failed else 'slow'
+            base = self.out_dir / f"{time.strftime('%Y%m%d_%H%M%S')}_{label}_{reason}_{latency:.0f}s"
+            self.context.tracing.stop_chunk(path=f'{base}.zip')
+            self._save_page(page, base)
+        except Exception as e:
+            logger.debug(f"   Не удалось сохранить трассу: {e}")
+            return None
+
+        metrics.inc('crm_slow_traces_total', reason=reason)
+        if failed:
+            logger.warning(f"  🐌 Ошибка на странице {label} ({latency:.1f} сек), трасса: {base}.zip")
+        else:
+            logger.warning(f"  🐌 Страница {label}: {latency:.1f} сек (порог {threshold:.1f} сек), "
+                           f"трасса: {base}.zip")
+        self._prune()
+        return Path(f'{base}.zip')
+
+    def _save_page(self, page: Page, base: Path):
+        """HTML страницы и тайминги навигации/ресурсов"""
+        if page.is_closed():
+            return
+        with open(f'{base}.html', 'w', encoding='utf-8') as f:
+            f.write(page.content())
+        timings = page.evaluate('''() => ({
+            url: location.href,
+            navigation: performance.getEntriesByType('navigation').map(e => e.toJSON()),
+            resources: performance.getEntriesByType('resource').map(e => e.toJSON()),
+        })''')
+        with open(f'{base}.json', 'w', encoding='utf-8') as f:
+            json.dump(timings, f, ensure_ascii=False, indent=2)
+
+    def _prune(self):
+        """Оставить только SLOW_TRACE_MAX_FILES последних трасс (с их HTML и JSON)"""
+        traces = sorted(self.out_dir.glob('*.zip'), key=lambda p: p.stat().st_mtime)
+        for trace in traces[:max(0, len(traces) - config.SLOW_TRACE_MAX_FILES)]:
+            for suffix in ('.zip', '.html', '.json'):
+                trace.with_suffix(suffix).unlink(missing_ok=True)
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import psutil
+import pytest
+
+import config
+import scraper.autoscaler as autoscaler
+from scraper.autoscaler import Autoscaler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(autoscaler, 'time', SimpleNamespace(time=lambda: now[0]))
+    monkeypatch.setattr(psutil, 'cpu_percent', lambda interval=None: 10.0)
+    monkeypatch.setattr(psutil, 'virtual_memory', lambda: SimpleNamespace(available=64 * 2 ** 30))
+    return now
+
+
+def window(scaler, clock, active, pages):
+    """Окно AUTOSCALE_INTERVAL с заданным числом страниц"""
+    clock[0] += config.AUTOSCALE_INTERVAL
+    for _ in range(pages):
+        scaler.record_page()
+    return scaler.decide(active, available=100)
+
+
+def test_no_scale_up_right_after_scale_down(clock):
+    scaler = Autoscaler(1, 8)
+    assert window(scaler, clock, 2, 100) == 3
+    # Третий воркер не дал прироста - откат
+    assert window(scaler, clock, 3, 100) == 2
+
+    ticks = config.AUTOSCALE_UP_COOLDOWN // config.AUTOSCALE_INTERVAL
+    assert [window(scaler, clock, 2, 100) for _ in range(ticks - 1)] == [2] * (ticks - 1)
+    assert window(scaler, clock, 2, 100) == 3
+
+
+def test_scale_down_is_not_delayed(clock, monkeypatch):
+    scaler = Autoscaler(1, 8)
+    assert window(scaler, clock, 2, 100) == 3
+    monkeypatch.setattr(psutil, 'cpu_percent', lambda interval=None: 99.0)
+    assert window(scaler, clock, 3, 200) == 2
+    assert window(scaler, clock, 2, 200) == 1
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import pytest
+
+from scraper.browser import BrowserManager
+
+
+class FakePage:
+    def set_default_timeout(self, timeout):
+        pass
+
+    set_default_navigation_timeout = set_default_timeout
+
+    def on(self, event, handler):
+        pass
+
+
+class FakeContext:
+    def __init__(self, options):
+        self.options = options
+        self.hars = []
+        self.closed = False
+
+    def set_default_timeout(self, timeout):
+        pass
+
+    set_default_navigation_timeout = set_default_timeout
+
+    def route(self, pattern, handler):
+        pass
+
+    def route_from_har(self, path, not_found=None):
+        self.hars.append(Path(path).name)
+
+    def new_page(self):
+        return FakePage()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def new_context(self, **options):
+        self.contexts.append(FakeContext(options))
+        return self.contexts[-1]
+
+    def is_connected(self):
+        return True
+
+
+def manager(har_mode, har_dir):
+    browser = BrowserManager(har_mode=har_mode, har_dir=str(har_dir))
+    browser.browser = FakeBrowser()
+    browser._new_context()
+    return browser
+
+
+def test_replay_routes_only_the_accounts_hars(tmp_path):
+    for name in ('session_1.har', '1001_1.har', '1001_2.har', '1002_1.har'):
+        (tmp_path / name).write_text('{}')
+    browser = manager('replay', tmp_path)
+    assert len(browser.context.hars) == 4
+
+    assert browser.use_account('1001') is not None
+    assert browser.context.hars == ['1001_1.har', '1001_2.har']
+    assert browser.use_account('1001') is None
+
+    assert browser.use_account('1002') is not None
+    assert browser.context.hars == ['1002_1.har']
+    assert all(context.closed for context in browser.browser.contexts[:-1])
+
+    with pytest.raises(FileNotFoundError):
+        browser.use_account('1003')
+
+
+def test_record_writes_a_har_per_account(tmp_path):
+    browser = manager('record', tmp_path)
+    browser.use_account('1001')
+    browser.use_account('1002')
+    names = [Path(context.options['record_har_path']).name for context in browser.browser.contexts]
+    assert [name.split('_', 1)[0] for name in names] == ['session', '1001', '1002']
+
+
+def test_without_har_the_page_is_kept(tmp_path):
+    browser = BrowserManager(har_mode=None, har_dir=str(tmp_path))
+    assert browser.use_account('1001') is None
@@ -0,0 +1,70 @@
+import http.client
+
+import pytest
+
+import config
+from database.db import Database
+from scraper.coordinator import Coordinator, CoordinatorClient, RemoteDatabase, DB_METHODS, TOKEN_HEADER
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Без снимка известных номеров: prepare() не собирает индекс в data/
+    monkeypatch.setattr(config, 'KNOWN_PHONES_MAX_MB', 0)
+    db = Database(str(tmp_path / 'phones.db'))
+    db.add_account('1001', 'user1', 'https://a.crm.local/signin?token=1')
+    return db
+
+
+@pytest.fixture
+def coordinator(db, monkeypatch):
+    monkeypatch.setattr(config, 'COORDINATOR_TOKEN', 'secret')
+    coordinator = Coordinator('127.0.0.1', 0, db).start()
+    yield coordinator
+    coordinator.stop()
+
+
+def post(coordinator, body, headers):
+    host, port = coordinator.address.split(':')
+    connection = http.client.HTTPConnection(host, int(port), timeout=5)
+    try:
+        connection.request('POST', '/rpc', body, headers)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_db_methods_exist_and_exclude_token_urls():
+    assert all(callable(getattr(Database, name, None)) for name in DB_METHODS)
+    assert 'get_account' not in DB_METHODS
+
+
+def test_network_address_requires_token(db, monkeypatch):
+    monkeypatch.setattr(config, 'COORDINATOR_TOKEN', '')
+    with pytest.raises(ValueError):
+        Coordinator('0.0.0.0', 0, db)
+
+
+def test_token_is_checked(coordinator):
+    client = CoordinatorClient(coordinator.address)
+    try:
+        assert client.call('get_pending_count') == 1
+    finally:
+        client.close()
+    body = b'{"method": "get_pending_count"}'
+    assert post(coordinator, body, {TOKEN_HEADER: 'secret'}) == 200
+    assert post(coordinator, body, {TOKEN_HEADER: 'wrong'}) == 403
+    assert post(coordinator, body, {}) == 403
+
+
+def test_unknown_method_and_bad_json(coordinator):
+    headers = {TOKEN_HEADER: 'secret'}
+    assert post(coordinator, b'{"method": "get_account", "args": ["1001"]}', headers) == 404
+    assert post(coordinator, b'{not json', headers) == 400
+    assert post(coordinator, b'[]', headers) == 400
+
+    remote = RemoteDatabase(CoordinatorClient(coordinator.address))
+    with pytest.raises(AttributeError):
+        remote.get_account('1001')
+    assert remote.acquire_account_for_processing('node-a-1')['account_id'] == '1001'
+    remote.client.close()
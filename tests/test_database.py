@@ -0,0 +1,52 @@
+import sqlite3
+import pytest
+import config
+from database.db import Database
+
+
+# account_id не совпадает с accounts.id: запросы по page_hashes должны переводить одно в другое
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'phones.db'))
+    db.add_account('1001', 'user1', 'https://a.crm.local/signin?token=1')
+    return db
+
+
+def test_page_size_change_converts_progress_and_drops_hashes(db):
+    db.save_page_hash('1001', 1, 42)
+    db.update_account_status('1001', 'in_progress', 7)
+    assert db.set_account_page_size('1001', config.PHONES_PER_PAGE) is None
+    assert db.get_page_hashes('1001') == {1: 42}
+
+    # 7 страниц по 50 = 350 строк -> 1 полная страница по 200
+    assert db.set_account_page_size('1001', 200) == 1
+    assert db.get_page_hashes('1001') == {}
+    assert db.get_account('1001')['last_page'] == 1
+    assert db.set_account_page_size('1001', 200) is None
+
+
+def test_page_size_change_keeps_other_accounts_hashes(db):
+    db.add_account('1002', 'user2', 'https://a.crm.local/signin?token=2')
+    db.save_page_hash('1001', 1, 42)
+    db.save_page_hash('1002', 1, 43)
+    db.set_account_page_size('1001', 200)
+    assert db.get_page_hashes('1002') == {1: 43}
+
+
+def test_attributions_in_batches_do_not_block_writers(db):
+    db.add_account('1002', 'user2', 'https://a.crm.local/signin?token=2')
+    db.add_phones('1001', ['79001234567', '79001234568', '79001234569'])
+    db.add_phones('1002', ['79001234567', '79001234570'])
+
+    batches = db.iter_attributions(batch_size=2)
+    rows = next(batches)
+    # Между пачками чтение закрыто: запись проходит без ожидания блокировки
+    with sqlite3.connect(db.db_path, timeout=0) as conn:
+        conn.execute('INSERT INTO phone_accounts (phone, account) VALUES (79001234571, 1)')
+    for batch in batches:
+        assert len(batch) <= 2
+        rows += batch
+
+    assert rows == sorted(rows)
+    assert len(rows) == 6
+    assert rows[:2] == [(79001234567, 1), (79001234567, 2)]
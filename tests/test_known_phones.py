@@ -0,0 +1,42 @@
+import numpy as np
+
+import config
+from utils.known_phones import KnownPhones
+
+
+def snapshot(max_rows=None):
+    # Порядок первичного ключа phone_accounts: номер, внутри - аккаунт
+    phones = np.array([79000000001, 79000000001, 79000000002, 79000000003, 79000000003], dtype=np.int64)
+    accounts = np.array([1, 2, 1, 2, 3], dtype=np.int32)
+    return KnownPhones(phones, accounts, max_rows)
+
+
+def test_classify_pairs_and_phones():
+    known = snapshot()
+    pair_known, phone_known = known.classify([79000000001, 79000000002, 79000000009, None], account=2)
+    assert pair_known == [True, False, False, False]
+    assert phone_known == [True, True, False, False]
+
+
+def test_truncated_snapshot_cuts_on_phone_boundary():
+    # Лимит попадает внутрь привязок 79000000003: номер целиком уходит за границу
+    known = snapshot(max_rows=4)
+    assert known.limit == 79000000003
+    assert len(known.phones) == 3
+    pair_known, phone_known = known.classify([79000000002, 79000000003], account=2)
+    assert pair_known == [False, False]
+    assert phone_known == [True, False]
+
+
+def test_remembered_numbers_are_known_until_delta_overflows(monkeypatch):
+    known = snapshot()
+    known.remember([79000000009], [79000000009, 79000000002], account=2)
+    pair_known, phone_known = known.classify([79000000009, 79000000002], account=2)
+    assert pair_known == [True, True]
+    assert phone_known == [True, True]
+
+    monkeypatch.setattr(config, 'KNOWN_PHONES_DELTA_MAX', 2)
+    known.remember([79000000010], [79000000010], account=2)
+    pair_known, phone_known = known.classify([79000000009, 79000000010], account=2)
+    assert pair_known == [False, True]
+    assert phone_known == [False, True]
@@ -0,0 +1,57 @@
+import io
+import json
+import sys
+import pickle
+import queue
+import logging
+from logging.handlers import QueueListener
+from utils.logger import JsonFormatter, RecordQueueHandler, WorkerFilter
+
+
+def log_through_queue(formatter: logging.Formatter) -> str:
+    log_queue = queue.SimpleQueue()
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+
+    logger = logging.getLogger('tests.logger_queue')
+    logger.propagate = False
+    logger.addFilter(WorkerFilter())
+    logger.addHandler(RecordQueueHandler(log_queue))
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception('Ошибка аккаунта %s', 42)
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+        logger.filters.clear()
+    return stream.getvalue()
+
+
+def test_json_exception_field():
+    entry = json.loads(log_through_queue(JsonFormatter()))
+    assert entry['message'] == 'Ошибка аккаунта 42'
+    assert 'ZeroDivisionError' in entry['exception']
+
+
+def test_text_formatter_keeps_traceback():
+    text = log_through_queue(logging.Formatter('%(message)s'))
+    assert text.startswith('Ошибка аккаунта 42\nTraceback')
+
+
+def test_prepared_record_pickles():
+    handler = RecordQueueHandler(queue.SimpleQueue())
+    try:
+        raise ValueError('плохо')
+    except ValueError:
+        record = logging.getLogger('tests').makeRecord('tests', logging.ERROR, __file__, 1, 'x=%s', (1,),
+                                                       sys.exc_info())
+    record = pickle.loads(pickle.dumps(handler.prepare(record)))
+    record.worker = 'worker-1'
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'x=1'
+    assert 'ValueError: плохо' in entry['exception']
@@ -0,0 +1,30 @@
+from scraper.page_parser import extract_phones
+
+HEADER = ('ТЕЛЕФОН\tИНН\tПРОЕКТ', ['ТЕЛЕФОН', 'ИНН', 'ПРОЕКТ'])
+
+
+def row(*cells):
+    return '\t'.join(cells), list(cells)
+
+
+def test_prefixed_numbers_in_any_cell():
+    rows = [HEADER, row('', '+7 (900) 123-45-67', 'Проект'), row('', 'Проект', '8 912 000 11 22')]
+    assert extract_phones(rows) == ['79001234567', '79120001122']
+
+
+def test_prefixless_number_from_phone_column():
+    assert extract_phones([HEADER, row('900-123-45-67', '', 'Проект')]) == ['79001234567']
+
+
+def test_inn_in_other_column_is_not_a_phone():
+    assert extract_phones([HEADER, row('', '7701234567', 'Проект')]) == []
+    assert extract_phones([HEADER, row('79001234567', '7701234567', 'Заказ 9123456789')]) == ['79001234567']
+
+
+def test_prefixless_number_without_header_is_ignored():
+    assert extract_phones([row('7701234567', 'Проект')]) == []
+
+
+def test_phone_column_from_text_rows():
+    rows = [('№\tТЕЛЕФОН\tИНН', []), ('1\t9001234567\t7701234567', [])]
+    assert extract_phones(rows) == ['79001234567']
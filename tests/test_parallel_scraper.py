@@ -0,0 +1,35 @@
+import os
+import socket
+import subprocess
+import sys
+
+from database.db import Database
+from scraper.parallel_scraper import ParallelScraper
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def test_release_only_leases_of_finished_local_workers(tmp_path):
+    db = Database(str(tmp_path / 'phones.db'))
+    owners = {
+        'worker-1': (socket.gethostname(), dead_pid()),  # прошлый запуск, убит
+        'worker-2': (socket.gethostname(), os.getpid()),  # идущий запуск
+        'worker-3': ('other-host', dead_pid()),  # процесс другого хоста не проверить
+        'worker-4': None,  # пульса нет
+        'node-a-1': (socket.gethostname(), dead_pid()),  # воркер координатора
+    }
+    for number, (owner, beat) in enumerate(owners.items(), 1001):
+        db.add_account(str(number), owner, f'https://a.crm.local/signin?token={number}')
+        assert db.acquire_account_for_processing(owner)['account_id'] == str(number)
+        if beat:
+            db.save_heartbeat(owner, {'host': beat[0], 'pid': beat[1]})
+
+    scraper = ParallelScraper.__new__(ParallelScraper)
+    scraper.db = db
+    scraper._release_stale_leases()
+
+    assert sorted(db.get_lease_owners()) == ['node-a-1', 'worker-2', 'worker-3', 'worker-4']
@@ -0,0 +1,93 @@
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+import scraper.phone_scraper as phone_scraper
+from database.db import Database
+from scraper.phone_scraper import PhoneScraper
+from utils.metrics import metrics
+
+# Тенант -> (максимальный размер страницы, записей в аккаунте)
+TENANTS = {'a.crm.local': (1000, 5000), 'b.crm.local': (200, 5000)}
+
+
+class FakeLink:
+    def __init__(self, href):
+        self.href = href
+
+    def get_attribute(self, name):
+        return self.href
+
+
+class FakeCrm:
+    """Страница списка телефонов: размер страницы хранится в сессии тенанта"""
+
+    def __init__(self):
+        self.url = 'about:blank'
+        self.sizes = {tenant: 50 for tenant in TENANTS}
+        self.size_requests = []
+
+    def goto(self, url):
+        parts = urlsplit(url)
+        if parts.path == '/site/updatepagesize':
+            limit, _ = TENANTS[parts.netloc]
+            size = int(parse_qs(parts.query)['pageSize'][0])
+            self.size_requests.append((parts.netloc, size))
+            self.sizes[parts.netloc] = min(size, limit)
+        self.url = f'{parts.scheme}://{parts.netloc}/phones'
+
+    def tenant(self):
+        return urlsplit(self.url).netloc
+
+    def query_selector_all(self, selector):
+        return [FakeLink(f'/site/updatepagesize?pageSize={size}') for size in (50, 100, 200)]
+
+    def query_selector(self, selector):
+        # Кнопка «следующая страница»: есть, если не все записи на первой
+        if 'next' in selector or 'data-page' in selector:
+            _, total = TENANTS[self.tenant()]
+            return object() if total > self.sizes[self.tenant()] else None
+        return None
+
+    def evaluate(self, script, selectors):
+        _, total = TENANTS[self.tenant()]
+        rows = min(self.sizes[self.tenant()], total)
+        return [('ТЕЛЕФОН\tПРОЕКТ', [])] + [(f'7900{i:07d}\tПроект', []) for i in range(rows)]
+
+
+@pytest.fixture
+def crm(monkeypatch):
+    monkeypatch.setattr(phone_scraper, 'throttled_goto', lambda page, limiter, url, **kw: page.goto(url))
+    monkeypatch.setattr(metrics, 'sleep', lambda seconds, component=None: None)
+    return FakeCrm()
+
+
+@pytest.fixture
+def scraper(crm, tmp_path):
+    return PhoneScraper(crm, Database(str(tmp_path / 'phones.db')), rate_limiter=object())
+
+
+def open_tenant(crm, scraper, tenant):
+    crm.goto(f'https://{tenant}/phones')
+    return scraper._set_page_size(f'https://{tenant}/signin?token=1')
+
+
+def test_page_size_probed_once_per_tenant(crm, scraper):
+    assert open_tenant(crm, scraper, 'a.crm.local') == 1000
+    assert scraper.db.get_tenant_page_size('a.crm.local') == 1000
+
+    crm.size_requests.clear()
+    assert open_tenant(crm, scraper, 'a.crm.local') == 1000
+    assert crm.size_requests == [('a.crm.local', 1000)]
+
+
+def test_cached_page_size_applied_on_its_own_tenant(crm, scraper):
+    assert open_tenant(crm, scraper, 'a.crm.local') == 1000
+    # Размер из БД, подобранный в прошлом запуске, больше лимита тенанта B
+    scraper.db.set_tenant_page_size('b.crm.local', 500)
+
+    crm.size_requests.clear()
+    assert open_tenant(crm, scraper, 'b.crm.local') == 200
+    assert {tenant for tenant, _ in crm.size_requests} == {'b.crm.local'}
+    assert crm.sizes['a.crm.local'] == 1000
+    assert scraper.db.get_tenant_page_size('b.crm.local') == 200
@@ -0,0 +1,39 @@
+import pytest
+
+from scraper.page_parser import extract_phones
+from utils.numbering import normalize_phones
+from utils.phones import normalize_phone
+
+# Все коды плана +7, которые принимал прежний поиск 7\d{10}
+ACCEPTED = [
+    ('79001234567', 79001234567),
+    ('+7 (495) 123-45-67', 74951234567),
+    ('8 3452 12-34-56', 73452123456),
+    ('75001234567', 75001234567),
+    ('+7 (600) 123-45-67', 76001234567),
+    ('8 701 123 45 67', 77011234567),
+    ('7272123456', 77272123456),
+    ('88001234567', 78001234567),
+]
+REJECTED = ['70001234567', '+7 (100) 123-45-67', '8 200 123 45 67', '12345', '790012345678', '']
+
+
+@pytest.mark.parametrize('text,expected', ACCEPTED)
+def test_accepted_forms(text, expected):
+    assert normalize_phone(text) == expected
+
+
+@pytest.mark.parametrize('text', REJECTED)
+def test_rejected_forms(text):
+    assert normalize_phone(text) is None
+
+
+def test_batch_matches_single():
+    texts = [text for text, _ in ACCEPTED] + REJECTED
+    expected = [normalize_phone(text) or -1 for text in texts]
+    assert normalize_phones(texts).tolist() == expected
+
+
+def test_kazakhstan_numbers_from_page():
+    rows = [('ТЕЛЕФОН\tПРОЕКТ', []), ('76001234567\tПроект', []), ('+7 (701) 123-45-67\tПроект', [])]
+    assert extract_phones(rows) == ['76001234567', '77011234567']
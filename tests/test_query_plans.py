@@ -0,0 +1,40 @@
+import pytest
+
+import config
+from benchmarks.db_bench import build_database
+from benchmarks.query_plans import TracedDatabase, hot_queries, plan_problems
+
+
+@pytest.fixture(params=['fresh', 'analyzed'])
+def db(request, tmp_path):
+    path = tmp_path / 'plans.db'
+    build_database(path, 20000, 500)
+    db = TracedDatabase(str(path), pragmas={})
+    if request.param == 'analyzed':
+        db.optimize()
+    return db
+
+
+@pytest.fixture(autouse=True)
+def restore_policy(monkeypatch):
+    # hot_operations перебирает политики через config.SCHEDULING_POLICY
+    monkeypatch.setattr(config, 'SCHEDULING_POLICY', config.SCHEDULING_POLICY)
+
+
+def test_hot_queries_use_indexes(db):
+    queries = hot_queries(db)
+    # Запросы, добавленные вместе с размером страницы, пульсом и выгрузкой привязок
+    assert {'set_account_page_size', 'heartbeats', 'clear_heartbeats', 'iter_attributions',
+            'release_leases', 'lease_owners'} <= {name for name, _ in queries}
+
+    conn = db._connect()
+    try:
+        failures = {}
+        for name, sql in queries:
+            plan, problems = plan_problems(conn, sql)
+            if problems:
+                failures[f'{name}: {" ".join(sql.split())}'] = plan
+    finally:
+        conn.close()
+    assert failures == {}
+
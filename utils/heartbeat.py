@@ -0,0 +1,126 @@
+import os
+import time
+import socket
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+import config
+from utils.logger import logger
+
+
+class WorkerHeartbeat(logging.Handler):
+    """
+    Пульс воркера в worker_heartbeats: аккаунт, страница, темп, память, ошибка
+
+    page() вызывается после каждой сохраненной страницы, в БД строка
+    пишется не чаще HEARTBEAT_INTERVAL. Темп - страниц за последние
+    HEARTBEAT_RATE_WINDOW сек. Заодно это обработчик лога процесса:
+    последняя запись уровня ERROR попадает в last_error.
+    """
+
+    def __init__(self, db, worker: str, rss: Callable[[], float] = None):
+        super().__init__(logging.ERROR)
+        self.db = db
+        self.worker = worker
+        self.rss = rss
+        self.pages = deque()  # время сохранения страниц в окне темпа
+        self.fields = {'host': socket.gethostname(), 'pid': os.getpid(), 'started_at': time.time(),
+                       'pages_done': 0, 'pages_per_min': 0.0, 'finished_at': None}
+        self.written_at = 0.0
+        logger.addHandler(self)
+        self.beat(force=True)
+
+    def emit(self, record: logging.LogRecord):
+        # Только запоминаем: запись в БД - при следующем пульсе
+        self.fields['last_error'] = record.getMessage()[:500]
+        self.fields['last_error_at'] = record.created
+
+    def page(self, account_id: str, page_num: int, added: int = 0):
+        """Сигнатура совпадает с on_page у PhoneScraper"""
+        now = time.time()
+        self.pages.append(now)
+        self.fields.update(account_id=account_id, page=page_num, pages_done=self.fields['pages_done'] + 1)
+        self.beat()
+
+    def beat(self, force: bool = False):
+        now = time.time()
+        if not force and now - self.written_at < config.HEARTBEAT_INTERVAL:
+            return
+        while self.pages and self.pages[0] < now - config.HEARTBEAT_RATE_WINDOW:
+            self.pages.popleft()
+        # Первую минуту темп считается как за минуту, чтобы одна быстрая страница не давала ложный ETA
+        window = min(config.HEARTBEAT_RATE_WINDOW, max(now - self.fields['started_at'], 60.0))
+        self.fields['pages_per_min'] = len(self.pages) * 60 / window
+        if self.rss:
+            try:
+                self.fields['rss_mb'] = self.rss()
+            except Exception:
+                pass
+        try:
+            self.db.save_heartbeat(self.worker, self.fields)
+            self.written_at = now
+        except Exception as e:
+            # Пульс не должен останавливать парсинг
+            logger.debug(f"Не удалось записать пульс {self.worker}: {e}")
+
+    def finish(self):
+        logger.removeHandler(self)
+        self.fields['finished_at'] = time.time()
+        self.beat(force=True)
+
+
+def progress_summary(db) -> Dict:
+    """Общий прогресс запуска по пульсам воркеров и очереди аккаунтов"""
+    now = time.time()
+    workers = []
+    for beat in db.get_heartbeats():
+        beat['age'] = now - beat['updated_at']
+        beat['stalled'] = beat['finished_at'] is None and beat['age'] > config.HEARTBEAT_STALE
+        workers.append(beat)
+    active = [w for w in workers if w['finished_at'] is None]
+    # Темп зависших не учитываем: они не двигают очередь
+    rate = sum(w['pages_per_min'] for w in active if not w['stalled'])
+    remaining = db.get_remaining_pages()
+    eta = remaining['pages'] / rate * 60 if rate > 0 and remaining['pages'] else None
+    return {
+        'statuses': db.get_status_counts(),
+        'remaining': remaining,
+        'workers': workers,
+        'active': len(active),
+        'stalled': [w['worker'] for w in active if w['stalled']],
+        'pages_per_min': rate,
+        'eta_sec': eta,
+    }
+
+
+def _format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return 'нет оценки'
+    finish = datetime.now() + timedelta(seconds=seconds)
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}ч {rest // 60:02d}м (около {finish:%d.%m %H:%M})"
+
+
+def log_progress(summary: Dict, workers: bool = False):
+    """Сводка прогресса в лог; workers - с таблицей по воркерам (--mode status)"""
+    statuses = summary['statuses']
+    remaining = summary['remaining']
+    logger.info(f"📊 Аккаунтов: завершено {statuses.get('completed', 0)} из {sum(statuses.values())}, "
+                f"осталось {remaining['accounts']} (~{remaining['pages']} страниц"
+                + (f", без оценки размера: {remaining['unknown']}" if remaining['unknown'] else '') + ")")
+    logger.info(f"⚡ Темп: {summary['pages_per_min']:.1f} стр/мин, воркеров {summary['active']}, "
+                f"ETA: {_format_eta(summary['eta_sec'])}")
+    if summary['stalled']:
+        logger.warning(f"🧊 Нет пульса дольше {config.HEARTBEAT_STALE} сек: {', '.join(summary['stalled'])}")
+
+    if not workers:
+        return
+    for w in summary['workers']:
+        state = 'завершен' if w['finished_at'] else ('ЗАВИС' if w['stalled'] else 'работает')
+        logger.info(f"   {w['worker']:<20} {state:<9} аккаунт {w['account_id'] or '-'} стр. {w['page'] or '-'}, "
+                    f"{w['pages_per_min']:.1f} стр/мин, всего {w['pages_done']} стр., "
+                    f"RSS {w['rss_mb'] or 0:.0f}MB, пульс {w['age']:.0f} сек назад")
+        if w['last_error']:
+            ago = time.time() - (w['last_error_at'] or w['updated_at'])
+            logger.info(f"      последняя ошибка ({ago:.0f} сек назад): {w['last_error']}")
@@ -0,0 +1,104 @@
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+import config
+from database.db import Database
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.phone_index import PhoneIndex
+
+# Метка снимка, проверенного родителем (оркестратор -> воркеры)
+KNOWN_SNAPSHOT_ENV = 'CRM_KNOWN_SNAPSHOT'
+
+# Байт индекса на привязку: номер int64 + аккаунт int32
+ROW_BYTES = 12
+
+
+class KnownPhones:
+    """
+    Точное множество известных номеров и привязок (номер, аккаунт) процесса
+
+    Снимок - файлы PhoneIndex (номера по возрастанию и их аккаунты),
+    открытые через memmap: все воркеры читают одни и те же страницы кэша
+    ОС. Если индекс больше KNOWN_PHONES_MAX_MB, используется его начало до
+    границы номера: для номеров дальше границы фильтр ничего не знает и
+    отправляет их в SQLite. Номера, записанные этим процессом после снимка,
+    попадают в дельту (множества Python, не больше KNOWN_PHONES_DELTA_MAX).
+
+    Фильтр не дает ложных "известен": номер пропускается, только если он
+    точно есть в БД (снимок не может быть новее базы, номера не удаляются
+    во время парсинга). Чужие новые номера для него неизвестны и проходят
+    обычный путь через SQLite.
+    """
+
+    def __init__(self, phones: np.ndarray, accounts: np.ndarray, max_rows: int = None):
+        if max_rows is not None and max_rows < len(phones):
+            # Граница по целому номеру: все привязки номеров ниже limit в снимке
+            self.limit = int(phones[max_rows])
+            max_rows = int(np.searchsorted(phones[:max_rows], self.limit, 'left'))
+            phones, accounts = phones[:max_rows], accounts[:max_rows]
+        else:
+            self.limit = None
+        self.phones = phones
+        self.accounts = accounts
+        self.new_phones = set()
+        self.new_pairs = set()
+
+    def classify(self, numbers: List[Optional[int]], account: int) -> Tuple[List[bool], List[bool]]:
+        """(привязка к account известна, номер известен) для каждого номера"""
+        keys = np.array([number if number is not None else -1 for number in numbers], dtype=np.int64)
+        left = np.searchsorted(self.phones, keys, 'left').tolist()
+        right = np.searchsorted(self.phones, keys, 'right').tolist()
+
+        pair_known, phone_known = [], []
+        for number, lo, hi in zip(numbers, left, right):
+            in_snapshot = hi > lo and (self.limit is None or number < self.limit)
+            phone_known.append(in_snapshot or number in self.new_phones)
+            pair_known.append((in_snapshot and account in self.accounts[lo:hi].tolist())
+                              or (number, account) in self.new_pairs)
+
+        hits = sum(pair_known)
+        metrics.inc('crm_known_filter_total', hits, result='hit')
+        metrics.inc('crm_known_filter_total', len(numbers) - hits, result='miss')
+        if hits == len(numbers):
+            metrics.inc('crm_known_filter_pages_skipped_total')
+        return pair_known, phone_known
+
+    def remember(self, phones: List[int], attributed: List[int], account: int):
+        """Номера и привязки, записанные в БД после снимка"""
+        if len(self.new_phones) + len(self.new_pairs) > config.KNOWN_PHONES_DELTA_MAX:
+            # Дельта переполнена: сбрасываем, эти номера снова будут проверяться в SQLite
+            self.new_phones.clear()
+            self.new_pairs.clear()
+        self.new_phones.update(phones)
+        self.new_pairs.update((number, account) for number in attributed)
+
+
+def prepare(db: Database) -> Optional[str]:
+    """
+    Собрать (или проверить) снимок для фильтра перед запуском воркеров
+
+    Вызывается до начала записи, пока индекс можно сверить с базой; метка
+    сборки передается воркерам через окружение. None - фильтр выключен.
+    """
+    os.environ.pop(KNOWN_SNAPSHOT_ENV, None)
+    if config.KNOWN_PHONES_MAX_MB <= 0:
+        return None
+    index = PhoneIndex(db).open()
+    os.environ[KNOWN_SNAPSHOT_ENV] = index.snapshot_id
+    rows = min(len(index.phones), config.KNOWN_PHONES_MAX_MB * 2 ** 20 // ROW_BYTES)
+    logger.info(f"🧮 Фильтр известных номеров: {rows} из {len(index.phones)} привязок "
+                f"(лимит {config.KNOWN_PHONES_MAX_MB} МБ)")
+    return index.snapshot_id
+
+
+def attach(db: Database) -> Optional[KnownPhones]:
+    """Фильтр процесса по снимку, подготовленному prepare(); None, если снимка нет"""
+    snapshot_id = os.environ.get(KNOWN_SNAPSHOT_ENV)
+    if not snapshot_id or config.KNOWN_PHONES_MAX_MB <= 0:
+        return None
+    index = PhoneIndex(db).map(snapshot_id)
+    if index.phones is None:
+        logger.warning("⚠️ Снимок известных номеров заменен, фильтр выключен")
+        return None
+    return KnownPhones(index.phones, index.accounts, config.KNOWN_PHONES_MAX_MB * 2 ** 20 // ROW_BYTES)
@@ -1,15 +1,29 @@
-import logging
 import sys
+import json
+import copy
+import queue
+import atexit
+import logging
 from pathlib import Path
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from colorama import init, Fore, Style
+import config
 
 # Инициализация colorama для Windows
 init(autoreset=True)
 
+LOGGER_NAME = 'CRM_Scraper'
+
+# Потоки записи логов текущего процесса (только в оркестраторе)
+_listeners = []
+_handlers = []
+_worker_queue = None
+_worker_name = 'main'
+
+
 class ColoredFormatter(logging.Formatter):
     """Цветной форматтер для консоли"""
-    
+
     COLORS = {
         'DEBUG': Fore.CYAN,
         'INFO': Fore.GREEN,
@@ -17,45 +31,195 @@ class ColoredFormatter(logging.Formatter):
         'ERROR': Fore.RED,
         'CRITICAL': Fore.RED + Style.BRIGHT,
     }
-    
+
     def format(self, record):
+        # Копия: та же запись дальше уходит в файл, цвет там не нужен
+        record = copy.copy(record)
         log_color = self.COLORS.get(record.levelname, '')
         record.levelname = f"{log_color}{record.levelname}{Style.RESET_ALL}"
         return super().format(record)
 
-def setup_logger(name: str = 'CRM_Scraper'):
-    """Настройка логгера"""
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Удаляем существующие handlers
-    logger.handlers.clear()
-    
-    # Консольный handler
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись (для jq, Loki, ELK)"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'worker': record.worker,
+            'pid': record.process,
+            'message': record.getMessage(),
+        }
+        category = getattr(record, 'category', None)
+        if category:
+            entry['category'] = category
+        # Из очереди (RecordQueueHandler) трассировка приходит готовым exc_text
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не смешивает трассировку с сообщением
+
+    Стандартный prepare дописывает трассировку к тексту сообщения и
+    обнуляет exc_info (объект трассировки не передать в другой процесс).
+    Здесь текст трассировки уходит в exc_text: JsonFormatter пишет его в
+    поле exception, текстовые форматтеры дописывают после сообщения.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class WorkerFilter(logging.Filter):
+    """Метка процесса: main или worker-N"""
+
+    def filter(self, record):
+        record.worker = _worker_name
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничение частоты повторяющихся сообщений
+
+    Категория задается при записи: logger.info(..., extra={'category': 'page'}).
+    За окно LOG_RATE_WINDOW сек проходит не больше LOG_RATE_LIMIT
+    INFO-записей одной категории, остальные отбрасываются еще в процессе-
+    источнике, до форматирования и очереди. Число отброшенных дописывается
+    к первой записи категории в следующем окне. WARNING и выше, а также
+    записи без категории проходят всегда.
+    """
+
+    def __init__(self, limit: int = config.LOG_RATE_LIMIT, window: float = config.LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.windows = {}  # категория -> [начало окна, записей, отброшено]
+
+    def filter(self, record):
+        category = getattr(record, 'category', None)
+        if category is None or record.levelno >= logging.WARNING:
+            return True
+
+        state = self.windows.get(category)
+        if state is None or record.created - state[0] >= self.window:
+            dropped = state[2] if state else 0
+            state = self.windows[category] = [record.created, 0, 0]
+            if dropped:
+                record.msg = f"{record.getMessage()} (+{dropped} похожих сообщений пропущено)"
+                record.args = None
+
+        state[1] += 1
+        if state[1] > self.limit:
+            state[2] += 1
+            return False
+        return True
+
+
+def _build_handlers():
+    """Консоль и ротируемый файл (работают в потоке-слушателе)"""
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    console_formatter = ColoredFormatter(
-        '%(asctime)s | %(levelname)s | %(message)s',
+    console_handler.setFormatter(ColoredFormatter(
+        '%(asctime)s | %(levelname)s | %(worker)s | %(message)s',
         datefmt='%H:%M:%S'
-    )
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
-    
-    # Файловый handler
-    log_dir = Path('logs')
+    ))
+
+    log_dir = Path(config.LOG_DIR)
     log_dir.mkdir(exist_ok=True)
-    
-    log_file = log_dir / f"scraper_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+
+    file_handler = RotatingFileHandler(
+        log_dir / config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
     file_handler.setLevel(logging.DEBUG)
-    file_formatter = logging.Formatter(
-        '%(asctime)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
-    
+    if config.LOG_JSON:
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s | %(levelname)s | %(worker)s | %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+    return [console_handler, file_handler]
+
+
+def _start_listener(log_queue):
+    listener = QueueListener(log_queue, *_handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def setup_logger(name: str = LOGGER_NAME):
+    """
+    Настройка логгера оркестратора
+
+    logger.info только кладет запись в очередь: форматирование и запись
+    в консоль и файл делает отдельный поток (QueueListener), так что
+    горячий путь не ждет диска.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+
+    # Удаляем существующие handlers и фильтры
+    logger.handlers.clear()
+    logger.filters.clear()
+    logger.addFilter(WorkerFilter())
+    logger.addFilter(RateLimitFilter())
+
+    _handlers[:] = _build_handlers()
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(RecordQueueHandler(log_queue))
+    _start_listener(log_queue)
+
     return logger
 
+
+def worker_log_queue():
+    """Очередь записей воркеров: создается при первом запросе, ее слушает оркестратор"""
+    global _worker_queue
+    if _worker_queue is None:
+        import multiprocessing as mp
+        _worker_queue = mp.Queue()
+        _start_listener(_worker_queue)
+    return _worker_queue
+
+
+def setup_worker_logger(log_queue, worker_id: int, name: str = LOGGER_NAME):
+    """
+    Логгер воркера: все его записи (и модулей scraper/*) уходят в очередь
+    оркестратора с меткой worker-N, своих файлов воркер не открывает
+    """
+    global _worker_name
+    _worker_name = f'worker-{worker_id}'
+
+    # Потоки записи, унаследованные через fork, в дочернем процессе не работают
+    _listeners.clear()
+    _handlers.clear()
+
+    logger = logging.getLogger(name)
+    logger.handlers.clear()
+    logger.addHandler(RecordQueueHandler(log_queue))
+    return logger
+
+
+def stop_logging():
+    """Дописать записи из очередей и остановить потоки записи"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_logging)
+
 # Глобальный логгер
 logger = setup_logger()
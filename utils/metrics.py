@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Optional
+import config
+from utils.logger import logger
+
+# Верхние границы корзин гистограмм, сек
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Переменная окружения с каталогом текущего запуска (для дочерних процессов)
+RUN_ENV = 'CRM_METRICS_RUN'
+
+
+def _key(name: str, labels: Dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """
+    Счетчики, гистограммы и gauge процесса
+
+    Каждый процесс периодически сбрасывает свой снимок в
+    <METRICS_DIR>/<запуск>/<pid>.json, а родитель сводит снимки всех
+    процессов в Prometheus textfile и JSON-сводку. После fork дочерний
+    процесс начинает с пустых метрик, а не с копии родительских.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Dict] = {}
+        self.flushed_at = time.time()
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            self._reset()
+
+    # --- Запись ---
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self.lock:
+            self._check_fork()
+            key = _key(name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self._check_fork()
+            self.gauges[_key(name, labels)] = value
+        self._maybe_flush()
+
+    def observe(self, name: str, seconds: float, **labels):
+        with self.lock:
+            self._check_fork()
+            key = _key(name, labels)
+            histogram = self.histograms.setdefault(
+                key, {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+            histogram['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, component: str, stage: str):
+        """Засечь этап: crm_stage_seconds{component, stage}"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.observe('crm_stage_seconds', time.time() - started,
+                         component=component, stage=stage)
+
+    def sleep(self, seconds: float, component: str):
+        """Фиксированная пауза, учтенная как этап sleep"""
+        with self.timer(component, 'sleep'):
+            time.sleep(seconds)
+
+    def timed(self, component: str):
+        """Декоратор: время вызова как этап с именем функции, ошибки по типам"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    with self.timer(component, func.__name__):
+                        return func(*args, **kwargs)
+                except Exception as e:
+                    self.inc('crm_errors_total', component=component,
+                             stage=func.__name__, error=type(e).__name__)
+                    raise
+            return wrapper
+        return decorator
+
+    # --- Снимки процессов ---
+
+    def start_run(self) -> Path:
+        """Начать запуск: каталог снимков наследуют дочерние процессы"""
+        run_dir = Path(config.METRICS_DIR) / datetime.now().strftime('%Y%m%d_%H%M%S')
+        run_dir.mkdir(parents=True, exist_ok=True)
+        os.environ[RUN_ENV] = str(run_dir)
+        return run_dir
+
+    @property
+    def run_dir(self) -> Optional[Path]:
+        value = os.environ.get(RUN_ENV)
+        return Path(value) if value else None
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            self._check_fork()
+            return {
+                'pid': self.pid,
+                'counters': [[n, dict(l), v] for (n, l), v in self.counters.items()],
+                'gauges': [[n, dict(l), v] for (n, l), v in self.gauges.items()],
+                'histograms': [[n, dict(l), dict(h, buckets=list(h['buckets']))]
+                               for (n, l), h in self.histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        if time.time() - self.flushed_at >= config.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Записать снимок процесса (вне запуска - ничего не делает)"""
+        self.flushed_at = time.time()
+        run_dir = self.run_dir
+        if not run_dir:
+            return
+        snapshot = self.snapshot()
+        path = run_dir / f"{snapshot['pid']}.json"
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Не удалось сохранить метрики: {e}")
+
+    def finish(self) -> Optional[Dict]:
+        """Свести снимки всех процессов запуска, записать отчеты и вывести сводку"""
+        self.flush()
+        run_dir = self.run_dir
+        if not run_dir:
+            return None
+        merged = merge_snapshots(run_dir)
+        summary = export(merged, run_dir)
+        log_summary(summary)
+        return summary
+
+
+def merge_snapshots(run_dir: Path) -> Dict:
+    """Сложить метрики всех процессов запуска (gauge тоже суммируются)"""
+    counters, gauges, histograms = {}, {}, {}
+    for path in sorted(Path(run_dir).glob('*.json')):
+        if path.name == 'summary.json':
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            key = _key(name, labels)
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, h in snapshot['histograms']:
+            key = _key(name, labels)
+            total = histograms.setdefault(
+                key, {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], h['buckets'])]
+            total['sum'] += h['sum']
+            total['count'] += h['count']
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+
+def _labels(labels: tuple, extra: Dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def to_prometheus(merged: Dict) -> str:
+    """Текстовый формат Prometheus (для textfile collector и /metrics)"""
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(merged['counters'].items()):
+        header(name, 'counter')
+        lines.append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), value in sorted(merged['gauges'].items()):
+        header(name, 'gauge')
+        lines.append(f'{name}{_labels(labels)} {value}')
+    for (name, labels), h in sorted(merged['histograms'].items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ['+Inf'], h['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels, {"le": bound})} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {h["sum"]:.6f}')
+        lines.append(f'{name}_count{_labels(labels)} {h["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _quantile(h: Dict, q: float) -> float:
+    """Оценка квантиля по корзинам (верхняя граница корзины)"""
+    rank = q * h['count']
+    cumulative = 0
+    for bound, count in zip(list(BUCKETS) + [float('inf')], h['buckets']):
+        cumulative += count
+        if cumulative >= rank:
+            return bound
+    return float('inf')
+
+
+def summarize(merged: Dict) -> Dict:
+    stages = []
+    for (name, labels), h in merged['histograms'].items():
+        if name != 'crm_stage_seconds':
+            continue
+        stages.append({**dict(labels), 'total_sec': round(h['sum'], 3), 'count': h['count'],
+                       'mean_sec': round(h['sum'] / h['count'], 4) if h['count'] else 0,
+                       'p50_le_sec': _quantile(h, 0.5), 'p99_le_sec': _quantile(h, 0.99)})
+    stages.sort(key=lambda s: s['total_sec'], reverse=True)
+    return {
+        'stages': stages,
+        'counters': [{'name': n, **dict(l), 'value': v} for (n, l), v in sorted(merged['counters'].items())],
+        'gauges': [{'name': n, **dict(l), 'value': v} for (n, l), v in sorted(merged['gauges'].items())],
+    }
+
+
+def export(merged: Dict, run_dir: Path) -> Dict:
+    """Записать metrics.prom и summary.json в каталог запуска и общий textfile"""
+    text = to_prometheus(merged)
+    summary = summarize(merged)
+    for path in (run_dir / 'metrics.prom', Path(config.METRICS_DIR) / 'crm_scraper.prom'):
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    with open(run_dir / 'summary.json', 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def log_summary(summary: Dict):
+    """Куда ушло время: этапы по убыванию суммарной длительности"""
+    if not summary['stages']:
+        return
+    logger.info("⏱️ Время по этапам (все процессы):")
+    for stage in summary['stages'][:15]:
+        logger.info(f"   {stage['component']}/{stage['stage']}: {stage['total_sec']:.1f} сек "
+                    f"(вызовов: {stage['count']}, в среднем {stage['mean_sec']:.3f} сек)")
+
+
+def serve(port: int, host: str = None):
+    """HTTP /metrics (Prometheus) и /metrics.json по снимкам текущего запуска (на host, по умолчанию METRICS_HOST)"""
+    # http.server нужен только с --metrics-port: не замедляет импорт остальным
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            metrics.flush()
+            merged = merge_snapshots(metrics.run_dir) if metrics.run_dir else \
+                {'counters': {}, 'gauges': {}, 'histograms': {}}
+            if self.path.startswith('/metrics.json'):
+                body = json.dumps(summarize(merged), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            elif self.path.startswith('/metrics'):
+                body = to_prometheus(merged).encode('utf-8')
+                content_type = 'text/plain; version=0.0.4'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host or config.METRICS_HOST, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    logger.info(f"📈 Метрики: http://{bound_host}:{bound_port}/metrics")
+    return server
+
+
+# Глобальные метрики процесса
+metrics = Metrics()
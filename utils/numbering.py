@@ -0,0 +1,163 @@
+import csv
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import config
+from utils.logger import logger
+from utils.phones import normalize_phone, NATIONAL_FIRST_DIGITS
+
+# Записи длиннее разбираются построчно: ширина массива символов - по самой длинной записи
+MAX_PHONE_TEXT = 32
+# Строк в одном блоке: матрица символов блока - MAX_PHONE_TEXT * 8 байт на строку
+NORMALIZE_BLOCK = 65536
+
+_POWERS = 10 ** np.arange(12, dtype=np.int64)
+
+
+def normalize_phones(texts: Sequence[str]) -> np.ndarray:
+    """
+    Номера из произвольной записи в канонический вид (7XXXXXXXXXX), пачкой
+
+    То же, что utils.phones.normalize_phone, но над массивом: строки
+    переводятся в матрицу кодов символов, из цифр каждой строки собирается
+    число без цикла по строкам. 10 цифр - номер без кода страны, 11 цифр с
+    7 или 8 в начале - с кодом. Результат int64, -1 для нераспознанных.
+    """
+    result = np.full(len(texts), -1, dtype=np.int64)
+    for start in range(0, len(texts), NORMALIZE_BLOCK):
+        block = texts[start:start + NORMALIZE_BLOCK]
+        result[start:start + len(block)] = _normalize_block(block)
+    return result
+
+
+def _normalize_block(texts: Sequence[str]) -> np.ndarray:
+    width = max(map(len, texts), default=0)
+    if width > MAX_PHONE_TEXT:
+        return np.fromiter((normalize_phone(text) or -1 for text in texts), dtype=np.int64, count=len(texts))
+
+    codes = np.array(texts, dtype=f'U{max(width, 1)}').view(np.uint32).reshape(len(texts), -1)
+    is_digit = (codes >= 48) & (codes <= 57)
+    count = is_digit.sum(axis=1)
+    # Схема Горнера по столбцам: цикл по позициям символа (не длиннее MAX_PHONE_TEXT),
+    # внутри - векторные операции по всем строкам блока
+    digits = np.ascontiguousarray(np.where(is_digit, codes - 48, 0).T, dtype=np.int64)
+    value = np.zeros(len(texts), dtype=np.int64)
+    for column, mask in zip(digits, np.ascontiguousarray(is_digit.T)):
+        value = np.where(mask, value * 10 + column, value)
+
+    national = np.where(count == 10, value, -1)
+    with_code = (count == 11) & np.isin(value // _POWERS[10], (7, 8))
+    national = np.where(with_code, value % _POWERS[10], national)
+    valid = (national >= 0) & np.isin(national // _POWERS[9], [int(d) for d in NATIONAL_FIRST_DIGITS])
+    return np.where(valid, 7 * _POWERS[10] + national, -1)
+
+
+class NumberingPlan:
+    """
+    План нумерации: отсортированные диапазоны номеров -> (оператор, регион)
+
+    Загружается из выгрузки реестра плана нумерации (CSV с колонками
+    'АВС/ DEF;От;До;Емкость;Оператор;Регион;...'). Диапазоны не
+    пересекаются, поэтому поиск - один searchsorted по началам диапазонов
+    и проверка конца найденного.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, carrier_index: np.ndarray,
+                 carriers: List[Tuple[str, str]]):
+        self.starts = starts
+        self.ends = ends
+        self.carrier_index = carrier_index
+        self.carriers = carriers
+
+    @classmethod
+    def load(cls, path: str = None) -> 'NumberingPlan':
+        path = Path(path or config.NUMBERING_PLAN_PATH)
+        started = time.time()
+        try:
+            text = path.read_text(encoding='utf-8-sig')
+        except UnicodeDecodeError:
+            # Старые выгрузки реестра - в cp1251
+            text = path.read_text(encoding='cp1251')
+
+        rows = csv.reader(text.splitlines(), delimiter=';')
+        header = [name.strip().lower() for name in next(rows, [])]
+        operator_col = header.index('оператор') if 'оператор' in header else 4
+        region_col = header.index('регион') if 'регион' in header else 5
+
+        starts, ends, carrier_index = [], [], []
+        carriers = {}
+        for row in rows:
+            try:
+                code, first, last = int(row[0]), int(row[1]), int(row[2])
+            except (ValueError, IndexError):
+                continue
+            carrier = (row[operator_col].strip(), row[region_col].strip())
+            prefix = 7 * 10 ** 10 + code * 10 ** 7
+            starts.append(prefix + first)
+            ends.append(prefix + last)
+            carrier_index.append(carriers.setdefault(carrier, len(carriers)))
+
+        order = np.argsort(np.array(starts, dtype=np.int64), kind='stable')
+        plan = cls(np.array(starts, dtype=np.int64)[order], np.array(ends, dtype=np.int64)[order],
+                   np.array(carrier_index, dtype=np.int32)[order], list(carriers))
+        logger.info(f"📇 План нумерации: {len(starts)} диапазонов, {len(carriers)} операторов/регионов "
+                    f"({time.time() - started:.1f} сек)")
+        return plan
+
+    def match(self, phones: np.ndarray) -> np.ndarray:
+        """Индекс в self.carriers для каждого номера, -1 - номера нет в плане"""
+        if len(self.starts) == 0:
+            return np.full(len(phones), -1, dtype=np.int64)
+        pos = np.searchsorted(self.starts, phones, 'right') - 1
+        clipped = np.maximum(pos, 0)
+        inside = (pos >= 0) & (phones <= self.ends[clipped])
+        return np.where(inside, self.carrier_index[clipped], -1)
+
+
+_plans = {}
+
+
+def get_plan() -> Optional[NumberingPlan]:
+    """План нумерации процесса (загружается один раз на путь); None, если файла нет"""
+    path = config.NUMBERING_PLAN_PATH
+    if path not in _plans:
+        if Path(path).exists():
+            _plans[path] = NumberingPlan.load(path)
+        else:
+            _plans[path] = None
+            logger.warning(f"⚠️ Нет плана нумерации {path}: номера сохраняются без оператора и региона")
+    return _plans[path]
+
+
+def run_enrich(db, refresh: bool = False) -> int:
+    """
+    Проставить оператора и регион номерам phones одним проходом
+
+    Номера идут пачками по первичному ключу (только необогащенные, с
+    refresh - все): пачка нормализуется, ищется в плане и записывается
+    одним executemany. Каждая пачка - своя транзакция, поэтому прерванный
+    проход продолжается с места остановки.
+    """
+    plan = get_plan()
+    if plan is None:
+        logger.error(f"❌ Положите выгрузку реестра плана нумерации в {config.NUMBERING_PLAN_PATH}")
+        return 0
+
+    carrier_ids = np.array(db.ensure_carriers(plan.carriers) + [0], dtype=np.int64)
+
+    logger.info("📇 Обогащение номеров оператором и регионом...")
+    started = time.time()
+    done = matched = 0
+    for ids, phones in db.iter_phones_to_enrich(config.ENRICH_BATCH, only_missing=not refresh):
+        found = plan.match(normalize_phones(phones))
+        # -1 (нет в плане) указывает на последний элемент carrier_ids - 0
+        db.set_phone_carriers(zip(carrier_ids[found].tolist(), ids))
+        done += len(ids)
+        matched += int(np.count_nonzero(found >= 0))
+        elapsed = time.time() - started
+        logger.info(f"   Обработано: {done} ({done / max(elapsed, 1e-6):.0f} номеров/сек)")
+
+    logger.info(f"✅ Обогащено {done} номеров за {time.time() - started:.1f} сек, "
+                f"найдено в плане: {matched}")
+    return done
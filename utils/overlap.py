@@ -0,0 +1,132 @@
+import csv
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import config
+from database.db import Database
+from utils.logger import logger
+
+
+def load_attributions(db: Database) -> Tuple[np.ndarray, np.ndarray]:
+    """phone_accounts в два массива (номера int64, аккаунты int32), упорядоченных по номеру"""
+    phones: List[np.ndarray] = []
+    accounts: List[np.ndarray] = []
+    for rows in db.iter_attributions():
+        # fromiter по плоской последовательности в ~3 раза быстрее np.array(список кортежей)
+        batch = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=2 * len(rows)).reshape(-1, 2)
+        phones.append(batch[:, 0])
+        accounts.append(batch[:, 1].astype(np.int32))
+    if not phones:
+        return np.empty(0, np.int64), np.empty(0, np.int32)
+    return np.concatenate(phones), np.concatenate(accounts)
+
+
+def overlap_stats(phones: np.ndarray, accounts: np.ndarray, top: int = 20,
+                  max_group: int = config.OVERLAP_MAX_GROUP) -> Dict:
+    """
+    Пересечения аккаунтов по номерам
+
+    phones отсортирован, внутри номера аккаунты по возрастанию (порядок
+    первичного ключа phone_accounts). Номер с k аккаунтами - группа из k
+    соседних строк: уникальные/общие номера аккаунта считаются bincount по
+    размеру группы, пары - сдвигами внутри групп одного размера и np.unique
+    по ключу пары. Номера, встреченные больше чем в max_group аккаунтах
+    (тестовые, служебные), в пары не идут: они дали бы k^2/2 пар каждый.
+    """
+    n = len(phones)
+    if n == 0:
+        return {'attributions': 0, 'phones': 0, 'shared_phones': 0, 'max_accounts_per_phone': 0,
+                'total': np.zeros(0, np.int64), 'unique': np.zeros(0, np.int64),
+                'shared': np.zeros(0, np.int64), 'top_pairs': [], 'skipped_phones': 0}
+
+    is_start = np.empty(n, dtype=bool)
+    is_start[0] = True
+    np.not_equal(phones[1:], phones[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    sizes = np.diff(np.append(starts, n))
+
+    n_accounts = int(accounts.max()) + 1
+    total = np.bincount(accounts, minlength=n_accounts)
+    unique = np.bincount(accounts[np.repeat(sizes, sizes) == 1], minlength=n_accounts)
+
+    keys = []
+    skipped = 0
+    for k in np.unique(sizes[sizes >= 2]):
+        group_starts = starts[sizes == k]
+        if k > max_group:
+            skipped += len(group_starts)
+            continue
+        for i in range(k - 1):
+            left = accounts[group_starts + i].astype(np.int64) * n_accounts
+            for j in range(i + 1, k):
+                keys.append(left + accounts[group_starts + j])
+
+    top_pairs = []
+    if keys:
+        pair_keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+        best = np.argsort(counts, kind='stable')[::-1][:top]
+        top_pairs = [(int(pair_keys[i] // n_accounts), int(pair_keys[i] % n_accounts), int(counts[i]))
+                     for i in best]
+
+    return {
+        'attributions': n,
+        'phones': len(starts),
+        'shared_phones': int(np.count_nonzero(sizes > 1)),
+        'max_accounts_per_phone': int(sizes.max()),
+        'total': total,
+        'unique': unique,
+        'shared': total - unique,
+        'top_pairs': top_pairs,
+        'skipped_phones': skipped,
+    }
+
+
+def write_accounts_csv(stats: Dict, refs: Dict[int, Tuple[str, str]], path: str):
+    """Уникальные и общие номера по аккаунтам"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['account_id', 'username', 'phones', 'unique', 'shared', 'shared_share'])
+        for ref in np.flatnonzero(stats['total']):
+            account_id, username = refs.get(int(ref), (str(ref), ''))
+            total, shared = int(stats['total'][ref]), int(stats['shared'][ref])
+            writer.writerow([account_id, username, total, int(stats['unique'][ref]), shared,
+                             round(shared / total, 4)])
+
+
+def run_overlap(db: Database, top: int = 20, output: str = config.OVERLAP_PATH) -> Dict:
+    """Посчитать пересечения, вывести сводку и топ пар, сохранить CSV по аккаунтам"""
+    logger.info("🔗 Анализ пересечений аккаунтов по номерам...")
+
+    started = time.time()
+    phones, accounts = load_attributions(db)
+    loaded = time.time()
+    stats = overlap_stats(phones, accounts, top)
+    computed = time.time()
+
+    logger.info(f"   Привязок номер-аккаунт: {stats['attributions']} "
+                f"(загрузка {loaded - started:.1f} сек, расчет {computed - loaded:.1f} сек)")
+    if not stats['attributions']:
+        logger.warning("⚠️ Нет данных: запустите парсинг")
+        return stats
+
+    refs = db.get_account_refs()
+    logger.info(f"   Уникальных номеров: {stats['phones']}, "
+                f"в нескольких аккаунтах: {stats['shared_phones']} "
+                f"(максимум аккаунтов на номер: {stats['max_accounts_per_phone']})")
+    if stats['skipped_phones']:
+        logger.info(f"   Не учтено в парах: {stats['skipped_phones']} номеров "
+                    f"больше чем в {config.OVERLAP_MAX_GROUP} аккаунтах")
+
+    if stats['top_pairs']:
+        logger.info(f"🔝 Пары аккаунтов с наибольшим числом общих номеров:")
+    for a, b, count in stats['top_pairs']:
+        smaller = min(stats['total'][a], stats['total'][b])
+        logger.info(f"   {refs.get(a, (a, '?'))[1]} ↔ {refs.get(b, (b, '?'))[1]}: "
+                    f"{count} ({count / smaller:.0%} меньшего)")
+
+    write_accounts_csv(stats, refs, output)
+    logger.info(f"✅ По аккаунтам: {output}")
+    return stats
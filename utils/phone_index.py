@@ -0,0 +1,183 @@
+import csv
+import json
+import os
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import config
+from database.db import Database
+from utils.logger import logger
+from utils.numbering import normalize_phones
+
+
+class PhoneIndex:
+    """
+    Отсортированный индекс номеров для пакетного поиска
+
+    Копия phone_accounts в двух файлах на диске: номера int64 по
+    возрастанию и параллельно им accounts.id int32 (номер из нескольких
+    аккаунтов - несколько соседних строк). Файлы открываются через
+    np.memmap, поэтому поиск не читает базу и не держит индекс в памяти
+    процесса: страницы подгружает ОС. Индекс пересобирается, если
+    изменились счетчики базы (число номеров и привязок).
+    """
+
+    def __init__(self, db: Database, directory: str = None):
+        self.db = db
+        self.directory = Path(directory or config.PHONE_INDEX_DIR)
+        self.phones_path = self.directory / 'phones.i64'
+        self.accounts_path = self.directory / 'accounts.i32'
+        self.meta_path = self.directory / 'meta.json'
+        self.phones = None
+        self.accounts = None
+        self.snapshot_id = None  # Метка сборки: воркеры открывают именно тот снимок, что проверил родитель
+
+    def _fingerprint(self) -> Dict:
+        return {'db': str(Path(self.db.db_path).resolve()),
+                'phones': self.db.get_total_phones(),
+                'attributions': self.db.get_attribution_count()}
+
+    def _read_meta(self) -> Dict:
+        if not self.meta_path.exists() or not self.phones_path.exists():
+            return {}
+        with open(self.meta_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _is_fresh(self, fingerprint: Dict) -> bool:
+        return self._read_meta().get('fingerprint') == fingerprint
+
+    def build(self, fingerprint: Dict = None) -> int:
+        """Выгрузить phone_accounts в файлы индекса потоком, вернуть число строк"""
+        fingerprint = fingerprint or self._fingerprint()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        started = time.time()
+        rows = 0
+        # Пишем во временные файлы и переименовываем: прерванная сборка не портит индекс
+        tmp_phones = self.phones_path.with_suffix('.tmp')
+        tmp_accounts = self.accounts_path.with_suffix('.tmp')
+        with open(tmp_phones, 'wb') as fp, open(tmp_accounts, 'wb') as fa:
+            for batch in self.db.iter_attributions():
+                pairs = np.fromiter(chain.from_iterable(batch), dtype=np.int64,
+                                    count=2 * len(batch)).reshape(-1, 2)
+                fp.write(pairs[:, 0].tobytes())
+                fa.write(pairs[:, 1].astype(np.int32).tobytes())
+                rows += len(batch)
+        os.replace(tmp_phones, self.phones_path)
+        os.replace(tmp_accounts, self.accounts_path)
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'rows': rows, 'snapshot': f'{time.time():.6f}'}, f)
+        logger.info(f"🗂️ Индекс номеров: {rows} привязок за {time.time() - started:.1f} сек")
+        return rows
+
+    def open(self, rebuild: bool = False):
+        """Открыть индекс (memmap), при необходимости пересобрав"""
+        fingerprint = self._fingerprint()
+        if rebuild or not self._is_fresh(fingerprint):
+            self.build(fingerprint)
+        return self.map()
+
+    def map(self, snapshot_id: str = None):
+        """
+        Открыть файлы индекса без проверки актуальности
+
+        С snapshot_id - только если на диске та же сборка; иначе индекс не
+        открывается (phones остается None).
+        """
+        self.snapshot_id = self._read_meta().get('snapshot')
+        if snapshot_id is not None and snapshot_id != self.snapshot_id:
+            return self
+        if self.phones_path.stat().st_size == 0:
+            self.phones = np.empty(0, np.int64)
+            self.accounts = np.empty(0, np.int32)
+        else:
+            # ndarray-представление того же отображения: срезы без накладных расходов np.memmap
+            self.phones = np.asarray(np.memmap(self.phones_path, dtype=np.int64, mode='r'))
+            self.accounts = np.asarray(np.memmap(self.accounts_path, dtype=np.int32, mode='r'))
+        return self
+
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Диапазоны [left, right) строк индекса для каждого ключа
+
+        Ключи сортируются перед поиском: бинарный поиск идет по индексу
+        монотонно, как слияние двух отсортированных списков, и читает каждую
+        страницу memmap один раз. Результат в исходном порядке ключей.
+        """
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        left = np.empty(len(keys), dtype=np.int64)
+        right = np.empty(len(keys), dtype=np.int64)
+        left[order] = np.searchsorted(self.phones, sorted_keys, 'left')
+        right[order] = np.searchsorted(self.phones, sorted_keys, 'right')
+        return left, right
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[List[str]]:
+    """Строки входного файла пачками (без пустых)"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        chunk = []
+        for line in f:
+            line = line.strip()
+            if line:
+                chunk.append(line)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def run_lookup(db: Database, input_path: str, output: str = config.LOOKUP_PATH,
+               rebuild: bool = False) -> Dict:
+    """
+    Проверить номера из файла по собранной базе
+
+    Входной файл читается пачками по LOOKUP_CHUNK строк, каждая пачка
+    нормализуется, ищется в индексе и сразу дописывается в CSV: память
+    ограничена пачкой, а не размером файла.
+    """
+    logger.info(f"🔎 Поиск номеров из {input_path}...")
+    index = PhoneIndex(db).open(rebuild)
+    refs = db.get_account_refs()
+
+    started = time.time()
+    totals = {'input': 0, 'invalid': 0, 'found': 0}
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['input', 'phone', 'found', 'account_ids', 'usernames'])
+
+        for lines in read_chunks(input_path, config.LOOKUP_CHUNK):
+            keys = normalize_phones(lines)
+            left, right = index.lookup(keys)
+            valid = keys > 0
+            found = valid & (right > left)
+            totals['input'] += len(lines)
+            totals['invalid'] += int(np.count_nonzero(~valid))
+            totals['found'] += int(np.count_nonzero(found))
+
+            # Первый владелец одной выборкой; соседние строки индекса читаем только у общих номеров
+            first = np.zeros(len(keys), dtype=np.int64)
+            first[found] = index.accounts[left[found]]
+            rows = []
+            for line, key, ok, lo, hi, owner, is_found in zip(lines, keys.tolist(), valid.tolist(), left.tolist(),
+                                                               right.tolist(), first.tolist(), found.tolist()):
+                if not is_found:
+                    rows.append((line, key if ok else '', 0, '', ''))
+                elif hi - lo == 1:
+                    account_id, username = refs.get(owner, (str(owner), ''))
+                    rows.append((line, key, 1, account_id, username))
+                else:
+                    owners = [refs.get(ref, (str(ref), '')) for ref in index.accounts[lo:hi].tolist()]
+                    rows.append((line, key, 1, ';'.join(o[0] for o in owners), ';'.join(o[1] for o in owners)))
+            writer.writerows(rows)
+
+            elapsed = time.time() - started
+            logger.info(f"   Обработано: {totals['input']} ({totals['input'] / max(elapsed, 1e-6):.0f} номеров/сек), "
+                        f"найдено: {totals['found']}")
+
+    logger.info(f"✅ Найдено {totals['found']} из {totals['input']} "
+                f"(нераспознано: {totals['invalid']}) за {time.time() - started:.1f} сек: {output}")
+    return totals
@@ -0,0 +1,39 @@
+import re
+from typing import Optional
+
+NON_DIGITS = re.compile(r'\D+')
+# Первая цифра кода ABC/DEF в плане +7: российские 3xx-5xx, 8xx, 9xx и казахстанские 6xx, 7xx
+NATIONAL_FIRST_DIGITS = '3456789'
+# Номер в тексте с кодом страны или префиксом 8: 79001234567, +7 (900) 123-45-67, 8 900 123 45 67.
+# Кандидаты проверяет нормализация (normalize_phone / utils.numbering.normalize_phones)
+PHONE_CANDIDATE = re.compile(r'(?<![\d+])(?:\+7|8|7)[\s(-]*\d{3}[\s)-]*\d{3}[\s-]?\d{2}[\s-]?\d{2}(?!\d)')
+# То же и без префикса (900-123-45-67) - только для колонки телефона: в других
+# ячейках десять цифр - это ИНН, номера заказов и т.п.
+PHONE_COLUMN_CANDIDATE = re.compile(r'(?<![\d+])(?:\+7|8|7)?[\s(-]*\d{3}[\s)-]*\d{3}[\s-]?\d{2}[\s-]?\d{2}(?!\d)')
+
+
+def phone_to_int(phone: str) -> Optional[int]:
+    """
+    Номер в целое для компактного хранения и сравнения
+
+    '79001234567', '+7 (900) 123-45-67' -> 79001234567; None, если цифр нет
+    """
+    digits = phone if phone.isdigit() else NON_DIGITS.sub('', phone)
+    return int(digits) if digits else None
+
+
+def normalize_phone(phone: str) -> Optional[int]:
+    """
+    Номер из произвольной записи в канонический вид базы (7XXXXXXXXXX)
+
+    '+7 (900) 123-45-67', '8 900 123 45 67', '9001234567' -> 79001234567;
+    None, если это не российский номер из 10-11 цифр
+    """
+    digits = phone if phone.isdigit() else NON_DIGITS.sub('', phone)
+    if len(digits) == 10:
+        digits = '7' + digits
+    elif len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    if len(digits) != 11 or digits[0] != '7' or digits[1] not in NATIONAL_FIRST_DIGITS:
+        return None
+    return int(digits)
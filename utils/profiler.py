@@ -0,0 +1,184 @@
+import os
+import sys
+import pstats
+import cProfile
+import threading
+from io import StringIO
+from pathlib import Path
+from datetime import datetime
+from collections import Counter
+from typing import Dict, Optional
+import config
+from utils.logger import logger
+
+# Переменная окружения "режим|каталог запуска" (для дочерних процессов)
+PROFILE_ENV = 'CRM_PROFILE'
+
+
+class Profiler:
+    """
+    Профилирование оркестратора и воркеров (--profile)
+
+    cprofile - детерминированный cProfile: точные числа вызовов, но
+    заметные накладные расходы на каждый вызов функции.
+    sampling - фоновый поток раз в PROFILE_SAMPLE_INTERVAL снимает стеки
+    всех потоков процесса: накладные расходы почти не зависят от нагрузки.
+
+    Каждый процесс пишет свой файл в data/profiles/<запуск>/, родитель
+    после завершения сводит их в один отчет (merge_profiles).
+    """
+
+    def __init__(self):
+        self.pid = None
+        self.mode = None
+        self.run_dir = None
+        self.profile = None
+        self.samples = None
+        self.sampler = None
+        self.stop_event = None
+
+    def start(self, mode: str = None) -> bool:
+        """
+        Начать профилирование процесса
+
+        С mode - новый запуск (оркестратор), без него - режим и каталог
+        берутся из окружения родителя (воркер). Профиль, унаследованный
+        через fork, отключается без сохранения.
+        """
+        if self.pid is not None and self.pid != os.getpid():
+            if self.profile:
+                self.profile.disable()
+            self.__init__()
+
+        if mode:
+            run_dir = Path(config.PROFILE_DIR) / datetime.now().strftime('%Y%m%d_%H%M%S')
+            run_dir.mkdir(parents=True, exist_ok=True)
+            os.environ[PROFILE_ENV] = f'{mode}|{run_dir}'
+        elif os.environ.get(PROFILE_ENV):
+            mode, run_dir = os.environ[PROFILE_ENV].split('|', 1)
+        else:
+            return False
+
+        self.pid = os.getpid()
+        self.mode = mode
+        self.run_dir = Path(run_dir)
+
+        if mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            self.samples = Counter()
+            self.stop_event = threading.Event()
+            self.sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+            self.sampler.start()
+        return True
+
+    def _sample(self):
+        own = threading.get_ident()
+        labels = {}
+        while not self.stop_event.wait(config.PROFILE_SAMPLE_INTERVAL):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """Остановить и сохранить профиль процесса"""
+        if self.pid != os.getpid():
+            return
+
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(str(self.run_dir / f'{self.pid}.prof'))
+        elif self.sampler:
+            self.stop_event.set()
+            self.sampler.join()
+            write_collapsed(self.samples, self.run_dir / f'{self.pid}.collapsed')
+        self.pid = None
+
+
+def _frame_label(code) -> str:
+    """модуль.функция:строка (для __init__.py - пакет.__init__)"""
+    path = Path(code.co_filename)
+    module = f'{path.parent.name}.{path.stem}' if path.stem == '__init__' else path.stem
+    return f'{module}.{code.co_name}:{code.co_firstlineno}'
+
+
+def write_collapsed(samples: Dict[str, int], path: Path):
+    """Свернутые стеки: "кадр;кадр;... число" (flamegraph.pl, speedscope)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f'{stack} {count}\n')
+
+
+def read_collapsed(path: Path) -> Counter:
+    samples = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                samples[stack] += int(count)
+    return samples
+
+
+def merge_profiles(run_dir: Path, top: int = 40) -> Optional[Path]:
+    """
+    Свести профили всех процессов запуска
+
+    cprofile -> merged.prof (pstats) и report.txt (по cumulative);
+    sampling -> merged.collapsed (для flamegraph) и report.txt
+    (функции по собственному и общему числу сэмплов).
+    """
+    run_dir = Path(run_dir)
+    report = StringIO()
+    prof_files = sorted(str(p) for p in run_dir.glob('*.prof') if p.name != 'merged.prof')
+    collapsed_files = sorted(p for p in run_dir.glob('*.collapsed') if p.name != 'merged.collapsed')
+
+    if prof_files:
+        stats = pstats.Stats(*prof_files, stream=report)
+        stats.dump_stats(str(run_dir / 'merged.prof'))
+        report.write(f'Процессов: {len(prof_files)}\n')
+        stats.sort_stats('cumulative').print_stats(top)
+        stats.sort_stats('tottime').print_stats(top)
+
+    if collapsed_files:
+        samples = Counter()
+        for path in collapsed_files:
+            samples.update(read_collapsed(path))
+        write_collapsed(samples, run_dir / 'merged.collapsed')
+
+        total = sum(samples.values())
+        own, inclusive = Counter(), Counter()
+        for stack, count in samples.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+
+        report.write(f'Процессов: {len(collapsed_files)}, сэмплов: {total} '
+                     f'(шаг {config.PROFILE_SAMPLE_INTERVAL * 1000:.0f} мс)\n')
+        for title, counter in (('Собственное время', own), ('Общее время', inclusive)):
+            report.write(f'\n{title}:\n')
+            for frame, count in counter.most_common(top):
+                report.write(f'{count / total:>7.1%} {count:>8}  {frame}\n')
+
+    if not prof_files and not collapsed_files:
+        return None
+
+    report_path = run_dir / 'report.txt'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(report.getvalue())
+    logger.info(f"🔬 Профиль сохранен: {report_path}")
+    return report_path
+
+
+# Профилировщик процесса
+profiler = Profiler()
@@ -12,6 +12,7 @@ def generate_excel_report(db: Database):
         # Получаем данные
         accounts = db.get_all_accounts_summary()
         total_phones = db.get_total_phones()
+        status_counts = db.get_status_counts()
         
         # ИСПРАВЛЕНИЕ: Проверка на пустые данные
         if not accounts:
@@ -67,11 +68,11 @@ def generate_excel_report(db: Database):
                     'Всего уникальных номеров'
                 ],
                 'Значение': [
-                    len(accounts),
-                    len([a for a in accounts if a['status'] == 'completed']),
-                    len([a for a in accounts if a['status'] == 'in_progress']),
-                    len([a for a in accounts if a['status'] == 'pending']),
-                    len([a for a in accounts if a['status'] == 'failed']),
+                    sum(status_counts.values()),
+                    status_counts.get('completed', 0),
+                    status_counts.get('in_progress', 0),
+                    status_counts.get('pending', 0),
+                    status_counts.get('failed', 0),
                     total_phones
                 ]
             })